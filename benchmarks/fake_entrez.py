@@ -0,0 +1,379 @@
+"""A local stand-in for the NCBI E-utilities ``esearch`` and ``efetch`` endpoints.
+
+The server answers from a :class:`Corpus` of ``PubmedArticle`` XML records:
+either records previously downloaded with ``record`` (so the parser sees real
+PubMed XML), or a seeded synthetic corpus. esearch results are a
+deterministic function of the query, so repeated runs fetch the same articles.
+
+Bio.Entrez has the NCBI URLs built in; :func:`redirect_entrez` points it at
+the local server for the current process.
+
+Usage::
+
+    # serve a synthetic corpus
+    python benchmarks/fake_entrez.py serve --articles 5000 --port 8001
+    # record real esearch/efetch responses to serve them later
+    python benchmarks/fake_entrez.py record --email you@example.org \\
+        --out benchmarks/fixtures "IL-17 cancer" "statins dementia"
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+NCBI_EUTILS = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+PUBMED_HEADER = (
+    '<?xml version="1.0" ?>\n'
+    '<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January '
+    '2019//EN" "https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_190101.dtd">\n'
+)
+ESEARCH_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" ?>\n'
+    '<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+    '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n'
+)
+
+
+class Server(ThreadingHTTPServer):
+    """Threaded HTTP server sized for hundreds of concurrent clients."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+_ARTICLE = re.compile(r"<PubmedArticle>.*?</PubmedArticle>", re.S)
+_PMID = re.compile(r"<PMID[^>]*>(\d+)</PMID>")
+
+_WORDS = (
+    "interleukin cytokine tumor cancer inflammation immune response patients "
+    "cohort randomized trial placebo survival mortality risk outcome treatment "
+    "therapy dose efficacy safety adverse events biomarker expression signaling "
+    "pathway receptor mice model clinical association hazard ratio confidence "
+    "interval statin dementia cognitive decline diabetes insulin glucose obesity "
+    "cardiovascular hypertension stroke infection antibiotic resistance vaccine"
+).split()
+
+
+def stable_hash(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def synthetic_article(pmid: int, seed: int = 0) -> str:
+    """``PubmedArticle`` XML for a made-up but structurally realistic article."""
+    rng = random.Random(seed * 1_000_003 + pmid)
+    sections = "".join(
+        f'<AbstractText Label="{label}">'
+        + " ".join(
+            _sentence(rng, rng.randint(12, 24)) for _ in range(rng.randint(2, 4))
+        )
+        + "</AbstractText>"
+        for label in ("BACKGROUND", "METHODS", "RESULTS", "CONCLUSIONS")
+    )
+    authors = "".join(
+        f'<Author ValidYN="Y"><LastName>Author{rng.randint(1, 999)}</LastName>'
+        f"<ForeName>A</ForeName><Initials>A</Initials></Author>"
+        for _ in range(rng.randint(1, 6))
+    )
+    year = rng.randint(1995, 2024)
+    return (
+        '<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM">'
+        f'<PMID Version="1">{pmid}</PMID><Article PubModel="Print"><Journal>'
+        f'<JournalIssue CitedMedium="Internet"><Volume>{rng.randint(1, 120)}</Volume>'
+        f"<Issue>{rng.randint(1, 12)}</Issue><PubDate><Year>{year}</Year></PubDate>"
+        f"</JournalIssue><Title>Journal of {rng.choice(_WORDS).title()}</Title>"
+        f"</Journal><ArticleTitle>{_sentence(rng, rng.randint(8, 16))}</ArticleTitle>"
+        f"<Pagination><MedlinePgn>{rng.randint(1, 900)}-{rng.randint(901, 999)}"
+        f"</MedlinePgn></Pagination><Abstract>{sections}</Abstract>"
+        f'<AuthorList CompleteYN="Y">{authors}</AuthorList></Article>'
+        "</MedlineCitation><PubmedData><History>"
+        f'<PubMedPubDate PubStatus="received"><Year>{year}</Year><Month>1</Month>'
+        "<Day>1</Day></PubMedPubDate></History>"
+        "<PublicationStatus>ppublish</PublicationStatus><ArticleIdList>"
+        f'<ArticleId IdType="pubmed">{pmid}</ArticleId></ArticleIdList>'
+        "</PubmedData></PubmedArticle>"
+    )
+
+
+class Corpus:
+    """PubmedArticle XML by PMID, plus recorded esearch results by query."""
+
+    def __init__(self, articles: dict, searches: dict | None = None) -> None:
+        self.articles = articles
+        self.pmids = list(articles)
+        self.searches = searches or {}
+
+    @classmethod
+    def synthetic(cls, size: int = 5000, seed: int = 0) -> "Corpus":
+        first = 30_000_000
+        pmids = range(first, first + size)
+        return cls({str(pmid): synthetic_article(pmid, seed) for pmid in pmids})
+
+    @classmethod
+    def load(cls, directory: str | Path) -> "Corpus":
+        """Load fixtures written by :func:`record`."""
+        directory = Path(directory)
+        text = (directory / "articles.xml").read_text(encoding="utf-8")
+        articles = {}
+        for match in _ARTICLE.finditer(text):
+            pmid = _PMID.search(match.group(0))
+            if pmid is not None:
+                articles[pmid.group(1)] = match.group(0)
+        searches_path = directory / "esearch.json"
+        searches = {}
+        if searches_path.exists():
+            searches = json.loads(searches_path.read_text(encoding="utf-8"))
+        return cls(articles, searches)
+
+    def search(self, term: str, retmax: int) -> list:
+        """Recorded PMIDs for ``term``, else a deterministic slice of the corpus."""
+        recorded = self.searches.get(term)
+        if recorded is not None:
+            return recorded[:retmax]
+        if not self.pmids:
+            return []
+        # Overlapping windows: similar queries share part of their results, the
+        # way related PubMed queries do.
+        start = stable_hash(term) % len(self.pmids)
+        count = min(retmax, len(self.pmids))
+        return [self.pmids[(start + i) % len(self.pmids)] for i in range(count)]
+
+    def fetch(self, pmids) -> str:
+        records = "".join(
+            self.articles[pmid] for pmid in pmids if pmid in self.articles
+        )
+        return f"{PUBMED_HEADER}<PubmedArticleSet>{records}</PubmedArticleSet>"
+
+
+def esearch_xml(pmids: list) -> str:
+    ids = "".join(f"<Id>{pmid}</Id>" for pmid in pmids)
+    return (
+        f"{ESEARCH_HEADER}<eSearchResult><Count>{len(pmids)}</Count>"
+        f"<RetMax>{len(pmids)}</RetMax><RetStart>0</RetStart><IdList>{ids}</IdList>"
+        "<TranslationSet/><QueryTranslation></QueryTranslation></eSearchResult>"
+    )
+
+
+class FakeEntrez:
+    """Serves a :class:`Corpus` over HTTP like the E-utilities do.
+
+    Parameters
+    ----------
+    corpus : Corpus
+        Articles and recorded searches to serve.
+    latency : float, optional
+        Seconds added to every response, by default 0.02.
+    jitter : float, optional
+        Up to this many extra seconds, uniformly drawn, by default 0.01.
+    error_rate : float, optional
+        Fraction of requests answered with HTTP 503, by default 0.
+    host, port : optional
+        Address to listen on; port 0 picks a free one.
+    """
+
+    def __init__(
+        self,
+        corpus: Corpus,
+        latency: float = 0.02,
+        jitter: float = 0.01,
+        error_rate: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+    ) -> None:
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = {"esearch": 0, "efetch": 0, "errors": 0, "articles": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/entrez/eutils/"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.respond(parse_qs(urlsplit(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                params = parse_qs(urlsplit(self.path).query)
+                params.update(parse_qs(self.rfile.read(length).decode("utf-8")))
+                self.respond(params)
+
+            def respond(self, params):
+                tool = urlsplit(self.path).path.rsplit("/", 1)[-1].split(".")[0]
+                with fake._lock:
+                    delay = fake.latency + fake._rng.uniform(0, fake.jitter)
+                    failed = fake._rng.random() < fake.error_rate
+                time.sleep(delay)
+                if failed:
+                    with fake._lock:
+                        fake.requests["errors"] += 1
+                    return self.send(503, b"Service unavailable", "text/plain")
+                if tool == "esearch":
+                    term = params.get("term", [""])[0]
+                    retmax = int(params.get("retmax", ["20"])[0])
+                    body = esearch_xml(fake.corpus.search(term, retmax))
+                elif tool == "efetch":
+                    pmids = [
+                        pmid
+                        for value in params.get("id", [])
+                        for pmid in value.split(",")
+                        if pmid
+                    ]
+                    body = fake.corpus.fetch(pmids)
+                    with fake._lock:
+                        fake.requests["articles"] += len(pmids)
+                else:
+                    return self.send(404, b"Unknown utility", "text/plain")
+                with fake._lock:
+                    fake.requests[tool] += 1
+                self.send(200, body.encode("utf-8"), "text/xml; charset=UTF-8")
+
+            def send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self) -> "FakeEntrez":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def redirect_entrez(base_url: str) -> None:
+    """Send this process's Bio.Entrez requests to ``base_url`` instead of NCBI."""
+    from Bio import Entrez
+
+    build_request = getattr(Entrez._build_request, "__wrapped__", Entrez._build_request)
+
+    def redirected(cgi, *args, **kwargs):
+        return build_request(cgi.replace(NCBI_EUTILS, base_url), *args, **kwargs)
+
+    redirected.__wrapped__ = build_request
+    Entrez._build_request = redirected
+
+
+def record(
+    queries: list,
+    out: str | Path,
+    email: str,
+    retmax: int = 200,
+    api_key: str | None = None,
+) -> None:
+    """Download real esearch and efetch results for ``queries`` into ``out``."""
+    from Bio import Entrez
+
+    Entrez.email = email
+    if api_key:
+        Entrez.api_key = api_key
+    searches = {}
+    pmids = {}
+    for query in queries:
+        with Entrez.esearch(
+            db="pubmed", term=query, retmax=retmax, sort="relevance"
+        ) as handle:
+            found = [str(pmid) for pmid in Entrez.read(handle)["IdList"]]
+        searches[query] = found
+        pmids.update(dict.fromkeys(found))
+
+    records = []
+    pmids = list(pmids)
+    for i in range(0, len(pmids), 200):
+        with Entrez.efetch(db="pubmed", id=pmids[i : i + 200], rettype="xml") as handle:
+            data = handle.read()
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        records.extend(_ARTICLE.findall(data))
+
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    (out / "articles.xml").write_text(
+        f"{PUBMED_HEADER}<PubmedArticleSet>\n"
+        + "\n".join(records)
+        + "\n</PubmedArticleSet>\n",
+        encoding="utf-8",
+    )
+    (out / "esearch.json").write_text(json.dumps(searches, indent=1), encoding="utf-8")
+    print(f"Recorded {len(records)} articles for {len(queries)} queries in {out}")
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="serve a corpus until interrupted")
+    serve.add_argument("--fixtures", help="directory written by the record command")
+    serve.add_argument(
+        "--articles", type=int, default=5000, help="synthetic corpus size"
+    )
+    serve.add_argument("--latency", type=float, default=0.02)
+    serve.add_argument("--jitter", type=float, default=0.01)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+    serve.add_argument("--port", type=int, default=8001)
+
+    rec = commands.add_parser("record", help="download real responses as fixtures")
+    rec.add_argument("queries", nargs="+")
+    rec.add_argument("--email", required=True)
+    rec.add_argument("--api-key")
+    rec.add_argument("--retmax", type=int, default=200)
+    rec.add_argument("--out", default=str(Path(__file__).parent / "fixtures"))
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record(args.queries, args.out, args.email, args.retmax, args.api_key)
+        return
+    if args.fixtures:
+        corpus = Corpus.load(args.fixtures)
+    else:
+        corpus = Corpus.synthetic(args.articles)
+    fake = FakeEntrez(
+        corpus,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        port=args.port,
+    )
+    print(f"Serving {len(corpus.pmids)} articles at {fake.base_url}")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""A local stand-in for the OpenAI chat completions and embeddings API.
+
+Answers ``POST /v1/chat/completions`` (plain and streamed) and
+``POST /v1/embeddings`` after a configurable latency and jitter, and fails a
+configurable fraction of requests with HTTP 429 or 500, so retries, backoff and
+the adaptive concurrency limit are exercised as well. Replies are chosen from
+the prompt so the pipeline behaves as it would with a real model: queries for
+query prompts, yes/no for relevance prompts (about two thirds relevant, decided
+by a hash of the abstract), and paragraphs for summaries and syntheses.
+Embeddings are hashed bags of words, so texts that share words come out similar.
+
+Usage::
+
+    python benchmarks/fake_openai.py --latency 0.3 --jitter 0.2 --rate-limit-rate 0.02
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler
+
+from fake_entrez import Server
+
+_ABSTRACT = re.compile(r'Abstract \d+: """(.*?)"""', re.S)
+_SUMMARY = (
+    "This randomized cohort study of {n} patients reports that the intervention "
+    "was associated with improved outcomes, with a hazard ratio of 0.{k} and "
+    "acceptable safety. The evidence is moderate given the study design and size."
+)
+_SYNTHESIS = (
+    "Across the summarized studies, the evidence suggests a modest benefit "
+    "[1][2], although heterogeneity in populations and designs limits certainty "
+    "[3]. Larger randomized trials are needed. "
+)
+
+
+def _relevant(text: str) -> bool:
+    return zlib.crc32(text.encode("utf-8")) % 3 != 0
+
+
+def embedding_of(text: str, dimensions: int = 64) -> list:
+    """A unit vector for ``text``: its lower-cased words hashed into buckets."""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        vector[zlib.crc32(word.encode("utf-8")) % dimensions] += 1.0
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return [value / norm for value in vector]
+
+
+def reply_to(messages: list, rng: random.Random) -> str:
+    """A plausible answer to the prompt in ``messages``."""
+    prompt = messages[-1].get("content", "") if messages else ""
+    if isinstance(prompt, list):
+        prompt = " ".join(part.get("text", "") for part in prompt)
+    if prompt.startswith("Generate a PubMed query"):
+        question = prompt.split('"', 2)[1] if '"' in prompt else ""
+        terms = re.findall(r"[A-Za-z0-9-]{4,}", question)
+        terms = terms[:3] or ["clinical"]
+        return " AND ".join(f"({term}[tiab])" for term in terms) + (
+            f" AND (study{rng.randint(0, 9)}[tiab])"
+        )
+    if prompt.startswith("For each of the numbered article abstracts"):
+        answers = ["yes" if _relevant(a) else "no" for a in _ABSTRACT.findall(prompt)]
+        return json.dumps(answers)
+    if prompt.startswith("Does the article"):
+        return "Yes" if _relevant(prompt) else "No"
+    if prompt.startswith("Summarize the evidence"):
+        return _SUMMARY.format(n=rng.randint(40, 4000), k=rng.randint(50, 95))
+    if prompt.startswith("Below is a list of article summaries"):
+        return _SYNTHESIS * 3
+    return "OK"
+
+
+class FakeOpenAI:
+    """Serves chat completions from :func:`reply_to`.
+
+    Parameters
+    ----------
+    latency : float, optional
+        Seconds before every response (time to first token when streaming), by
+        default 0.05.
+    jitter : float, optional
+        Up to this many extra seconds, uniformly drawn, by default 0.02.
+    rate_limit_rate : float, optional
+        Fraction of requests answered with HTTP 429, by default 0.
+    server_error_rate : float, optional
+        Fraction of requests answered with HTTP 500, by default 0.
+    chunk_delay : float, optional
+        Seconds between streamed chunks, by default 0.005.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        chunk_delay: float = 0.005,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.chunk_delay = chunk_delay
+        self.requests = {
+            "completions": 0,
+            "embeddings": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+        }
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = Server((host, port), self._handler())
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _draw(self):
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            roll = self._rng.random()
+            seed = self._rng.random()
+        if roll < self.rate_limit_rate:
+            return delay, 429, seed
+        if roll < self.rate_limit_rate + self.server_error_rate:
+            return delay, 500, seed
+        return delay, 200, seed
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path.rstrip("/")
+                if path.endswith("/chat/completions"):
+                    handle = self.complete
+                elif path.endswith("/embeddings"):
+                    handle = self.embed
+                else:
+                    return self.send_json(404, {"error": {"message": "Not found"}})
+                with fake._lock:
+                    fake.in_flight += 1
+                    fake.peak_in_flight = max(fake.peak_in_flight, fake.in_flight)
+                try:
+                    handle(request)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def fail(self, status):
+                key = "rate_limited" if status == 429 else "server_errors"
+                with fake._lock:
+                    fake.requests[key] += 1
+                headers = {"Retry-After": "0.2"} if status == 429 else {}
+                self.send_json(
+                    status,
+                    {"error": {"message": "Injected failure", "type": key}},
+                    headers,
+                )
+
+            def embed(self, request):
+                delay, status, _ = fake._draw()
+                time.sleep(delay)
+                if status != 200:
+                    return self.fail(status)
+                with fake._lock:
+                    fake.requests["embeddings"] += 1
+                texts = request.get("input", [])
+                if isinstance(texts, str):
+                    texts = [texts]
+                dimensions = request.get("dimensions") or 64
+                tokens = sum(len(text) for text in texts) // 4
+                self.send_json(
+                    200,
+                    {
+                        "object": "list",
+                        "data": [
+                            {
+                                "object": "embedding",
+                                "index": i,
+                                "embedding": embedding_of(text, dimensions),
+                            }
+                            for i, text in enumerate(texts)
+                        ],
+                        "model": request.get("model", "fake"),
+                        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                    },
+                )
+
+            def complete(self, request):
+                delay, status, seed = fake._draw()
+                time.sleep(delay)
+                if status != 200:
+                    return self.fail(status)
+                with fake._lock:
+                    fake.requests["completions"] += 1
+                rng = random.Random(seed)
+                messages = request.get("messages", [])
+                model = request.get("model", "fake")
+                if request.get("stream"):
+                    return self.stream(reply_to(messages, rng), model)
+                count = request.get("n") or 1
+                replies = [reply_to(messages, rng) for _ in range(count)]
+                choices = [
+                    {
+                        "index": i,
+                        "message": {"role": "assistant", "content": reply},
+                        "finish_reason": "stop",
+                    }
+                    for i, reply in enumerate(replies)
+                ]
+                prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+                prompt_tokens = prompt_chars // 4
+                completion_tokens = sum(len(reply) for reply in replies) // 4
+                self.send_json(
+                    200,
+                    {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": choices,
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                        },
+                    },
+                )
+
+            def stream(self, text, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                words = re.findall(r"\S+\s*", text)
+                for word in words:
+                    delta = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "delta": {"content": word},
+                                "finish_reason": None,
+                            }
+                        ],
+                    }
+                    self.chunk(f"data: {json.dumps(delta)}\n\n".encode("utf-8"))
+                    time.sleep(fake.chunk_delay)
+                self.chunk(b"data: [DONE]\n\n")
+                self.chunk(b"")
+
+            def chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self) -> "FakeOpenAI":
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.005)
+    parser.add_argument("--port", type=int, default=8002)
+    args = parser.parse_args(argv)
+    fake = FakeOpenAI(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        chunk_delay=args.chunk_delay,
+        port=args.port,
+    )
+    print(f"Serving chat completions at {fake.base_url}")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
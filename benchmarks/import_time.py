@@ -0,0 +1,103 @@
+"""Import-time regression benchmark.
+
+Every case runs in a fresh interpreter, so the numbers are cold-start times.
+A case fails when its median time exceeds the budget or when it loads one of
+the heavy dependencies that must stay lazy. The exit status is non-zero if any
+case fails, so the script can gate CI.
+
+Usage::
+
+    python benchmarks/import_time.py [--runs 7] [--budget 1.0]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules that take hundreds of milliseconds to import and are only needed once
+# a retriever actually talks to PubMed or to a model.
+HEAVY_MODULES = (
+    "langchain",
+    "langchain_core",
+    "langchain_openai",
+    "openai",
+    "httpx",
+    "Bio",
+    "numpy",
+    "tiktoken",
+)
+
+CASES = {
+    "import damsan": "import damsan",
+    "from damsan import Damsan": "from damsan import Damsan",
+    "damsan --help": (
+        "import contextlib, io, damsan\n"
+        "with contextlib.redirect_stdout(io.StringIO()), "
+        "contextlib.suppress(SystemExit):\n"
+        "    damsan.main(['--help'])"
+    ),
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec({code!r})
+elapsed = time.perf_counter() - start
+heavy = {heavy!r}
+loaded = sorted(name for name in heavy if name in sys.modules)
+print(json.dumps({{"seconds": elapsed, "loaded": loaded}}))
+"""
+
+
+def run_case(code: str) -> dict:
+    """Run ``code`` in a new interpreter and return its timing and heavy imports."""
+    env = dict(os.environ)
+    # Measure the working tree rather than whatever version is installed.
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT / "src"), env.get("PYTHONPATH")])
+    )
+    probe = _PROBE.format(code=code, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", probe],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7, help="runs per case")
+    parser.add_argument(
+        "--budget", type=float, default=1.0, help="seconds allowed per case"
+    )
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'case':<28} {'median':>9} {'max':>9}  heavy modules")
+    for name, code in CASES.items():
+        results = [run_case(code) for _ in range(args.runs)]
+        seconds = [result["seconds"] for result in results]
+        loaded = sorted({module for result in results for module in result["loaded"]})
+        median = statistics.median(seconds)
+        print(
+            f"{name:<28} {median * 1000:>7.1f}ms {max(seconds) * 1000:>7.1f}ms  "
+            f"{', '.join(loaded) or '-'}"
+        )
+        if median > args.budget or loaded:
+            failed = True
+    if failed:
+        print(f"FAILED: over the {args.budget:.2f}s budget or loaded heavy modules")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,487 @@
+"""End-to-end pipeline benchmark against local Entrez and chat stand-ins.
+
+Starts :class:`~fake_entrez.FakeEntrez` and :class:`~fake_openai.FakeOpenAI` in
+process, points Bio.Entrez and :class:`~damsan.llm.OpenAIChatBackend` at them,
+and drives the real pipeline over HTTP, so parsing, rate limiting, scheduling,
+retries and connection pooling are all measured without touching NCBI or
+OpenAI. Two families of scenarios are run:
+
+* ``retriever-N``: ``PubMedNeuralRetriever.answer`` with ``N`` articles,
+  one question at a time;
+* ``damsan-cC``: ``Damsan.answer`` from ``C`` threads at once;
+* ``damsan-stream``: ``Damsan.answer_stream_async`` one question at a time on
+  one event loop, with tracing off.
+
+For every scenario the report gives p50/p95 latency, questions and articles
+per second, p50/p95 time per stage (search, fetch, judge and summarize,
+synthesize; the retriever streams its fetches into the summarize stage) and
+the peak traced memory of each stage, measured in a separate pass so that
+tracing does not skew the timings. Results are compared against
+``benchmarks/baseline.json``; the exit status is non-zero when a latency grows
+or a throughput drops by more than ``--tolerance``. Baselines are only
+comparable on the machine that recorded them, so refresh the file with
+``--save-baseline`` when the hardware changes.
+
+Usage::
+
+    python benchmarks/run.py [--repeat 5] [--scenarios retriever-50,damsan-c4]
+    python benchmarks/run.py --fixtures benchmarks/fixtures --llm-latency 0.3
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from fake_entrez import Corpus, FakeEntrez, redirect_entrez  # noqa: E402
+from fake_openai import FakeOpenAI  # noqa: E402
+
+PROMPTS = ROOT / "prompts" / "PubMed" / "Architecture_3" / "master.json"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+ARTICLE_COUNTS = (10, 50, 200)
+CONCURRENCY = (1, 4, 16)
+
+STAGES = {
+    "search_pubmed": "search",
+    "fetch_article_data": "fetch",
+    "summarize_each_article": "summarize",
+    "synthesize_all_articles": "synthesize",
+}
+
+_TOPICS = (
+    "interleukin-17 inhibitors in psoriatic arthritis",
+    "statin therapy and dementia risk",
+    "metformin and cancer incidence",
+    "vitamin D supplementation and fractures",
+    "SGLT2 inhibitors in heart failure",
+    "antibiotic duration for pneumonia",
+    "influenza vaccination in older adults",
+    "bariatric surgery and diabetes remission",
+)
+
+
+def questions(count: int, offset: int = 0) -> list:
+    """``count`` distinct questions, so no scenario is served from a cache."""
+    return [
+        f"What is the evidence on {_TOPICS[i % len(_TOPICS)]} (cohort {i}, "
+        f"run {offset})?"
+        for i in range(count)
+    ]
+
+
+def percentile(values: list, q: float) -> float:
+    """Linear-interpolated percentile of ``values`` for ``q`` in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class StageProbe:
+    """Times, and optionally traces the memory of, the retriever's stages.
+
+    The stage methods are wrapped on the retriever instance only. Timings go to
+    the record of the question running on the current thread, so concurrent
+    questions do not mix their stages.
+    """
+
+    def __init__(self, retriever, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.memory = {}
+        self._local = threading.local()
+        for method, stage in STAGES.items():
+            original = getattr(retriever, method)
+            setattr(retriever, method, self._wrap(original, stage))
+
+    def _wrap(self, func, stage):
+        def timed(*args, **kwargs):
+            if self.trace_memory:
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                stages = getattr(self._local, "stages", None)
+                if stages is not None:
+                    stages[stage] = stages.get(stage, 0.0) + elapsed
+                if self.trace_memory:
+                    peak = tracemalloc.get_traced_memory()[1] - base
+                    self.memory[stage] = max(self.memory.get(stage, 0), peak)
+
+        return timed
+
+    def run(self, func, *args, **kwargs) -> tuple:
+        """Call ``func`` and return its result, wall time and stage times."""
+        self._local.stages = {}
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stages, self._local.stages = self._local.stages, None
+        return result, elapsed, stages
+
+
+class Bench:
+    """Builds pipelines wired to the fake services and runs scenarios on them."""
+
+    def __init__(self, args, entrez: FakeEntrez, openai: FakeOpenAI) -> None:
+        self.args = args
+        self.entrez = entrez
+        self.openai = openai
+
+    def retriever_kwargs(self) -> dict:
+        from damsan.llm import OpenAIChatBackend
+        from damsan.ratelimit import NCBIRateLimiter
+        from damsan.scheduler import LLMScheduler
+
+        return dict(
+            prompt_file_path=str(PROMPTS),
+            model="benchmark",
+            verbose=False,
+            openai_api_key="benchmark",
+            email="benchmark@example.org",
+            llm_backend=OpenAIChatBackend(
+                model="benchmark", api_key="benchmark", base_url=self.openai.base_url
+            ),
+            # Any key gives the 10 requests/second budget, also in Bio.Entrez.
+            ncbi_api_key="benchmark",
+            ncbi_rate_limiter=NCBIRateLimiter(
+                api_key="benchmark", rate=self.args.ncbi_rate
+            ),
+            llm_scheduler=LLMScheduler(),
+        )
+
+    def retriever(self):
+        from damsan.pubmed_engine import PubMedNeuralRetriever
+
+        return PubMedNeuralRetriever(**self.retriever_kwargs())
+
+    def damsan(self):
+        from damsan import Damsan
+
+        return Damsan(**self.retriever_kwargs())
+
+    def scenarios(self) -> dict:
+        scenarios = {}
+        for count in ARTICLE_COUNTS:
+            scenarios[f"retriever-{count}"] = (self.run_retriever, count)
+        for concurrency in CONCURRENCY:
+            scenarios[f"damsan-c{concurrency}"] = (self.run_damsan, concurrency)
+        scenarios["damsan-stream"] = (self.run_stream, None)
+        return scenarios
+
+    def run_retriever(self, num_results: int, trace_memory: bool = False) -> dict:
+        retriever = self.retriever()
+        probe = StageProbe(retriever, trace_memory)
+        count = 1 if trace_memory else self.args.repeat
+
+        def answer(question):
+            result, elapsed, stages = probe.run(
+                retriever.answer,
+                question,
+                num_results=num_results,
+                num_query_attempts=1,
+            )
+            return elapsed, stages, len(result[3])
+
+        # The first question opens the connections and is not measured.
+        answer(f"Warm-up question for {num_results} articles?")
+        self.mark()
+        probe.memory.clear()
+        start = time.perf_counter()
+        samples = [answer(question) for question in questions(count, num_results)]
+        wall = time.perf_counter() - start
+        retriever.llm_backend.close()
+        return self.summarize(samples, wall, probe)
+
+    def run_damsan(self, concurrency: int, trace_memory: bool = False) -> dict:
+        damsan = self.damsan()
+        probe = StageProbe(damsan.retriever, trace_memory)
+        count = 1 if trace_memory else self.args.repeat * concurrency
+        workers = 1 if trace_memory else concurrency
+
+        def answer(question):
+            result, elapsed, stages = probe.run(damsan.answer, question)
+            articles = len(result.get("article_summaries", [])) + len(
+                result.get("irrelevant_articles", [])
+            )
+            return elapsed, stages, articles
+
+        answer(f"Warm-up question for {concurrency} threads?")
+        self.mark()
+        probe.memory.clear()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            samples = list(pool.map(answer, questions(count, offset=concurrency)))
+        wall = time.perf_counter() - start
+        damsan.retriever.llm_backend.close()
+        return self.summarize(samples, wall, probe)
+
+    def run_stream(self, _, trace_memory: bool = False) -> dict:
+        # No Metrics are attached, so spans are the no-op stand-ins: this also
+        # checks that streaming works with tracing off.
+        damsan = self.damsan()
+        probe = StageProbe(damsan.retriever, trace_memory)
+        count = 1 if trace_memory else self.args.repeat
+        # One loop for every question, so its connections are reused as they
+        # would be in a long-lived service.
+        loop = asyncio.new_event_loop()
+
+        async def stream(question):
+            return [event async for event in damsan.answer_stream_async(question)]
+
+        def answer(question):
+            events, elapsed, stages = probe.run(
+                loop.run_until_complete, stream(question)
+            )
+            result = events[-1].result
+            articles = len(result.get("article_summaries", [])) + len(
+                result.get("irrelevant_articles", [])
+            )
+            return elapsed, stages, articles
+
+        try:
+            answer("Warm-up question for streaming?")
+            self.mark()
+            probe.memory.clear()
+            start = time.perf_counter()
+            samples = [answer(question) for question in questions(count, offset=100)]
+            wall = time.perf_counter() - start
+        finally:
+            loop.run_until_complete(damsan.retriever.llm_backend.aclose())
+            loop.close()
+        damsan.retriever.llm_backend.close()
+        return self.summarize(samples, wall, probe)
+
+    @staticmethod
+    def summarize(samples: list, wall: float, probe: StageProbe) -> dict:
+        latencies = [elapsed for elapsed, _, _ in samples]
+        articles = sum(count for _, _, count in samples)
+        stages = {}
+        for stage in STAGES.values():
+            times = [s[stage] for _, s, _ in samples if stage in s]
+            if times:
+                stages[stage] = {
+                    "p50": percentile(times, 50),
+                    "p95": percentile(times, 95),
+                }
+        report = {
+            "questions": len(samples),
+            "articles": articles,
+            "wall": wall,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "mean": statistics.fmean(latencies),
+            "questions_per_second": len(samples) / wall,
+            "articles_per_second": articles / wall,
+            "stages": stages,
+        }
+        if probe.trace_memory:
+            report["memory"] = probe.memory
+        return report
+
+    def mark(self) -> None:
+        """Start counting fake-server requests from here."""
+        self._entrez_before = dict(self.entrez.requests)
+        self._openai_before = dict(self.openai.requests)
+        self.openai.peak_in_flight = 0
+
+    def requests_since_mark(self) -> tuple:
+        entrez = {
+            key: value - self._entrez_before[key]
+            for key, value in self.entrez.requests.items()
+        }
+        llm = {
+            key: value - self._openai_before[key]
+            for key, value in self.openai.requests.items()
+        }
+        llm["peak_in_flight"] = self.openai.peak_in_flight
+        return entrez, llm
+
+    def run(self, name: str) -> dict:
+        func, parameter = self.scenarios()[name]
+        report = func(parameter)
+        report["entrez"], report["llm"] = self.requests_since_mark()
+
+        tracemalloc.start()
+        try:
+            traced = func(parameter, trace_memory=True)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        memory = traced.pop("memory", {})
+        # Stages reset the peak when they start, so the overall peak is the
+        # largest of theirs and of whatever ran after the last one.
+        report["peak_memory_kib"] = max(peak, *memory.values(), 0) // 1024
+        for stage, stage_peak in memory.items():
+            report["stages"].setdefault(stage, {})["peak_memory_kib"] = (
+                stage_peak // 1024
+            )
+        return report
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of ``results`` against ``baseline`` beyond ``tolerance``."""
+    regressions = []
+    for name, report in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for metric in ("p50", "p95"):
+            if report[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {report[metric]:.3f}s, baseline "
+                    f"{previous[metric]:.3f}s"
+                )
+        for metric in ("questions_per_second", "articles_per_second"):
+            if report[metric] < previous[metric] * (1 - tolerance):
+                regressions.append(
+                    f"{name}: {metric} {report[metric]:.2f}, baseline "
+                    f"{previous[metric]:.2f}"
+                )
+    return regressions
+
+
+def print_report(results: dict, baseline: dict) -> None:
+    print(
+        f"{'scenario':<16} {'p50':>8} {'p95':>8} {'q/s':>7} {'art/s':>8} "
+        f"{'peak':>9}  {'vs baseline p50':>15}"
+    )
+    for name, report in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        change = "-"
+        if previous:
+            change = f"{(report['p50'] / previous['p50'] - 1) * 100:+.1f}%"
+        print(
+            f"{name:<16} {report['p50']:>7.3f}s {report['p95']:>7.3f}s "
+            f"{report['questions_per_second']:>7.2f} "
+            f"{report['articles_per_second']:>8.1f} "
+            f"{report['peak_memory_kib']:>6}KiB  {change:>15}"
+        )
+        for stage, numbers in report["stages"].items():
+            print(
+                f"  {stage:<14} {numbers.get('p50', 0):>7.3f}s "
+                f"{numbers.get('p95', 0):>7.3f}s {'':>16} "
+                f"{numbers.get('peak_memory_kib', 0):>6}KiB"
+            )
+        entrez, llm = report["entrez"], report["llm"]
+        print(
+            f"  entrez: {entrez['esearch']} esearch, {entrez['efetch']} efetch, "
+            f"{entrez['errors']} errors; llm: {llm['completions']} completions, "
+            f"{llm['rate_limited']} throttled, {llm['server_errors']} errors, "
+            f"{llm['peak_in_flight']} peak in flight"
+        )
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="questions per scenario and thread"
+    )
+    parser.add_argument("--scenarios", help="comma-separated subset to run")
+    parser.add_argument("--fixtures", help="corpus recorded with fake_entrez.py record")
+    parser.add_argument(
+        "--articles", type=int, default=5000, help="synthetic corpus size"
+    )
+    parser.add_argument("--entrez-latency", type=float, default=0.02)
+    parser.add_argument("--entrez-jitter", type=float, default=0.01)
+    parser.add_argument("--entrez-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--llm-jitter", type=float, default=0.02)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--ncbi-rate", type=float, default=10.0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    corpus = (
+        Corpus.load(args.fixtures) if args.fixtures else Corpus.synthetic(args.articles)
+    )
+    entrez = FakeEntrez(
+        corpus,
+        latency=args.entrez_latency,
+        jitter=args.entrez_jitter,
+        error_rate=args.entrez_error_rate,
+    ).start()
+    openai = FakeOpenAI(
+        latency=args.llm_latency,
+        jitter=args.llm_jitter,
+        rate_limit_rate=args.llm_rate_limit_rate,
+        server_error_rate=args.llm_error_rate,
+    ).start()
+    redirect_entrez(entrez.base_url)
+
+    bench = Bench(args, entrez, openai)
+    names = list(bench.scenarios())
+    if args.scenarios:
+        names = [name for name in args.scenarios.split(",") if name]
+        unknown = set(names) - set(bench.scenarios())
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    try:
+        results = {name: bench.run(name) for name in names}
+    finally:
+        entrez.stop()
+        openai.stop()
+
+    baseline_path = Path(args.baseline)
+    baseline = {}
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    print_report(results, baseline)
+
+    document = {
+        "settings": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "save_baseline", "scenarios")
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        if baseline:
+            document["scenarios"] = {**baseline.get("scenarios", {}), **results}
+        baseline_path.write_text(
+            json.dumps(document, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"Saved baseline to {baseline_path}")
+        return 0
+
+    changed = sorted(
+        key
+        for key, value in baseline.get("settings", {}).items()
+        if key != "tolerance" and document["settings"].get(key) != value
+    )
+    if changed:
+        print(f"Note: settings differ from the baseline: {', '.join(changed)}")
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
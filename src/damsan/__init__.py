@@ -1,21 +1,78 @@
-from .damsan import Damsan
-from dotenv import load_dotenv
+"""Clinical question answering over PubMed.
+
+Submodules are imported on first use: ``import damsan`` alone does not load
+langchain, openai, Bio.Entrez or numpy, which keeps the console script and
+short-lived workers fast to start. A ``.env`` file is loaded into the
+environment at the same point, the first time :class:`Damsan` or
+:class:`PubMedNeuralRetriever` is looked up.
+"""
+
+import importlib
 import os
 
-load_dotenv()
+__all__ = ["Damsan", "PubMedNeuralRetriever", "main"]
+
+_LAZY_ATTRIBUTES = {
+    "Damsan": ".damsan",
+    "PubMedNeuralRetriever": ".pubmed_engine",
+}
+
+_dotenv_loaded = False
+
+
+def _load_dotenv() -> None:
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        _dotenv_loaded = True
+        from dotenv import load_dotenv
+
+        load_dotenv()
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    _load_dotenv()
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
 
-def main():
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+def main(argv: list | None = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="damsan",
+        description="Search PubMed for the articles relevant to a clinical question.",
+        epilog=(
+            "Configuration is read from the environment (or a .env file): "
+            "PROMPT_PATH, MODEL, OPENAI_API_KEY, EMAIL and NCBI_API_KEY."
+        ),
+    )
+    parser.add_argument(
+        "question",
+        nargs="?",
+        default="What is the role of IL-17 in cancer?",
+        help="clinical question to search for",
+    )
+    args = parser.parse_args(argv)
+
+    from .damsan import Damsan
+
+    _load_dotenv()
     clinfo_ai = Damsan(
         prompt_file_path=os.getenv("PROMPT_PATH", ""),
         model=os.getenv("MODEL", ""),
-        engine="PubMed",
         openai_api_key=os.getenv("OPENAI_API_KEY", ""),
         email=os.getenv("EMAIL", ""),
+        ncbi_api_key=os.getenv("NCBI_API_KEY", ""),
         verbose=True,
     )
-    articles, queries = clinfo_ai.retrive_articles(
-        "What is the role of IL-17 in cancer?"
-    )
+    articles, queries = clinfo_ai.retrive_articles(args.question)
     print("articles:", articles)
     print("queries:", queries)
@@ -0,0 +1,377 @@
+"""A compact, memory-mapped store of abstracts and their BM25 term counts.
+
+Keeping every abstract of a large corpus as a Python string (plus a token list
+per document for BM25) costs several times the size of the text itself. An
+:class:`AbstractStore` keeps the corpus on disk as flat arrays instead and maps
+them into memory, so opening a store of millions of abstracts is instant, only
+the pages actually touched are read, and several processes share one copy
+through the OS page cache.
+
+A store is a directory holding:
+
+``pmids.npy``
+    The PMIDs, sorted (int64).
+``text.bin``, ``text_offsets.npy``
+    The UTF-8 abstracts back to back, and where each one starts; abstract
+    ``i`` is ``text.bin[text_offsets[i]:text_offsets[i + 1]]``.
+``terms.npy``, ``counts.npy``, ``term_offsets.npy``
+    For each abstract, the IDs of its distinct terms and how often each
+    occurs (int32), laid out like the text.
+``doc_lengths.npy``, ``df.npy``
+    Tokens per abstract and documents per term, for BM25.
+``vocabulary.bin``, ``vocabulary_offsets.npy``
+    The terms, sorted, so a term's ID is its position.
+``meta.json``
+    Format version and sizes.
+
+Build one with :meth:`AbstractStore.build` (for instance from
+:meth:`damsan.local_mirror.LocalPubMedMirror.iter_abstracts`) and score it
+with :class:`damsan.bm25.StoreBM25`.
+"""
+
+import json
+import mmap
+import os
+import shutil
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterable
+
+import numpy as np
+
+from .bm25 import _gather_ranges, tokenize
+
+FORMAT_VERSION = 1
+
+# Documents copied per step while the build rewrites its temporary files.
+_CHUNK_DOCS = 65536
+
+# Postings buffered in memory before the build appends them to disk.
+_BUFFER_POSTINGS = 1 << 20
+
+
+class _MappedStrings:
+    """Read-only sequence of the strings in a blob plus offsets, for bisect."""
+
+    def __init__(self, blob, offsets: np.ndarray) -> None:
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return str(self.blob[start:end], "utf-8")
+
+
+def _map_file(path: Path):
+    """Map ``path`` read-only; empty files (which mmap rejects) become ``b""``."""
+    if path.stat().st_size == 0:
+        return b""
+    with open(path, "rb") as handle:
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _gather_chunks(source, starts, ends, order):
+    """Yield ``source[starts[i]:ends[i]]`` for ``i`` in ``order``, a chunk at a time."""
+    for first in range(0, len(order), _CHUNK_DOCS):
+        chunk = order[first : first + _CHUNK_DOCS]
+        yield source[_gather_ranges(starts[chunk], ends[chunk] - starts[chunk])]
+
+
+def _npy_header(handle, dtype, size: int) -> None:
+    np.lib.format.write_array_header_1_0(
+        handle,
+        {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": (size,),
+        },
+    )
+
+
+class AbstractStore:
+    """Abstracts keyed by PMID in memory-mapped, columnar files.
+
+    Lookups by PMID are a binary search over the mapped PMID array, and
+    :meth:`raw` and :meth:`rows` return views into the mapped files without
+    copying. Opened stores are read-only; build a new one to change it.
+
+    Parameters
+    ----------
+    path : str or Path
+        Directory written by :meth:`build`.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with open(self.path / "meta.json", encoding="utf-8") as handle:
+            self.meta = json.load(handle)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported abstract store version {self.meta.get('version')} "
+                f"in {self.path}"
+            )
+
+        def load(name):
+            return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+        self.pmids = load("pmids")
+        self.text_offsets = load("text_offsets")
+        self.term_offsets = load("term_offsets")
+        self.terms = load("terms")
+        self.counts = load("counts")
+        self.doc_lengths = load("doc_lengths")
+        self.document_frequencies = load("df")
+        self._text = _map_file(self.path / "text.bin")
+        self.vocabulary = _MappedStrings(
+            _map_file(self.path / "vocabulary.bin"), load("vocabulary_offsets")
+        )
+
+    def __len__(self) -> int:
+        return len(self.pmids)
+
+    def __contains__(self, pmid) -> bool:
+        return self.position(pmid) >= 0
+
+    def __getitem__(self, pmid) -> str:
+        position = self.position(pmid)
+        if position < 0:
+            raise KeyError(pmid)
+        return self.text_at(position)
+
+    def get(self, pmid, default=None):
+        position = self.position(pmid)
+        return default if position < 0 else self.text_at(position)
+
+    @property
+    def average_doc_length(self) -> float:
+        return float(self.meta["avg_doc_length"])
+
+    def position(self, pmid) -> int:
+        """Row of ``pmid`` in every column, or ``-1`` if it is not in the store."""
+        return int(self.positions([pmid])[0])
+
+    def positions(self, pmids: Iterable) -> np.ndarray:
+        """Rows of ``pmids`` (``-1`` for the missing ones), in one vectorized search."""
+        wanted = np.asarray([int(pmid) for pmid in pmids], dtype=np.int64)
+        if not len(self.pmids):
+            return np.full(len(wanted), -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.pmids, wanted), len(self.pmids) - 1)
+        found[self.pmids[found] != wanted] = -1
+        return found
+
+    def raw(self, position: int) -> memoryview:
+        """The UTF-8 bytes of the abstract in row ``position``, without copying."""
+        start, end = self.text_offsets[position], self.text_offsets[position + 1]
+        return memoryview(self._text)[start:end]
+
+    def text_at(self, position: int) -> str:
+        return str(self.raw(position), "utf-8")
+
+    def texts(self, positions: Iterable[int]):
+        """Decode the abstracts in ``positions``, one at a time."""
+        for position in positions:
+            yield self.text_at(position)
+
+    def term_id(self, term: str) -> int:
+        """ID of ``term``, or ``-1`` if no abstract contains it."""
+        position = bisect_left(self.vocabulary, term)
+        if position < len(self.vocabulary) and self.vocabulary[position] == term:
+            return position
+        return -1
+
+    def term_ids(self, tokens: Iterable[str]) -> np.ndarray:
+        """IDs of the ``tokens`` that are in the vocabulary, in order."""
+        ids = (self.term_id(token) for token in tokens)
+        return np.fromiter((i for i in ids if i >= 0), dtype=np.int64)
+
+    def rows(self, positions: np.ndarray) -> tuple:
+        """``(indptr, terms, counts)`` CSR rows for ``positions``.
+
+        Contiguous ``positions`` (e.g. ``np.arange(a, b)``) come back as views
+        into the mapped files; arbitrary ones are gathered into new arrays.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.term_offsets[positions]
+        lengths = self.term_offsets[positions + 1] - starts
+        indptr = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        if len(positions) and np.all(np.diff(positions) == 1):
+            window = slice(int(starts[0]), int(starts[0]) + int(indptr[-1]))
+            return indptr, self.terms[window], self.counts[window]
+        postings = _gather_ranges(starts, lengths)
+        return indptr, self.terms[postings], self.counts[postings]
+
+    def iter_batches(self, batch_size: int = 65536):
+        """Yield ``(positions, indptr, terms, counts)`` for consecutive row ranges.
+
+        ``terms`` and ``counts`` are views into the mapped files, so a full pass
+        over the store holds at most one batch of postings in memory.
+        """
+        for start in range(0, len(self), batch_size):
+            positions = np.arange(start, min(start + batch_size, len(self)))
+            yield (positions, *self.rows(positions))
+
+    def close(self) -> None:
+        for blob in (self._text, self.vocabulary.blob):
+            if isinstance(blob, mmap.mmap):
+                blob.close()
+
+    @classmethod
+    def build(
+        cls,
+        path: str | Path,
+        records: Iterable[tuple],
+        tokenizer: Callable[[str], list] = tokenize,
+    ) -> "AbstractStore":
+        """Write a store of ``(pmid, abstract)`` ``records`` to the directory ``path``.
+
+        Records are streamed to disk as they come and need not be sorted; when a
+        PMID repeats, its last abstract is kept and records without an abstract
+        are skipped. Queries must be tokenized with the same ``tokenizer``
+        (:class:`damsan.bm25.StoreBM25` uses the default).
+
+        An existing store at ``path`` is replaced file by file once the new one
+        is complete; processes that have the old one open keep reading it.
+        """
+        path = Path(path)
+        scratch = path / "build.tmp"
+        staged = scratch / "store"
+        staged.mkdir(parents=True, exist_ok=True)
+        vocabulary = {}
+        pmids = array("q")
+        text_ends = array("q")
+        term_ends = array("q")
+        doc_lengths = array("l")
+        terms = array("i")
+        counts = array("i")
+        text_end = term_end = 0
+        try:
+            with (
+                open(scratch / "text", "wb") as text_file,
+                open(scratch / "terms", "wb") as terms_file,
+                open(scratch / "counts", "wb") as counts_file,
+            ):
+                for pmid, text in records:
+                    if text is None:
+                        continue
+                    data = text.encode("utf-8")
+                    counted = Counter(tokenizer(text))
+                    for term in counted:
+                        if term not in vocabulary:
+                            vocabulary[term] = len(vocabulary)
+                    terms.extend(map(vocabulary.__getitem__, counted))
+                    counts.extend(counted.values())
+                    text_file.write(data)
+                    text_end += len(data)
+                    term_end += len(counted)
+                    pmids.append(int(pmid))
+                    text_ends.append(text_end)
+                    term_ends.append(term_end)
+                    doc_lengths.append(counted.total())
+                    if len(terms) >= _BUFFER_POSTINGS:
+                        terms.tofile(terms_file)
+                        counts.tofile(counts_file)
+                        del terms[:], counts[:]
+                terms.tofile(terms_file)
+                counts.tofile(counts_file)
+            cls._finish(
+                staged,
+                scratch,
+                vocabulary,
+                np.asarray(pmids, dtype=np.int64),
+                np.asarray(text_ends, dtype=np.int64),
+                np.asarray(term_ends, dtype=np.int64),
+                np.asarray(doc_lengths, dtype=np.int32),
+            )
+            # meta.json goes last (False sorts first).
+            for name in sorted(os.listdir(staged), key=lambda n: n == "meta.json"):
+                os.replace(staged / name, path / name)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        return cls(path)
+
+    @staticmethod
+    def _finish(path, scratch, vocabulary, pmids, text_ends, term_ends, doc_lengths):
+        """Sort the streamed records by PMID and the vocabulary by term."""
+        # Stable sort, then keep the last record of every PMID.
+        order = np.argsort(pmids, kind="stable")
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = pmids[order][1:] != pmids[order][:-1]
+        order = order[last]
+        num_docs = len(order)
+
+        sorted_terms = sorted(vocabulary)
+        remap = np.empty(len(vocabulary), dtype=np.int32)
+        remap[[vocabulary[term] for term in sorted_terms]] = np.arange(
+            len(sorted_terms), dtype=np.int32
+        )
+        encoded = [term.encode("utf-8") for term in sorted_terms]
+        with open(path / "vocabulary.bin", "wb") as handle:
+            handle.write(b"".join(encoded))
+        vocabulary_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(
+            np.fromiter(map(len, encoded), np.int64, len(encoded)),
+            out=vocabulary_offsets[1:],
+        )
+        np.save(path / "vocabulary_offsets.npy", vocabulary_offsets)
+        del encoded, sorted_terms
+
+        def read_scratch(name, dtype):
+            if os.path.getsize(scratch / name) == 0:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(scratch / name, dtype=dtype, mode="r")
+
+        def offsets_of(ends):
+            starts = np.zeros_like(ends)
+            starts[1:] = ends[:-1]
+            offsets = np.zeros(num_docs + 1, dtype=np.int64)
+            np.cumsum((ends - starts)[order], out=offsets[1:])
+            return starts, offsets
+
+        text_starts, text_offsets = offsets_of(text_ends)
+        with open(path / "text.bin", "wb") as handle:
+            for chunk in _gather_chunks(
+                read_scratch("text", np.uint8), text_starts, text_ends, order
+            ):
+                handle.write(chunk)
+        np.save(path / "text_offsets.npy", text_offsets)
+
+        term_starts, term_offsets = offsets_of(term_ends)
+        num_postings = int(term_offsets[-1])
+        df = np.zeros(len(vocabulary), dtype=np.int64)
+        with open(path / "terms.npy", "wb") as handle:
+            _npy_header(handle, np.int32, num_postings)
+            for chunk in _gather_chunks(
+                read_scratch("terms", np.int32), term_starts, term_ends, order
+            ):
+                chunk = remap[chunk]
+                df += np.bincount(chunk, minlength=len(vocabulary))
+                handle.write(chunk)
+        with open(path / "counts.npy", "wb") as handle:
+            _npy_header(handle, np.int32, num_postings)
+            for chunk in _gather_chunks(
+                read_scratch("counts", np.int32), term_starts, term_ends, order
+            ):
+                handle.write(chunk)
+        np.save(path / "term_offsets.npy", term_offsets)
+        np.save(path / "df.npy", df)
+
+        np.save(path / "pmids.npy", pmids[order])
+        doc_lengths = doc_lengths[order]
+        np.save(path / "doc_lengths.npy", doc_lengths)
+        meta = {
+            "version": FORMAT_VERSION,
+            "documents": num_docs,
+            "terms": len(vocabulary),
+            "postings": num_postings,
+            "text_bytes": int(text_offsets[-1]),
+            "avg_doc_length": float(doc_lengths.mean()) if num_docs else 0.0,
+        }
+        # Moved into place last: a store without it is an unfinished build.
+        with open(path / "meta.json", "w", encoding="utf-8") as handle:
+            json.dump(meta, handle, indent=1)
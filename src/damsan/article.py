@@ -0,0 +1,155 @@
+"""Compact article records extracted from PubMed efetch results."""
+
+
+def reconstruct_abstract(abstract_elements) -> str:
+    """Join ``AbstractText`` elements, prefixing each section with its label."""
+    reconstructed_abstract = ""
+    for element in abstract_elements:
+        attributes = getattr(element, "attributes", {})
+        label = attributes.get("Label", "")
+        if reconstructed_abstract:
+            reconstructed_abstract += "\n\n"
+
+        if label:
+            reconstructed_abstract += f"{label}:\n"
+        reconstructed_abstract += str(element)
+    return reconstructed_abstract
+
+
+def _field(tree, *keys, default=""):
+    try:
+        for key in keys:
+            tree = tree[key]
+    except (KeyError, IndexError, TypeError):
+        return default
+    return tree
+
+
+class Article:
+    """The fields of a ``PubmedArticle`` the pipeline actually uses.
+
+    Built once at parse time with :meth:`from_pubmed` so the full Bio.Entrez
+    tree (references, history, MeSH headings, ...) can be dropped right away.
+
+    Attributes
+    ----------
+    pmid : str
+        PubMed identifier.
+    title : str
+        Article title.
+    abstract : str or None
+        Abstract with section labels, ``None`` when the article has none.
+    authors : str
+        Comma separated "LastName Initials" list.
+    journal, year, volume, issue, pages : str
+        Citation parts, empty when missing.
+    reference : str or None
+        Citation of the first entry of the reference list, if any.
+    """
+
+    __slots__ = (
+        "pmid",
+        "title",
+        "abstract",
+        "authors",
+        "journal",
+        "year",
+        "volume",
+        "issue",
+        "pages",
+        "reference",
+    )
+
+    def __init__(
+        self,
+        pmid: str,
+        title: str = "",
+        abstract: str | None = None,
+        authors: str = "",
+        journal: str = "",
+        year: str = "",
+        volume: str = "",
+        issue: str = "",
+        pages: str = "",
+        reference: str | None = None,
+    ) -> None:
+        self.pmid = pmid
+        self.title = title
+        self.abstract = abstract
+        self.authors = authors
+        self.journal = journal
+        self.year = year
+        self.volume = volume
+        self.issue = issue
+        self.pages = pages
+        self.reference = reference
+
+    @classmethod
+    def from_pubmed(cls, record) -> "Article":
+        """Extract an :class:`Article` from a parsed ``PubmedArticle`` element."""
+        citation = record["MedlineCitation"]
+        article = _field(citation, "Article", default={})
+
+        abstract = _field(article, "Abstract", "AbstractText", default=None)
+        if abstract is not None:
+            abstract = reconstruct_abstract(abstract)
+
+        try:
+            authors = ", ".join(
+                f"{author['LastName']} {author['Initials']}"
+                for author in article["AuthorList"]
+            )
+        except KeyError:
+            authors = ""
+
+        reference = _field(
+            record,
+            "PubmedData",
+            "ReferenceList",
+            0,
+            "Reference",
+            0,
+            "Citation",
+            default=None,
+        )
+
+        return cls(
+            pmid=str(citation["PMID"]),
+            title=str(_field(article, "ArticleTitle")),
+            abstract=abstract,
+            authors=authors,
+            journal=str(_field(article, "Journal", "Title")),
+            year=str(_field(record, "PubmedData", "History", 0, "Year")),
+            volume=str(_field(article, "Journal", "JournalIssue", "Volume")),
+            issue=str(_field(article, "Journal", "JournalIssue", "Issue")),
+            pages=str(_field(article, "Pagination", "MedlinePgn")),
+            reference=None if reference is None else str(reference),
+        )
+
+    @property
+    def url(self) -> str:
+        return f"https://pubmed.ncbi.nlm.nih.gov/{self.pmid}/"
+
+    @property
+    def ama_citation(self) -> str:
+        return (
+            f"{self.authors}. {self.title}. {self.journal}. "
+            f"{self.year};{self.volume}({self.issue}):{self.pages}."
+        )
+
+    @property
+    def citation(self) -> str:
+        """The first reference's citation when there is one, else the AMA citation."""
+        if self.reference is not None:
+            return self.reference
+        return self.ama_citation
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state) -> None:
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        return f"Article(pmid={self.pmid!r}, title={self.title!r})"
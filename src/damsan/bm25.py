@@ -1,5 +1,313 @@
+import re
+from typing import Callable, Hashable, Iterable
+
 import numpy as np
-from rank_bm25 import BM25Okapi
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case ``text`` and split it into word tokens."""
+    return _TOKEN.findall(text.lower())
+
+
+def _gather_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenate ``arange(start, start + length)`` for every pair, without a loop."""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+def _idf(df: np.ndarray, num_docs: int, epsilon: float) -> np.ndarray:
+    """BM25Okapi IDF per term, with its epsilon floor for negative values."""
+    idf = np.log(num_docs - df + 0.5) - np.log(df + 0.5)
+    present = df > 0
+    if present.any():
+        average_idf = idf[present].mean()
+        idf[present & (idf < 0)] = epsilon * average_idf
+    idf[~present] = 0.0
+    return idf
+
+
+def _term_weights(idf, tf, doc_len, avgdl: float, k1: float, b: float):
+    """BM25 contribution of terms with frequency ``tf`` in documents of ``doc_len``."""
+    tf = tf.astype(np.float64)
+    norm = k1 * (1 - b + b * doc_len / avgdl)
+    return idf * tf * (k1 + 1) / (tf + norm)
+
+
+class BM25Index:
+    """Okapi BM25 over a sparse term-document matrix.
+
+    Documents are stored as sparse term-count rows. On first use after a change
+    the rows are compiled into term-major CSR arrays holding precomputed BM25
+    weights, so scoring any number of queries is a single vectorized gather and
+    sum. Scores match ``rank_bm25.BM25Okapi`` for the same tokens and
+    parameters, including its epsilon floor for negative IDF values.
+
+    Parameters
+    ----------
+    corpus : iterable of str, optional
+        Initial documents.
+    doc_ids : iterable, optional
+        Keys for the initial documents, by default their positions.
+    k1, b, epsilon : float, optional
+        BM25 parameters, by default 1.5, 0.75 and 0.25.
+    tokenizer : callable, optional
+        Turns a string into a list of tokens, by default :func:`tokenize`.
+
+    Examples
+    --------
+    >>> index = BM25Index(["IL-17 in cancer", "IL-6 in sepsis", "diabetes and diet"])
+    >>> index.top_k("IL-17", 1).tolist()
+    [0]
+    """
+
+    def __init__(
+        self,
+        corpus: Iterable[str] = (),
+        doc_ids: Iterable[Hashable] | None = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        tokenizer: Callable[[str], list] = tokenize,
+    ) -> None:
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.tokenizer = tokenizer
+        self.vocabulary = {}
+        self._rows = {}
+        self._df = np.zeros(0, dtype=np.int64)
+        self._next_id = 0
+        self._compiled = None
+        self.add_documents(corpus, doc_ids)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def doc_ids(self) -> list:
+        """Document keys, in the column order of every score vector."""
+        return list(self._rows)
+
+    def _term_ids(self, tokens: list, grow: bool) -> np.ndarray:
+        if grow:
+            for token in tokens:
+                if token not in self.vocabulary:
+                    self.vocabulary[token] = len(self.vocabulary)
+            if len(self.vocabulary) > len(self._df):
+                df = np.zeros(max(len(self.vocabulary), 2 * len(self._df)), np.int64)
+                df[: len(self._df)] = self._df
+                self._df = df
+            return np.fromiter(
+                (self.vocabulary[token] for token in tokens), np.int64, len(tokens)
+            )
+        return np.fromiter(
+            (self.vocabulary[token] for token in tokens if token in self.vocabulary),
+            np.int64,
+        )
+
+    def add_document(self, text: str, doc_id: Hashable | None = None) -> Hashable:
+        """Add one document and return its key."""
+        if doc_id is None:
+            doc_id = self._next_id
+            self._next_id += 1
+        if doc_id in self._rows:
+            self.remove_document(doc_id)
+        terms, counts = np.unique(
+            self._term_ids(self.tokenizer(text), grow=True), return_counts=True
+        )
+        self._rows[doc_id] = (terms, counts)
+        self._df[terms] += 1
+        self._compiled = None
+        return doc_id
+
+    def add_documents(
+        self, texts: Iterable[str], doc_ids: Iterable[Hashable] | None = None
+    ) -> list:
+        if doc_ids is None:
+            return [self.add_document(text) for text in texts]
+        return [self.add_document(text, doc_id) for text, doc_id in zip(texts, doc_ids)]
+
+    def remove_document(self, doc_id: Hashable) -> None:
+        terms, _ = self._rows.pop(doc_id)
+        self._df[terms] -= 1
+        self._compiled = None
+
+    def _compile(self) -> tuple:
+        if self._compiled is not None:
+            return self._compiled
+
+        num_docs = len(self._rows)
+        vocab_size = len(self.vocabulary)
+        rows = list(self._rows.values())
+        lengths = np.fromiter((len(t) for t, _ in rows), np.int64, num_docs)
+        doc_len = np.fromiter((int(c.sum()) for _, c in rows), np.float64, num_docs)
+        if num_docs and lengths.sum():
+            terms = np.concatenate([t for t, _ in rows])
+            tf = np.concatenate([c for _, c in rows]).astype(np.float64)
+        else:
+            terms = np.zeros(0, np.int64)
+            tf = np.zeros(0, np.float64)
+        docs = np.repeat(np.arange(num_docs), lengths)
+
+        idf = _idf(self._df[:vocab_size], num_docs, self.epsilon)
+        avgdl = doc_len.mean() if num_docs and doc_len.sum() else 1.0
+        weights = _term_weights(idf[terms], tf, doc_len[docs], avgdl, self.k1, self.b)
+
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=vocab_size), out=indptr[1:])
+        self._compiled = (indptr, docs[order], weights[order], num_docs)
+        return self._compiled
+
+    def get_batch_scores(self, queries: Iterable[str]) -> np.ndarray:
+        """Score every query against every document.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape ``(len(queries), len(self))``.
+        """
+        indptr, posting_docs, posting_weights, num_docs = self._compile()
+        queries = list(queries)
+        query_rows = []
+        query_terms = []
+        for row, query in enumerate(queries):
+            terms = self._term_ids(self.tokenizer(query), grow=False)
+            query_rows.append(np.full(len(terms), row, dtype=np.int64))
+            query_terms.append(terms)
+        scores = np.zeros(len(queries) * num_docs, dtype=np.float64)
+        if query_terms and num_docs:
+            terms = np.concatenate(query_terms)
+            rows = np.concatenate(query_rows)
+            starts = indptr[terms]
+            lengths = indptr[terms + 1] - starts
+            postings = _gather_ranges(starts, lengths)
+            flat = np.repeat(rows, lengths) * num_docs + posting_docs[postings]
+            scores += np.bincount(
+                flat, weights=posting_weights[postings], minlength=len(scores)
+            )
+        return scores.reshape(len(queries), num_docs)
+
+    def get_scores(self, query: str) -> np.ndarray:
+        return self.get_batch_scores([query])[0]
+
+    def top_k(self, query: str, k: int) -> np.ndarray:
+        """Positions of the ``k`` best-scoring documents, best first."""
+        scores = self.get_scores(query)
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class StoreBM25:
+    """Okapi BM25 scored straight from an :class:`~damsan.abstract_store.AbstractStore`.
+
+    Term counts are read from the store's memory-mapped arrays, one batch of
+    documents at a time for a full pass, and IDF and the average document
+    length are those of the whole store. Scores therefore equal a
+    :class:`BM25Index` built over every abstract in the store, without ever
+    materializing the abstracts as strings or token lists.
+
+    Parameters
+    ----------
+    store : AbstractStore
+        Store to score.
+    k1, b, epsilon : float, optional
+        BM25 parameters, by default 1.5, 0.75 and 0.25.
+    tokenizer : callable, optional
+        Tokenizer the store was built with, by default :func:`tokenize`.
+    batch_size : int, optional
+        Documents scored per step of a full pass, by default 65536.
+
+    Examples
+    --------
+    >>> scorer = StoreBM25(AbstractStore("abstracts"))  # doctest: +SKIP
+    >>> scorer.top_k("IL-17 in cancer", 20)  # doctest: +SKIP
+    ['31415926', ...]
+    """
+
+    def __init__(
+        self,
+        store,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        tokenizer: Callable[[str], list] = tokenize,
+        batch_size: int = 65536,
+    ) -> None:
+        self.store = store
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.idf = _idf(
+            np.asarray(store.document_frequencies, dtype=np.float64),
+            len(store),
+            epsilon,
+        )
+        self.avgdl = store.average_doc_length or 1.0
+
+    def _score_rows(self, query, positions, indptr, terms, counts) -> np.ndarray:
+        query_terms, multiplicity = query
+        hits = np.flatnonzero(np.isin(terms, query_terms))
+        docs = np.searchsorted(indptr, hits, side="right") - 1
+        hit_terms = terms[hits]
+        weights = _term_weights(
+            self.idf[hit_terms],
+            counts[hits],
+            self.store.doc_lengths[positions[docs]],
+            self.avgdl,
+            self.k1,
+            self.b,
+        )
+        # A term repeated in the query counts once per repetition.
+        weights *= multiplicity[np.searchsorted(query_terms, hit_terms)]
+        return np.bincount(docs, weights=weights, minlength=len(positions))
+
+    def get_scores(self, query: str, pmids: Iterable | None = None) -> np.ndarray:
+        """Score ``query`` against every abstract, in PMID order, or against ``pmids``.
+
+        PMIDs that are not in the store score 0.
+        """
+        query = np.unique(
+            self.store.term_ids(self.tokenizer(query)), return_counts=True
+        )
+        if pmids is None:
+            scores = np.zeros(len(self.store), dtype=np.float64)
+            if len(query[0]):
+                for positions, *rows in self.store.iter_batches(self.batch_size):
+                    scores[positions[0] : positions[-1] + 1] = self._score_rows(
+                        query, positions, *rows
+                    )
+            return scores
+        positions = self.store.positions(pmids)
+        present = positions >= 0
+        scores = np.zeros(len(positions), dtype=np.float64)
+        if len(query[0]) and present.any():
+            found = positions[present]
+            scores[present] = self._score_rows(query, found, *self.store.rows(found))
+        return scores
+
+    def top_k(self, query: str, k: int, pmids: Iterable | None = None) -> list[str]:
+        """PMIDs of the ``k`` best-scoring abstracts (among ``pmids``), best first."""
+        if pmids is not None:
+            pmids = [str(pmid) for pmid in pmids]
+        scores = self.get_scores(query, pmids)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        best = candidates[np.argsort(-scores[candidates], kind="stable")]
+        if pmids is not None:
+            return [pmids[i] for i in best]
+        return [str(pmid) for pmid in self.store.pmids[best]]
 
 
 def bm25_return_n_articles(corpus: list, query: str, n: int = 20, return_scores=False):
@@ -8,8 +316,10 @@ def bm25_return_n_articles(corpus: list, query: str, n: int = 20, return_scores=
 
     Parameters
     ----------
-    corpus : list
-        A list of documents (each document is a string) to search within.
+    corpus : list or AbstractStore
+        A list of documents (each document is a string) to search within, or an
+        :class:`~damsan.abstract_store.AbstractStore`, which is scored with
+        :class:`StoreBM25` without loading it.
     query : str
         The query string to search for within the corpus.
     n : int, optional
@@ -34,16 +344,20 @@ def bm25_return_n_articles(corpus: list, query: str, n: int = 20, return_scores=
     array([0.7, 0.6, 0.5])
     """
 
-    tokenized_corpus = [doc.lower().split(" ") for doc in corpus]
-    bm25 = BM25Okapi(tokenized_corpus)
-    tokenized_query = query.lower().split(" ")
+    from .abstract_store import AbstractStore
+
+    if isinstance(corpus, AbstractStore):
+        scorer = StoreBM25(corpus)
+        if return_scores:
+            return scorer.get_scores(query)
+        return [corpus[pmid] for pmid in scorer.top_k(query, n)]
+
+    index = BM25Index(corpus)
     if return_scores:
-        doc_scores = bm25.get_scores(tokenized_query)
-        return doc_scores
+        return index.get_scores(query)
 
     else:
-        top_n = bm25.get_top_n(tokenized_query, corpus, n=n)
-        return top_n
+        return [corpus[i] for i in index.top_k(query, n)]
 
 
 def bm25_ranked(list_to_oganize, corpus: list, query: str, n: int = 20):
@@ -74,8 +388,6 @@ def bm25_ranked(list_to_oganize, corpus: list, query: str, n: int = 20):
     >>> bm25_ranked(list_to_oganize, corpus, query, n=2)
     ['item1', 'item2']
     """
-    new_order = np.argsort(
-        -1 * bm25_return_n_articles(corpus, query, return_scores=True)
-    )[0:n]
+    new_order = BM25Index(corpus).top_k(query, n)
     new_list = [list_to_oganize[i] for i in new_order]
     return new_list
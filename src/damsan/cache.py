@@ -0,0 +1,601 @@
+"""Caches that let the pipeline skip repeated NCBI and LLM round trips."""
+
+import os
+import re
+import json
+import pickle
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable
+
+_SQLITE_MAX_VARIABLES = 900
+
+# Passed as ``ttl`` to fall back to the store's default lifetime; ``None`` means
+# "never expires".
+DEFAULT_TTL = object()
+
+
+class MemoryCache:
+    """A thread-safe in-process LRU cache with the interface of :class:`SQLiteCache`.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Maximum number of entries to keep, by default 1024.
+    ttl : float, optional
+        Default lifetime of an entry in seconds, by default entries never expire.
+    """
+
+    def __init__(self, max_entries: int | None = 1024, ttl: float | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        keys = list(dict.fromkeys(str(key) for key in keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: Any, ttl=DEFAULT_TTL) -> None:
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, items: dict, ttl=DEFAULT_TTL) -> None:
+        ttl = self.ttl if ttl is DEFAULT_TTL else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        self.set_entries({key: (value, expires_at) for key, value in items.items()})
+
+    def set_entries(self, entries: dict) -> None:
+        """Store ``{key: (value, expires_at)}`` pairs with absolute expiry times."""
+        with self._lock:
+            for key, entry in entries.items():
+                key = str(key)
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(str(key), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(str(key))
+        return entry is not None and (entry[1] is None or entry[1] > time.time())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+        }
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteCache:
+    """A size-bounded key/value store persisted in a SQLite file.
+
+    Values are pickled. Entries are evicted least-recently-used first once
+    ``max_entries`` or ``max_bytes`` is exceeded, and expire ``ttl`` seconds
+    after they were written when a TTL is configured. The store is safe to share
+    between threads; several processes may open the same file.
+
+    Parameters
+    ----------
+    path : str or Path
+        Location of the SQLite database. Parent directories are created.
+    max_entries : int, optional
+        Maximum number of entries to keep, by default unbounded.
+    max_bytes : int, optional
+        Maximum total size of the pickled values, by default unbounded.
+    ttl : float, optional
+        Default lifetime of an entry in seconds, by default entries never expire.
+    table : str, optional
+        Name of the table holding the entries, by default "cache".
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+        table: str = "cache",
+    ) -> None:
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+        if self.path.parent and not self.path.parent.exists():
+            os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at "
+            f"ON {self.table} (accessed_at)"
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        """Return a ``{key: value}`` dict for every key that is present and fresh."""
+        return {key: value for key, (value, _) in self.get_entries(keys).items()}
+
+    def get_entries(self, keys: Iterable[str]) -> dict:
+        """Like :meth:`get_many`, with values as ``(value, expires_at)`` pairs."""
+        keys = list(dict.fromkeys(str(key) for key in keys))
+        found = {}
+        expired = []
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_MAX_VARIABLES):
+                chunk = keys[start : start + _SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, expires_at FROM {self.table} "
+                    f"WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    if expires_at is not None and expires_at <= now:
+                        expired.append(key)
+                    else:
+                        found[key] = (pickle.loads(value), expires_at)
+
+            if expired:
+                self._delete(expired)
+                self.expirations += len(expired)
+            if found:
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: Any, ttl=DEFAULT_TTL) -> None:
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, items: dict, ttl=DEFAULT_TTL) -> None:
+        """Store every ``{key: value}`` pair, then evict down to the configured bounds.
+
+        ``ttl`` overrides the store's default lifetime for these entries; pass
+        ``None`` to keep them until they are evicted.
+        """
+        ttl = self.ttl if ttl is DEFAULT_TTL else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        rows = []
+        for key, value in items.items():
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((str(key), blob, len(blob), expires_at, now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} "
+                    "(key, value, size, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._delete([str(key)])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT expires_at FROM {self.table} WHERE key = ?", (str(key),)
+            ).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    def __len__(self) -> int:
+        with self._lock:
+            (entries,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()
+        return entries
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size, for sizing the cache."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _delete(self, keys: list) -> None:
+        for start in range(0, len(keys), _SQLITE_MAX_VARIABLES):
+            chunk = keys[start : start + _SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ({placeholders})", chunk
+            )
+
+    def _evict(self) -> None:
+        self._conn.execute(
+            f"DELETE FROM {self.table} "
+            "WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),),
+        )
+        if self.max_entries is not None:
+            (entries,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()
+            excess = entries - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM "
+                    f"{self.table} ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+        if self.max_bytes is not None:
+            (size,) = self._conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+            if size > self.max_bytes:
+                victims = []
+                for key, entry_size in self._conn.execute(
+                    f"SELECT key, size FROM {self.table} ORDER BY accessed_at"
+                ):
+                    if size <= self.max_bytes:
+                        break
+                    victims.append(key)
+                    size -= entry_size
+                self._delete(victims)
+                self.evictions += len(victims)
+
+
+class ArticleStore(SQLiteCache):
+    """On-disk store of :class:`~damsan.article.Article` records keyed by PMID.
+
+    Used by :meth:`PubMedNeuralRetriever.fetch_article_data` so that only PMIDs
+    that are not in the store are sent to ``efetch``.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_entries: int | None = 50_000,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        super().__init__(
+            path,
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl=ttl,
+            table="articles",
+        )
+
+    @staticmethod
+    def pmid_of(article) -> str:
+        return article.pmid
+
+    def get_articles(self, article_ids: Iterable[str]) -> dict:
+        return self.get_many(article_ids)
+
+    def put_articles(self, articles: Iterable) -> None:
+        self.set_many({self.pmid_of(article): article for article in articles})
+
+
+class TieredCache:
+    """A fast cache in front of a slower, larger one.
+
+    Reads try ``front`` first and promote ``back`` hits into it, keeping the
+    expiry time they have in ``back``; writes go to both tiers.
+    """
+
+    def __init__(self, front, back=None):
+        self.front = front
+        self.back = back
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        keys = [str(key) for key in keys]
+        found = self.front.get_many(keys)
+        if self.back is not None and len(found) < len(keys):
+            promoted = self.back.get_entries([key for key in keys if key not in found])
+            if promoted:
+                self.front.set_entries(promoted)
+                found.update((key, value) for key, (value, _) in promoted.items())
+        return found
+
+    def set(self, key: str, value: Any, ttl=DEFAULT_TTL) -> None:
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, items: dict, ttl=DEFAULT_TTL) -> None:
+        self.front.set_many(items, ttl=ttl)
+        if self.back is not None:
+            self.back.set_many(items, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self.front.delete(key)
+        if self.back is not None:
+            self.back.delete(key)
+
+    def clear(self) -> None:
+        self.front.clear()
+        if self.back is not None:
+            self.back.clear()
+
+    def stats(self) -> dict:
+        stats = {"memory": self.front.stats()}
+        if self.back is not None:
+            stats["disk"] = self.back.stats()
+        return stats
+
+    def close(self) -> None:
+        self.front.close()
+        if self.back is not None:
+            self.back.close()
+
+
+_DATE_WINDOW = re.compile(
+    r"\s+AND\s+(\d{4}/\d{2}/\d{2}):(\d{4}/\d{2}/\d{2})\[dp\]\s*$", re.IGNORECASE
+)
+_BOOLEAN_OPERATORS = {"AND", "OR", "NOT"}
+
+
+class ESearchCache(TieredCache):
+    """Cache of esearch PMID lists, with an in-memory tier in front of a disk tier.
+
+    Entries are keyed by the normalized query text, ``retmax``, sort order and
+    the ``[dp]`` date window appended by
+    :meth:`PubMedNeuralRetriever.restrict_query`. Results for a window that
+    ended before today cannot change any more and are kept forever; everything
+    else expires after ``ttl`` seconds. Empty results are more often throttling
+    or a transient failure than a real miss, so they only live ``empty_ttl``
+    seconds.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        SQLite file for the disk tier, by default results are only kept in memory.
+    ttl : float, optional
+        Lifetime of open-ended query results in seconds, by default one day.
+    empty_ttl : float, optional
+        Lifetime of empty results in seconds, by default five minutes; 0 does
+        not cache them at all.
+    memory_entries : int, optional
+        Size of the in-memory tier, by default 1024.
+    disk_entries : int, optional
+        Size of the disk tier, by default 100000.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        ttl: float | None = 24 * 3600,
+        memory_entries: int | None = 1024,
+        disk_entries: int | None = 100_000,
+        empty_ttl: float = 300,
+    ) -> None:
+        back = None
+        if path is not None:
+            back = SQLiteCache(path, max_entries=disk_entries, ttl=ttl, table="esearch")
+        super().__init__(MemoryCache(max_entries=memory_entries, ttl=ttl), back)
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Collapse whitespace and case, keeping boolean operators upper case."""
+        query = re.sub(r"([()])", r" \1 ", query)
+        return " ".join(
+            token if token in _BOOLEAN_OPERATORS else token.lower()
+            for token in query.split()
+        )
+
+    @staticmethod
+    def split_date_window(query: str) -> tuple:
+        """Split ``query`` into ``(base_query, (lower, upper) or None)``."""
+        match = _DATE_WINDOW.search(query)
+        if match is None:
+            return query, None
+        return query[: match.start()], (match.group(1), match.group(2))
+
+    def key(self, query: str, retmax: int, sort: str = "relevance") -> str:
+        base_query, window = self.split_date_window(query)
+        window = ":".join(window) if window else "-"
+        return "|".join(
+            [self.normalize_query(base_query), str(retmax), sort or "-", window]
+        )
+
+    def ttl_for(self, query: str):
+        """``None`` (keep forever) for windows that closed before today."""
+        _, window = self.split_date_window(query)
+        if window is not None:
+            upper = datetime.strptime(window[1], "%Y/%m/%d").date()
+            if upper < datetime.now().date():
+                return None
+        return self.ttl
+
+    def get_ids(self, query: str, retmax: int, sort: str = "relevance"):
+        """Return the cached PMID list, or ``None`` on a miss."""
+        return self.get(self.key(query, retmax, sort))
+
+    def put_ids(
+        self, query: str, retmax: int, ids: list, sort: str = "relevance"
+    ) -> None:
+        if ids:
+            ttl = self.ttl_for(query)
+        elif self.empty_ttl > 0:
+            ttl = self.empty_ttl
+        else:
+            return
+        self.set(self.key(query, retmax, sort), list(ids), ttl=ttl)
+
+
+# Chat roles spelled as langchain message types, so that dict messages and
+# langchain messages with the same content share a cache key.
+_MESSAGE_TYPES = {"user": "human", "assistant": "ai"}
+
+
+def _message_role_and_content(message) -> tuple:
+    if isinstance(message, dict):
+        role = message.get("role", "")
+        return _MESSAGE_TYPES.get(role, role), message.get("content", "")
+    return getattr(message, "type", ""), getattr(message, "content", str(message))
+
+
+class LLMResponseCache:
+    """Content-addressed cache of LLM completions.
+
+    The key is a SHA-256 of the fully rendered messages together with the model
+    parameters, so identical (question, abstract, prompt template, model,
+    temperature) calls share one entry no matter which request made them.
+
+    Parameters
+    ----------
+    backend : optional
+        Any store with the ``get``/``set``/``stats`` interface of
+        :class:`MemoryCache` or :class:`SQLiteCache`, by default an in-memory LRU
+        of 4096 entries.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryCache(4096)
+        self.task_hits = {}
+        self.task_misses = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def in_memory(cls, max_entries: int | None = 4096, ttl: float | None = None):
+        return cls(MemoryCache(max_entries=max_entries, ttl=ttl))
+
+    @classmethod
+    def on_disk(
+        cls,
+        path: str | Path,
+        max_entries: int | None = 100_000,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+    ):
+        return cls(
+            SQLiteCache(
+                path, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl, table="llm"
+            )
+        )
+
+    @staticmethod
+    def key(messages: list, **params) -> str:
+        payload = json.dumps(
+            {
+                "messages": [_message_role_and_content(m) for m in messages],
+                "params": params,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, task: str = ""):
+        value = self.backend.get(key)
+        with self._lock:
+            counter = self.task_misses if value is None else self.task_hits
+            counter[task] = counter.get(task, 0) + 1
+        return value
+
+    def set(self, key: str, value) -> None:
+        self.backend.set(key, value)
+
+    def stats(self) -> dict:
+        tasks = {}
+        for task in set(self.task_hits) | set(self.task_misses):
+            hits = self.task_hits.get(task, 0)
+            misses = self.task_misses.get(task, 0)
+            tasks[task] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses),
+            }
+        return {"tasks": tasks, "backend": self.backend.stats()}
@@ -1,10 +1,14 @@
 """Clinical information retrieval orchestration for the damsan package."""
 
+import asyncio
+import contextlib
 import logging
+import queue
+import threading
+import time
 
-from .pubmed_engine import PubMedNeuralRetriever
-from .bm25 import bm25_ranked
-
+from .pubmed_engine import PubMedNeuralRetriever, SharedArticleFetches
+from .events import AnswerCompleted, SynthesisDelta
 
 logger = logging.getLogger(__name__)
 
@@ -14,9 +18,27 @@ class Damsan:
         self,
         prompt_file_path,
         model: str = "gpt-5",
-        openai_api_key: str = "YOUR API TOKEN",
+        openai_api_key: str = "",
         email: str = "YOUR EMAIL",
         verbose: bool = False,
+        query_concurrency: int = 3,
+        single_query_call: bool = False,
+        article_store=None,
+        esearch_cache=None,
+        llm_cache=None,
+        llm_backend=None,
+        max_connections: int = 64,
+        prescreen_min_score: float | None = None,
+        prescreen_top_n: int | None = None,
+        ncbi_api_key: str = "",
+        ncbi_rate_limiter=None,
+        llm_scheduler=None,
+        max_relevant: int | None = None,
+        time_budget: float | None = None,
+        synthesis_token_budget: int | None = None,
+        metrics=None,
+        local_mirror=None,
+        reranker=None,
     ) -> None:
 
         self.model = model
@@ -24,15 +46,53 @@ class Damsan:
         self.openai_api_key = openai_api_key
         self.verbose = verbose
         self.prompt_file_path = prompt_file_path
+        self.query_concurrency = query_concurrency
+        self.single_query_call = single_query_call
+        self.article_store = article_store
+        self.esearch_cache = esearch_cache
+        self.llm_cache = llm_cache
+        self.llm_backend = llm_backend
+        self.max_connections = max_connections
+        self.prescreen_min_score = prescreen_min_score
+        self.prescreen_top_n = prescreen_top_n
+        self.ncbi_api_key = ncbi_api_key
+        self.ncbi_rate_limiter = ncbi_rate_limiter
+        self.llm_scheduler = llm_scheduler
+        self.max_relevant = max_relevant
+        self.time_budget = time_budget
+        self.synthesis_token_budget = synthesis_token_budget
+        self.metrics = metrics
+        self.local_mirror = local_mirror
+        self.reranker = reranker
         self.init_engine()
 
     def init_engine(self):
-        self.retriever = PubMedNeuralRetriever(
+        engine, engine_kwargs = PubMedNeuralRetriever, {}
+        if self.local_mirror is not None:
+            # Searches and fetches go to the local PubMed mirror instead of Entrez.
+            from .local_mirror import LocalPubMedEngine
+
+            engine = LocalPubMedEngine
+            engine_kwargs["mirror"] = self.local_mirror
+        self.retriever = engine(
             prompt_file_path=self.prompt_file_path,
             model=self.model,
             verbose=self.verbose,
             openai_api_key=self.openai_api_key,
             email=self.email,
+            article_store=self.article_store,
+            esearch_cache=self.esearch_cache,
+            llm_cache=self.llm_cache,
+            llm_backend=self.llm_backend,
+            max_connections=self.max_connections,
+            prescreen_min_score=self.prescreen_min_score,
+            prescreen_top_n=self.prescreen_top_n,
+            ncbi_api_key=self.ncbi_api_key,
+            ncbi_rate_limiter=self.ncbi_rate_limiter,
+            llm_scheduler=self.llm_scheduler,
+            synthesis_token_budget=self.synthesis_token_budget,
+            reranker=self.reranker,
+            **engine_kwargs,
         )
         logger.info("PubMed Retriever initialized")
 
@@ -43,6 +103,8 @@ class Damsan:
                 num_results=16,
                 num_query_attempts=3,
                 restriction_date=restriction_date,
+                max_concurrency=self.query_concurrency,
+                single_query_call=self.single_query_call,
             )
             if (len(queries) == 0) or (len(article_ids) == 0):
                 logger.warning(
@@ -62,16 +124,73 @@ class Damsan:
             logger.exception("Internal service error; %s may be unavailable", error)
             return [], []
 
-    def summarize_relevant(self, articles, question):
+    async def retrive_articles_async(self, question, restriction_date=None):
+        try:
+            queries, article_ids = await self.retriever.search_pubmed_async(
+                question=question,
+                num_results=16,
+                num_query_attempts=3,
+                restriction_date=restriction_date,
+                max_concurrency=self.query_concurrency,
+                single_query_call=self.single_query_call,
+            )
+            if (len(queries) == 0) or (len(article_ids) == 0):
+                logger.warning(
+                    "No relevant articles found in %s for the provided question",
+                )
+                return [], []
+
+            articles = await self.retriever.fetch_article_data_async(article_ids)
+            return articles, queries
+        except Exception as error:
+            logger.exception("Internal service error; %s may be unavailable", error)
+            return [], []
+
+    def summarize_relevant(self, articles, question, deadline=None):
         article_summaries, irrelevant_articles = self.retriever.summarize_each_article(
-            articles, question
+            articles, question, max_relevant=self.max_relevant, deadline=deadline
         )
         return article_summaries, irrelevant_articles
 
-    def synthesis_task(self, article_summaries, question, bm25=False, with_url=True):
+    async def summarize_relevant_async(self, articles, question):
+        return await self.retriever.summarize_each_article_async(articles, question)
+
+    def tracing(self, question):
+        """Trace one answer with :attr:`metrics`; yields ``None`` when it is off."""
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.trace("answer", question=question)
+
+    def attach_metrics(self, result: dict, trace) -> dict:
+        if trace is not None:
+            result["metrics"] = self.metrics.summary(trace)
+        return result
+
+    def deadline(self):
+        """``time.monotonic()`` deadline for judging articles, from ``time_budget``."""
+        if self.time_budget is None:
+            return None
+        return time.monotonic() + self.time_budget
+
+    def rank_summaries(self, article_summaries, question, bm25=False):
+        """Order summaries for synthesis, best first.
+
+        With a :attr:`reranker`, summaries are ordered by embedding similarity of
+        their abstracts to the question, so the closest ones are those that fit
+        the synthesis budget; ``bm25`` then only keeps the top 20 of more than
+        21. Without one, ``bm25`` ranks and cuts with BM25 instead.
+        """
+        if self.reranker is not None and len(article_summaries) > 1:
+            logger.info("Ordering summaries by embedding similarity")
+            article_summaries = self.reranker.rank(question, article_summaries)
+            if bm25 and len(article_summaries) > 21:
+                article_summaries = article_summaries[:20]
+            return article_summaries
         if bm25:
             if len(article_summaries) > 21:
                 logger.info("Using BM25 to rank articles")
+                from .bm25 import bm25_ranked
+
                 corpus = [article["abstract"] for article in article_summaries]
                 article_summaries = bm25_ranked(
                     list_to_oganize=article_summaries,
@@ -79,12 +198,34 @@ class Damsan:
                     query=question,
                     n=20,
                 )
+        return article_summaries
 
+    def synthesis_task(self, article_summaries, question, bm25=False, with_url=True):
+        article_summaries = self.rank_summaries(article_summaries, question, bm25=bm25)
         synthesis = self.retriever.synthesize_all_articles(
             article_summaries, question, with_url=with_url
         )
         return synthesis
 
+    async def rank_summaries_async(self, article_summaries, question, bm25=False):
+        if self.reranker is None:
+            return self.rank_summaries(article_summaries, question, bm25=bm25)
+        # Embedding calls block; keep them off the event loop.
+        return await asyncio.to_thread(
+            self.rank_summaries, article_summaries, question, bm25
+        )
+
+    async def synthesis_task_async(
+        self, article_summaries, question, bm25=False, with_url=True
+    ):
+        article_summaries = await self.rank_summaries_async(
+            article_summaries, question, bm25=bm25
+        )
+        synthesis = await self.retriever.synthesize_all_articles_async(
+            article_summaries, question, with_url=with_url
+        )
+        return synthesis
+
     def answer(
         self, question, bm25=False, restriction_date=None, return_articles=True
     ) -> dict:
@@ -105,13 +246,31 @@ class Damsan:
         -------
         dict
             The result containing synthesis, article summaries, irrelevant articles,
-            and queries.
+            and queries. With :attr:`metrics` set, ``"metrics"`` holds the
+            answer's trace summary: time per stage and per kind of LLM and NCBI
+            call, token counts, cache hit rates and retry counts (see
+            :class:`~damsan.metrics.Trace`).
         """
-        articles, queries = self.retrive_articles(question, restriction_date)
-        article_summaries, irrelevant_articles = self.summarize_relevant(
-            articles=articles, question=question
-        )
-        synthesis = self.synthesis_task(article_summaries, question, bm25=bm25)
+        with self.tracing(question) as trace:
+            deadline = self.deadline()
+            articles, queries = self.retrive_articles(question, restriction_date)
+            article_summaries, irrelevant_articles = self.summarize_relevant(
+                articles=articles, question=question, deadline=deadline
+            )
+            synthesis = self.synthesis_task(article_summaries, question, bm25=bm25)
+            result = self.build_result(
+                synthesis,
+                article_summaries,
+                irrelevant_articles,
+                queries,
+                return_articles,
+            )
+        return self.attach_metrics(result, trace)
+
+    @staticmethod
+    def build_result(
+        synthesis, article_summaries, irrelevant_articles, queries, return_articles
+    ) -> dict:
         result = dict()
         result["synthesis"] = synthesis
         if return_articles:
@@ -120,3 +279,293 @@ class Damsan:
             result["queries"] = queries
 
         return result
+
+    async def answer_async(
+        self,
+        question,
+        bm25=False,
+        restriction_date=None,
+        return_articles=True,
+        fetches: SharedArticleFetches | None = None,
+    ) -> dict:
+        """Async counterpart of :meth:`answer`.
+
+        Article fetching and relevance/summary calls start as soon as the first
+        generated query returns PMIDs instead of waiting for every query attempt,
+        and no stage blocks the event loop, so one loop can serve many questions.
+        Takes the same parameters and returns the same dict as :meth:`answer`;
+        ``fetches`` shares article fetches with other questions (see
+        :meth:`answer_many_async`).
+        """
+        with self.tracing(question) as trace:
+            try:
+                (
+                    queries,
+                    _,
+                    _,
+                    article_summaries,
+                    irrelevant_articles,
+                ) = await self.retriever.search_and_summarize_async(
+                    question=question,
+                    num_results=16,
+                    num_query_attempts=3,
+                    restriction_date=restriction_date,
+                    max_concurrency=self.query_concurrency,
+                    single_query_call=self.single_query_call,
+                    max_relevant=self.max_relevant,
+                    deadline=self.deadline(),
+                    fetches=fetches,
+                )
+            except Exception as error:
+                logger.exception("Internal service error; %s may be unavailable", error)
+                queries, article_summaries, irrelevant_articles = [], [], []
+
+            synthesis = await self.synthesis_task_async(
+                article_summaries, question, bm25=bm25
+            )
+            result = self.build_result(
+                synthesis,
+                article_summaries,
+                irrelevant_articles,
+                queries,
+                return_articles,
+            )
+        return self.attach_metrics(result, trace)
+
+    async def answer_many_async(
+        self,
+        questions,
+        bm25=False,
+        restriction_date=None,
+        return_articles=True,
+        max_concurrency: int = 16,
+    ) -> list:
+        """Answer a batch of questions concurrently, fetching each article once.
+
+        Up to ``max_concurrency`` questions run at a time on one event loop.
+        Their LLM and NCBI calls all go through the retriever's shared
+        :class:`~damsan.scheduler.LLMScheduler` and
+        :class:`~damsan.ratelimit.NCBIRateLimiter`, so the batch moves as fast
+        as those quotas allow rather than one question at a time. Articles are
+        fetched through one :class:`~damsan.pubmed_engine.SharedArticleFetches`,
+        so a PMID found by several questions is downloaded and parsed once.
+
+        Parameters
+        ----------
+        questions : iterable of str
+            The questions to answer.
+        bm25, restriction_date, return_articles
+            As for :meth:`answer`, applied to every question.
+        max_concurrency : int, optional
+            Questions in flight at once, by default 16.
+
+        Returns
+        -------
+        list
+            One entry per question, in the order of ``questions``: the dict
+            :meth:`answer` returns, with an added ``"timing"`` dict holding
+            ``"queued"`` (seconds from the start of the batch until the question
+            started) and ``"elapsed"`` (seconds spent answering it). A question
+            that failed has the exception in its place.
+        """
+        questions = list(questions)
+        slots = asyncio.Semaphore(max(1, max_concurrency))
+        fetches = SharedArticleFetches(self.retriever)
+        batch_start = time.monotonic()
+
+        async def answer_one(question):
+            async with slots:
+                start = time.monotonic()
+                result = await self.answer_async(
+                    question,
+                    bm25=bm25,
+                    restriction_date=restriction_date,
+                    return_articles=return_articles,
+                    fetches=fetches,
+                )
+                end = time.monotonic()
+            result["timing"] = {"queued": start - batch_start, "elapsed": end - start}
+            return result
+
+        try:
+            results = await asyncio.gather(
+                *(answer_one(question) for question in questions),
+                return_exceptions=True,
+            )
+        finally:
+            fetches.close()
+
+        for question, result in zip(questions, results):
+            if isinstance(result, BaseException):
+                logger.error("Failed to answer %r: %s", question, result)
+        stats = fetches.stats()
+        logger.info(
+            "Answered %s questions in %.1fs; fetched %s articles for %s requested",
+            len(questions),
+            time.monotonic() - batch_start,
+            stats["fetched"],
+            stats["requested"],
+        )
+        return results
+
+    def answer_many(
+        self,
+        questions,
+        bm25=False,
+        restriction_date=None,
+        return_articles=True,
+        max_concurrency: int = 16,
+    ) -> list:
+        """Blocking counterpart of :meth:`answer_many_async`.
+
+        Runs the batch on a new event loop, so it cannot be called from a
+        coroutine; use :meth:`answer_many_async` there.
+        """
+
+        async def run():
+            try:
+                return await self.answer_many_async(
+                    questions,
+                    bm25=bm25,
+                    restriction_date=restriction_date,
+                    return_articles=return_articles,
+                    max_concurrency=max_concurrency,
+                )
+            finally:
+                await self.retriever.llm_backend.aclose()
+
+        return asyncio.run(run())
+
+    async def answer_stream_async(
+        self, question, bm25=False, restriction_date=None, return_articles=True
+    ):
+        """Answer a question, yielding progress events as they happen.
+
+        Yields, in order of occurrence, :class:`~damsan.events.QueryGenerated`,
+        :class:`~damsan.events.ArticlesFound` and
+        :class:`~damsan.events.ArticleProcessed` events while articles are
+        searched and summarized, then one :class:`~damsan.events.SynthesisDelta`
+        per chunk of the synthesis as the model generates it, and finally an
+        :class:`~damsan.events.AnswerCompleted` carrying the same dict that
+        :meth:`answer` returns. Takes the same parameters as :meth:`answer`.
+        """
+        with self.tracing(question) as trace:
+            events = asyncio.Queue()
+            deadline = self.deadline()
+
+            async def search_and_summarize():
+                try:
+                    (
+                        queries,
+                        _,
+                        _,
+                        article_summaries,
+                        irrelevant_articles,
+                    ) = await self.retriever.search_and_summarize_async(
+                        question=question,
+                        num_results=16,
+                        num_query_attempts=3,
+                        restriction_date=restriction_date,
+                        max_concurrency=self.query_concurrency,
+                        single_query_call=self.single_query_call,
+                        on_event=events.put_nowait,
+                        max_relevant=self.max_relevant,
+                        deadline=deadline,
+                    )
+                except Exception as error:
+                    logger.exception(
+                        "Internal service error; %s may be unavailable", error
+                    )
+                    return [], [], []
+                return queries, article_summaries, irrelevant_articles
+
+            pipeline = asyncio.ensure_future(search_and_summarize())
+            try:
+                while not pipeline.done() or not events.empty():
+                    if not events.empty():
+                        yield events.get_nowait()
+                        continue
+                    next_event = asyncio.ensure_future(events.get())
+                    await asyncio.wait(
+                        {next_event, pipeline}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if next_event.done():
+                        yield next_event.result()
+                    else:
+                        next_event.cancel()
+                queries, article_summaries, irrelevant_articles = pipeline.result()
+
+                ranked_summaries = await self.rank_summaries_async(
+                    article_summaries, question, bm25=bm25
+                )
+                chunks = []
+                async for chunk in self.retriever.synthesize_all_articles_stream(
+                    ranked_summaries, question, with_url=True
+                ):
+                    chunks.append(chunk)
+                    yield SynthesisDelta(chunk)
+            finally:
+                pipeline.cancel()
+
+            result = self.build_result(
+                "".join(chunks),
+                article_summaries,
+                irrelevant_articles,
+                queries,
+                return_articles,
+            )
+        yield AnswerCompleted(self.attach_metrics(result, trace))
+
+    def answer_stream(
+        self, question, bm25=False, restriction_date=None, return_articles=True
+    ):
+        """Blocking counterpart of :meth:`answer_stream_async`.
+
+        The pipeline runs on an event loop in a background thread; closing the
+        generator early cancels it.
+        """
+        events = queue.Queue()
+        finished = object()
+        running = {}
+        started = threading.Event()
+
+        async def pump():
+            running["loop"] = asyncio.get_running_loop()
+            running["task"] = asyncio.current_task()
+            started.set()
+            try:
+                async for event in self.answer_stream_async(
+                    question,
+                    bm25=bm25,
+                    restriction_date=restriction_date,
+                    return_articles=return_articles,
+                ):
+                    events.put(event)
+            except asyncio.CancelledError:
+                pass
+            except Exception as error:
+                events.put(error)
+            finally:
+                try:
+                    # The loop ends with this question; so do its connections.
+                    await self.retriever.llm_backend.aclose()
+                finally:
+                    events.put(finished)
+
+        thread = threading.Thread(target=asyncio.run, args=(pump(),), daemon=True)
+        thread.start()
+        try:
+            while True:
+                event = events.get()
+                if event is finished:
+                    break
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            started.wait()
+            try:
+                running["loop"].call_soon_threadsafe(running["task"].cancel)
+            except RuntimeError:
+                pass  # the loop has already finished
+            thread.join()
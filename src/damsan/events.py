@@ -0,0 +1,63 @@
+"""Events yielded by :meth:`damsan.Damsan.answer_stream`."""
+
+from dataclasses import asdict, dataclass, field
+from typing import ClassVar
+
+
+@dataclass(frozen=True)
+class Event:
+    """Base class of streamed events; ``type`` names the event in serialized form."""
+
+    type: ClassVar[str] = "event"
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, **asdict(self)}
+
+
+@dataclass(frozen=True)
+class QueryGenerated(Event):
+    """A PubMed query was generated and is about to be searched."""
+
+    type: ClassVar[str] = "query"
+    query: str
+
+
+@dataclass(frozen=True)
+class ArticlesFound(Event):
+    """The esearch for ``query`` returned ``pmids``, in rank order."""
+
+    type: ClassVar[str] = "pmids"
+    query: str
+    pmids: list[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class ArticleProcessed(Event):
+    """An article was judged, and summarized if relevant.
+
+    ``record`` is the same dict that ends up in ``article_summaries`` or
+    ``irrelevant_articles``.
+    """
+
+    type: ClassVar[str] = "article"
+    record: dict
+
+    @property
+    def is_relevant(self) -> bool:
+        return bool(self.record.get("is_relevant"))
+
+
+@dataclass(frozen=True)
+class SynthesisDelta(Event):
+    """The next chunk of the synthesized answer."""
+
+    type: ClassVar[str] = "synthesis_delta"
+    text: str
+
+
+@dataclass(frozen=True)
+class AnswerCompleted(Event):
+    """The final result, as returned by :meth:`damsan.Damsan.answer`."""
+
+    type: ClassVar[str] = "done"
+    result: dict
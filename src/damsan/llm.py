@@ -0,0 +1,279 @@
+"""Chat model backends used by :class:`PubMedNeuralRetriever`."""
+
+import asyncio
+import random
+import re
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, AsyncIterator, Callable
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+
+def to_langchain(messages: list) -> list:
+    """Convert ``{"role", "content"}`` dicts (or messages) to langchain messages."""
+    from langchain_core.messages import convert_to_messages
+
+    return convert_to_messages(messages)
+
+
+def message_content(message) -> str:
+    if isinstance(message, dict):
+        return message.get("content", "")
+    return getattr(message, "content", str(message))
+
+
+class LLMBackend:
+    """Minimal interface the retriever needs from a chat model.
+
+    Implementations must be safe to call from several threads and from several
+    coroutines at once.
+    """
+
+    def complete(
+        self, messages: list, temperature: float, max_tokens: int = 1024, n: int = 1
+    ) -> list[str]:
+        """Return ``n`` completions for ``messages``."""
+        raise NotImplementedError
+
+    async def acomplete(
+        self, messages: list, temperature: float, max_tokens: int = 1024, n: int = 1
+    ) -> list[str]:
+        return await asyncio.to_thread(
+            self.complete, messages, temperature, max_tokens, n
+        )
+
+    async def astream(
+        self, messages: list, temperature: float, max_tokens: int = 1024
+    ) -> AsyncIterator[str]:
+        """Yield one completion for ``messages`` in chunks as it is generated.
+
+        Backends that cannot stream yield the whole completion at once.
+        """
+        choices = await self.acomplete(messages, temperature, max_tokens, n=1)
+        yield choices[0]
+
+    async def aclose(self) -> None:
+        """Release what is bound to the running event loop, before it closes."""
+
+    def close(self) -> None:
+        pass
+
+
+class OpenAIChatBackend(LLMBackend):
+    """OpenAI chat backend with long-lived, pooled clients.
+
+    One ``ChatOpenAI`` client is kept per (model, temperature) and all of them
+    share a single keep-alive connection pool. Async clients are kept per event
+    loop because HTTP connections cannot move between loops.
+
+    Parameters
+    ----------
+    model : str
+        Chat model name.
+    api_key : str, optional
+        OpenAI API key, by default read from the environment.
+    base_url : str, optional
+        Alternative OpenAI-compatible endpoint.
+    max_connections : int, optional
+        Size of the shared connection pool, by default 64.
+    max_keepalive_connections : int, optional
+        Idle connections kept open for reuse, by default 32.
+    timeout : float, optional
+        Request timeout in seconds, by default 120.
+    max_retries : int, optional
+        Retries made by the OpenAI client itself, by default 0 so that
+        throttling reaches :class:`~damsan.scheduler.LLMScheduler`, which retries
+        and backs off for the whole process.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        timeout: float = 120.0,
+        max_retries: int = 0,
+    ) -> None:
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # Imported here rather than at module level to keep ``import damsan`` fast.
+        import httpx
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._http_client = httpx.Client(limits=self.limits, timeout=timeout)
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _new_client(self, temperature: float, **http_clients) -> "ChatOpenAI":
+        from langchain_openai import ChatOpenAI
+
+        options = {}
+        if self.api_key:
+            options["api_key"] = self.api_key
+        if self.base_url:
+            options["base_url"] = self.base_url
+        return ChatOpenAI(
+            model=self.model,
+            temperature=temperature,
+            timeout=self.timeout,
+            max_retries=self.max_retries,
+            **http_clients,
+            **options,
+        )
+
+    def client(self, temperature: float) -> "ChatOpenAI":
+        """Return the shared synchronous client for ``temperature``."""
+        key = (self.model, temperature)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._new_client(
+                        temperature, http_client=self._http_client
+                    )
+                    self._clients[key] = client
+        return client
+
+    def async_client(self, temperature: float) -> "ChatOpenAI":
+        """Return the async client for ``temperature`` bound to the running loop."""
+        loop = asyncio.get_running_loop()
+        key = (self.model, temperature)
+        with self._lock:
+            pool = self._async_clients.get(loop)
+            if pool is None:
+                import httpx
+
+                pool = {
+                    "http": httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+                }
+                self._async_clients[loop] = pool
+            client = pool.get(key)
+            if client is None:
+                client = self._new_client(
+                    temperature,
+                    http_client=self._http_client,
+                    http_async_client=pool["http"],
+                )
+                pool[key] = client
+        return client
+
+    # max_tokens is part of the interface but deliberately not forwarded: reasoning
+    # models spend part of it on hidden tokens, which would truncate answers.
+    def complete(
+        self, messages: list, temperature: float, max_tokens: int = 1024, n: int = 1
+    ) -> list[str]:
+        options = {"n": n} if n > 1 else {}
+        result = self.client(temperature).generate([to_langchain(messages)], **options)
+        return [generation.text for generation in result.generations[0]]
+
+    async def acomplete(
+        self, messages: list, temperature: float, max_tokens: int = 1024, n: int = 1
+    ) -> list[str]:
+        options = {"n": n} if n > 1 else {}
+        result = await self.async_client(temperature).agenerate(
+            [to_langchain(messages)], **options
+        )
+        return [generation.text for generation in result.generations[0]]
+
+    async def astream(
+        self, messages: list, temperature: float, max_tokens: int = 1024
+    ) -> AsyncIterator[str]:
+        async for chunk in self.async_client(temperature).astream(
+            to_langchain(messages)
+        ):
+            if chunk.content:
+                yield chunk.content
+
+    async def aclose(self) -> None:
+        """Close the async clients of the running loop.
+
+        Call it before a loop that used this backend shuts down (as
+        :meth:`Damsan.answer_many` and :meth:`Damsan.answer_stream` do): their
+        connections cannot outlive the loop and are otherwise never closed.
+        """
+        with self._lock:
+            pool = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool["http"].aclose()
+
+    def close(self) -> None:
+        """Close the sync client and the async clients of still-running loops."""
+        self._http_client.close()
+        with self._lock:
+            pools = list(self._async_clients.items())
+            self._async_clients.clear()
+        for loop, pool in pools:
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(pool["http"].aclose(), loop)
+
+
+class FakeLLMBackend(LLMBackend):
+    """Offline stand-in for a chat model, for tests and benchmarks.
+
+    Parameters
+    ----------
+    responder : callable, optional
+        Maps the list of messages to a completion. By default relevance prompts
+        are answered "yes" and everything else echoes the last message.
+    latency : float, optional
+        Seconds each call takes, by default 0.
+    jitter : float, optional
+        Uniform random extra latency in seconds, by default 0.
+    """
+
+    def __init__(
+        self,
+        responder: Callable[[list], str] | None = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+    ) -> None:
+        self.responder = responder or self.default_responder
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def default_responder(messages: list) -> str:
+        text = message_content(messages[-1])
+        if "yes or no" in text:
+            return "yes"
+        return text[:200]
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+        return self.latency + random.uniform(0, self.jitter)
+
+    def complete(
+        self, messages: list, temperature: float, max_tokens: int = 1024, n: int = 1
+    ) -> list[str]:
+        time.sleep(self._delay())
+        return [self.responder(messages) for _ in range(n)]
+
+    async def acomplete(
+        self, messages: list, temperature: float, max_tokens: int = 1024, n: int = 1
+    ) -> list[str]:
+        await asyncio.sleep(self._delay())
+        return [self.responder(messages) for _ in range(n)]
+
+    async def astream(
+        self, messages: list, temperature: float, max_tokens: int = 1024
+    ) -> AsyncIterator[str]:
+        await asyncio.sleep(self._delay())
+        text = self.responder(messages)
+        for token in re.findall(r"\S+\s*|\s+", text):
+            yield token
@@ -0,0 +1,798 @@
+"""A local copy of PubMed that stands in for Entrez esearch and efetch.
+
+The annual baseline and the daily update files NCBI publishes at
+https://ftp.ncbi.nlm.nih.gov/pubmed/ are loaded into one SQLite file: the
+:class:`~damsan.article.Article` records keyed by PMID, plus an FTS5 index of
+their titles, abstracts, MeSH headings, keywords, authors and journals.
+:class:`LocalPubMedEngine` then answers searches and fetches from that file, so
+retrieval takes milliseconds, needs no network and is not rate limited.
+
+Usage::
+
+    damsan-mirror ingest pubmed/baseline pubmed/updatefiles --db pubmed.sqlite
+    damsan-mirror search "(IL-17[tiab]) AND cancer[mh]" --db pubmed.sqlite
+    damsan-mirror abstracts pubmed-abstracts --db pubmed.sqlite
+"""
+
+import gzip
+import logging
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List
+
+from . import metrics
+from .article import Article
+from .pubmed_engine import PubMedNeuralRetriever
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_MAX_VARIABLES = 900
+
+_INDEXED_COLUMNS = ("title", "abstract", "mesh", "keywords", "authors", "journal")
+
+# bm25 weight of each indexed column, in the order of _INDEXED_COLUMNS.
+_COLUMN_WEIGHTS = (4.0, 1.0, 2.0, 2.0, 0.5, 0.5)
+
+# PubMed field tags and the indexed columns they search. Date tags filter on the
+# publication year instead; any other tag (publication type, language, ...) is
+# not indexed and its term is left out of the search.
+_FIELD_COLUMNS = {
+    "tiab": ("title", "abstract"),
+    "title/abstract": ("title", "abstract"),
+    "ti": ("title",),
+    "title": ("title",),
+    "ab": ("abstract",),
+    "abstract": ("abstract",),
+    "mh": ("mesh",),
+    "mesh": ("mesh",),
+    "mesh terms": ("mesh",),
+    "majr": ("mesh",),
+    "mesh major topic": ("mesh",),
+    "sh": ("mesh",),
+    "mesh subheading": ("mesh",),
+    "ot": ("keywords",),
+    "kw": ("keywords",),
+    "keyword": ("keywords",),
+    "other term": ("keywords",),
+    "au": ("authors",),
+    "author": ("authors",),
+    "1au": ("authors",),
+    "lastau": ("authors",),
+    "ta": ("journal",),
+    "jour": ("journal",),
+    "journal": ("journal",),
+    "tw": (),
+    "text word": (),
+    "all": (),
+    "all fields": (),
+}
+
+_DATE_FIELDS = {
+    "dp",
+    "pdat",
+    "date - publication",
+    "publication date",
+    "edat",
+    "date - entrez",
+    "crdt",
+    "date - create",
+}
+
+_TOKEN = re.compile(
+    r'\s*(?:(?P<paren>[()])|(?P<phrase>"[^"]*")|(?P<tag>\[[^\]]*\])'
+    r'|(?P<colon>:)|(?P<word>[^\s()"\[\]:]+))'
+)
+
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+def _text(element) -> str:
+    return "" if element is None else "".join(element.itertext())
+
+
+def article_from_xml(element) -> tuple:
+    """Extract an indexable record from a ``PubmedArticle`` ElementTree element.
+
+    Returns ``(article, year, mesh, keywords)``: the :class:`Article` (with the
+    same fields :meth:`Article.from_pubmed` gives for an efetch result), the
+    publication year as an int (or ``None``), and the MeSH headings and
+    author keywords as ``"; "`` separated strings.
+    """
+    citation = element.find("MedlineCitation")
+    article = citation.find("Article")
+    if article is None:
+        article = ElementTree.Element("Article")
+
+    abstract = None
+    sections = article.findall("Abstract/AbstractText")
+    if sections:
+        parts = []
+        for section in sections:
+            label = section.get("Label", "")
+            parts.append(f"{label}:\n{_text(section)}" if label else _text(section))
+        abstract = "\n\n".join(parts)
+
+    # As in Article.from_pubmed, a single author without a last name (e.g. a
+    # collective name) leaves the whole list empty.
+    names = []
+    for author in article.iterfind("AuthorList/Author"):
+        last_name, initials = author.findtext("LastName"), author.findtext("Initials")
+        if last_name is None or initials is None:
+            names = []
+            break
+        names.append(f"{last_name} {initials}")
+
+    reference = None
+    reference_list = element.find("PubmedData/ReferenceList")
+    if reference_list is not None:
+        first = reference_list.find("Reference")
+        if first is not None and first.find("Citation") is not None:
+            reference = _text(first.find("Citation"))
+
+    issue = article.find("Journal/JournalIssue")
+    if issue is None:
+        issue = ElementTree.Element("JournalIssue")
+    history_year = element.findtext("PubmedData/History/PubMedPubDate/Year", "")
+    published = issue.findtext("PubDate/Year") or issue.findtext(
+        "PubDate/MedlineDate", ""
+    )
+    year = re.match(r"\d{4}", published) or re.match(r"\d{4}", history_year)
+
+    record = Article(
+        pmid=citation.findtext("PMID", "").strip(),
+        title=_text(article.find("ArticleTitle")),
+        abstract=abstract,
+        authors=", ".join(names),
+        journal=article.findtext("Journal/Title", ""),
+        year=history_year,
+        volume=issue.findtext("Volume", ""),
+        issue=issue.findtext("Issue", ""),
+        pages=article.findtext("Pagination/MedlinePgn", ""),
+        reference=reference,
+    )
+    mesh = "; ".join(
+        _text(name) for name in citation.iterfind("MeshHeadingList/MeshHeading/*")
+    )
+    keywords = "; ".join(
+        _text(keyword) for keyword in citation.iterfind("KeywordList/Keyword")
+    )
+    return record, int(year.group()) if year else None, mesh, keywords
+
+
+def parse_pubmed_file(path: str) -> tuple:
+    """Parse one baseline or update file (``.xml`` or ``.xml.gz``).
+
+    Returns ``(rows, deleted)``: one row per ``PubmedArticle``, ready for
+    :meth:`LocalPubMedMirror.write`, and the PMIDs listed in
+    ``DeleteCitation``. Runs in the ingestion worker processes, so the rows
+    hold the pickled articles rather than the articles themselves.
+    """
+    opener = gzip.open if str(path).endswith(".gz") else open
+    rows = []
+    deleted = []
+    with opener(path, "rb") as handle:
+        events = ElementTree.iterparse(handle, events=("start", "end"))
+        _, root = next(events)
+        for event, element in events:
+            if event != "end":
+                continue
+            if element.tag == "PubmedArticle":
+                article, year, mesh, keywords = article_from_xml(element)
+                if article.pmid.isdigit():
+                    rows.append(
+                        (
+                            int(article.pmid),
+                            year,
+                            pickle.dumps(article, protocol=pickle.HIGHEST_PROTOCOL),
+                            article.title,
+                            article.abstract or "",
+                            mesh,
+                            keywords,
+                            article.authors,
+                            article.journal,
+                        )
+                    )
+                root.clear()
+            elif element.tag == "DeleteCitation":
+                deleted.extend(
+                    int(pmid.text) for pmid in element.iterfind("PMID") if pmid.text
+                )
+                root.clear()
+            elif element.tag == "PubmedBookArticle":
+                root.clear()
+    return rows, deleted
+
+
+def pubmed_files(paths: Iterable) -> list[Path]:
+    """Expand files and directories into PubMed XML files, in release order.
+
+    Update files must be applied after the baseline and after each other, which
+    their names (``pubmed25n0001.xml.gz``, ...) sort into.
+    """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(
+                child
+                for child in path.iterdir()
+                if child.name.endswith((".xml", ".xml.gz"))
+            )
+        else:
+            files.append(path)
+    return sorted(files, key=lambda path: path.name)
+
+
+def _fts_string(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _term(text: str, tag: str | None):
+    """FTS5 expression for one search term, or ``None`` if it cannot be searched."""
+    text = text.strip('"').strip()
+    prefix = text.endswith("*")
+    text = text.rstrip("*").strip()
+    if not re.search(r"\w", text):
+        return None
+    expression = _fts_string(text) + ("*" if prefix else "")
+    if tag is None:
+        return expression
+    columns = _FIELD_COLUMNS.get(tag)
+    if columns is None:
+        return None
+    if not columns:
+        return expression
+    return "{" + " ".join(columns) + "}: " + expression
+
+
+def _years(low: str, high: str | None = None) -> tuple:
+    low_year = re.match(r"\d{4}", low)
+    high_year = re.match(r"\d{4}", high if high is not None else low)
+    return (
+        "years",
+        int(low_year.group()) if low_year else None,
+        int(high_year.group()) if high_year else None,
+    )
+
+
+class _QueryParser:
+    """Turns PubMed query syntax into a small tree.
+
+    Nodes are ``("match", fts5 expression)``, ``("years", low, high)``,
+    ``(operator, left, right)`` or ``None`` for a term that cannot be searched
+    locally. Like PubMed, operators apply left to right and adjacent terms are
+    joined with AND.
+    """
+
+    def __init__(self, query: str) -> None:
+        self.tokens = [
+            (match.lastgroup, match.group(match.lastgroup))
+            for match in _TOKEN.finditer(query)
+            if match.lastgroup
+        ]
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def take_tag(self) -> str | None:
+        if self.peek()[0] == "tag":
+            tag = self.take()[1][1:-1].strip().lower()
+            return tag.split(":")[0].strip()
+        return None
+
+    def parse(self):
+        node = self.expression()
+        while self.position < len(self.tokens):
+            # Unbalanced closing parenthesis: skip it and keep going.
+            self.take()
+            node = ("AND", node, self.expression())
+        return node
+
+    def expression(self):
+        node = self.operand()
+        while True:
+            kind, value = self.peek()
+            if kind is None or value == ")":
+                return node
+            if kind == "word" and value in _OPERATORS:
+                self.take()
+                node = (value, node, self.operand())
+            else:
+                node = ("AND", node, self.operand())
+
+    def operand(self):
+        kind, value = self.take()
+        if value == "(":
+            node = self.expression()
+            if self.peek()[1] == ")":
+                self.take()
+            return node
+        if kind not in ("word", "phrase"):
+            return None
+        tag = self.take_tag()
+        if self.peek()[0] == "colon":
+            self.take()
+            high_kind, high = self.peek()
+            if high_kind in ("word", "phrase"):
+                self.take()
+                tag = self.take_tag() or tag
+                if tag in _DATE_FIELDS:
+                    return _years(value.strip('"'), high.strip('"'))
+                return ("AND", _leaf(value, tag), _leaf(high, tag))
+        if tag in _DATE_FIELDS:
+            return _years(value.strip('"'))
+        return _leaf(value, tag)
+
+
+def _leaf(text: str, tag: str | None):
+    expression = _term(text, tag)
+    return None if expression is None else ("match", expression)
+
+
+def _render(node) -> str | None:
+    """FTS5 expression for ``node``; ``None`` matches everything."""
+    if node is None or node[0] == "years":
+        return None
+    if node[0] == "match":
+        return node[1]
+    operator, left, right = node
+    left, right = _render(left), _render(right)
+    if operator == "AND":
+        if left is None or right is None:
+            return left or right
+        return f"({left} AND {right})"
+    if operator == "OR":
+        if left is None or right is None:
+            return None
+        return f"({left} OR {right})"
+    if right is None:
+        return left
+    if left is None:
+        return None
+    return f"({left} NOT {right})"
+
+
+def translate_query(query: str) -> tuple:
+    """Translate a PubMed query into ``(fts5 expression, (low, high) years)``.
+
+    Boolean operators, parentheses, quoted phrases, truncation (``canc*``) and
+    the title, abstract, MeSH, keyword, author and journal field tags are
+    supported. Publication date ranges ANDed onto the whole query (as
+    :meth:`PubMedNeuralRetriever.restrict_query` adds them) become the year
+    range; elsewhere, and for tags that are not indexed, the term is dropped.
+    Either part of the result is ``None`` when the query does not restrict it.
+    """
+    tree = _QueryParser(query).parse()
+    conjuncts = []
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        if node is not None and node[0] == "AND":
+            pending.extend((node[2], node[1]))
+        else:
+            conjuncts.append(node)
+    low, high = None, None
+    for node in conjuncts:
+        if node is not None and node[0] == "years":
+            if node[1] is not None:
+                low = node[1] if low is None else max(low, node[1])
+            if node[2] is not None:
+                high = node[2] if high is None else min(high, node[2])
+    expressions = [
+        expression for expression in map(_render, conjuncts) if expression is not None
+    ]
+    expression = " AND ".join(expressions) if expressions else None
+    years = None if low is None and high is None else (low, high)
+    return expression, years
+
+
+def _fallback_expression(query: str) -> str | None:
+    words = re.findall(r"\w+", re.sub(r"\[[^\]]*\]", " ", query))
+    words = [word for word in words if word not in _OPERATORS]
+    return " OR ".join(map(_fts_string, dict.fromkeys(words))) or None
+
+
+class LocalPubMedMirror:
+    """PubMed articles and their full-text index in one SQLite file.
+
+    Loaded with :meth:`ingest` from the baseline and daily update files, then
+    queried with :meth:`search` and :meth:`get_articles`. The mirror is safe to
+    share between threads; several processes may read the same file.
+
+    Parameters
+    ----------
+    path : str or Path
+        Location of the SQLite database. Parent directories are created.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        if self.path.parent and not self.path.parent.exists():
+            os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            "pmid INTEGER PRIMARY KEY, year INTEGER, article BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5("
+            + ", ".join(_INDEXED_COLUMNS)
+            + ", tokenize='porter unicode61')"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "name TEXT PRIMARY KEY, articles INTEGER NOT NULL, "
+            "deleted INTEGER NOT NULL, ingested_at REAL NOT NULL)"
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def ingested_files(self) -> set:
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM files").fetchall()
+        return {name for (name,) in rows}
+
+    def ingest(
+        self, paths: Iterable, workers: int | None = None, force: bool = False
+    ) -> dict:
+        """Load baseline and update files (or directories of them) into the mirror.
+
+        Files are parsed in parallel on ``workers`` processes (by default one per
+        CPU, ``1`` parses in this process) and written one at a time in release
+        order, so a newer version of an article, or its deletion, always wins.
+        Files that were already ingested are skipped unless ``force`` is set.
+
+        Returns
+        -------
+        dict
+            Number of files ingested and skipped, and of articles written and
+            deleted.
+        """
+        files = pubmed_files(paths)
+        done = set() if force else self.ingested_files()
+        todo = [path for path in files if path.name not in done]
+        totals = {
+            "files": len(todo),
+            "skipped": len(files) - len(todo),
+            "articles": 0,
+            "deleted": 0,
+        }
+        workers = (os.cpu_count() or 1) if workers is None else max(1, workers)
+        started = time.perf_counter()
+
+        def write(path, parsed):
+            rows, deleted = parsed
+            self.write(path.name, rows, deleted)
+            totals["articles"] += len(rows)
+            totals["deleted"] += len(deleted)
+            logger.info(
+                f"Ingested {path.name}: {len(rows)} articles, {len(deleted)} "
+                f"deleted ({time.perf_counter() - started:.1f}s elapsed)"
+            )
+
+        if workers == 1 or len(todo) <= 1:
+            for path in todo:
+                write(path, parse_pubmed_file(str(path)))
+            return totals
+
+        # Parsing runs ahead of the single writer by at most two files per
+        # worker, which bounds the parsed rows held in memory.
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            pending = deque()
+            for path in todo:
+                pending.append((path, pool.submit(parse_pubmed_file, str(path))))
+                if len(pending) >= 2 * workers:
+                    path, future = pending.popleft()
+                    write(path, future.result())
+            while pending:
+                path, future = pending.popleft()
+                write(path, future.result())
+        return totals
+
+    def write(self, name: str, rows: list, deleted: Iterable[int] = ()) -> None:
+        """Replace the articles in ``rows`` and drop ``deleted`` in one transaction.
+
+        ``rows`` are the ``(pmid, year, pickled article, *indexed columns)``
+        tuples :func:`parse_pubmed_file` produces; ``name`` records the file they
+        came from.
+        """
+        replaced = [row[0] for row in rows] + list(deleted)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for start in range(0, len(replaced), _SQLITE_MAX_VARIABLES):
+                    chunk = replaced[start : start + _SQLITE_MAX_VARIABLES]
+                    placeholders = ",".join("?" * len(chunk))
+                    self._conn.execute(
+                        f"DELETE FROM articles WHERE pmid IN ({placeholders})", chunk
+                    )
+                    self._conn.execute(
+                        f"DELETE FROM articles_fts WHERE rowid IN ({placeholders})",
+                        chunk,
+                    )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO articles (pmid, year, article) "
+                    "VALUES (?, ?, ?)",
+                    [row[:3] for row in rows],
+                )
+                self._conn.executemany(
+                    "INSERT INTO articles_fts (rowid, "
+                    + ", ".join(_INDEXED_COLUMNS)
+                    + ") VALUES (?"
+                    + ", ?" * len(_INDEXED_COLUMNS)
+                    + ")",
+                    [(row[0], *row[3:]) for row in rows],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files "
+                    "(name, articles, deleted, ingested_at) VALUES (?, ?, ?, ?)",
+                    (name, len(rows), len(replaced) - len(rows), time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def optimize(self) -> None:
+        """Merge the full-text index into one b-tree, which speeds up searches."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO articles_fts (articles_fts) VALUES ('optimize')"
+            )
+
+    def search(self, query: str, num_results: int = 10) -> list[str]:
+        """PMIDs matching the PubMed ``query``, best bm25 score first.
+
+        See :func:`translate_query` for the supported syntax. If nothing in the
+        query translates, or SQLite rejects the translated expression, the
+        query's words are searched for with OR; a query without any words finds
+        nothing.
+        """
+        expression, years = translate_query(query)
+        if expression is None:
+            expression = _fallback_expression(query)
+            if expression is None:
+                logger.warning(f"No search terms in {query!r}; returning no PMIDs")
+                return []
+            logger.warning(f"Could not translate {query!r}; searching its words")
+        try:
+            return self._search(expression, years, num_results)
+        except sqlite3.OperationalError as error:
+            logger.warning(f"Falling back to a word search for {query!r}: {error}")
+            return self._search(_fallback_expression(query), years, num_results)
+
+    def _search(self, expression, years, num_results: int) -> list[str]:
+        conditions, params = [], []
+        if years is not None:
+            low, high = years
+            if low is not None:
+                conditions.append("a.year >= ?")
+                params.append(low)
+            if high is not None:
+                conditions.append("a.year <= ?")
+                params.append(high)
+        join = ""
+        if conditions:
+            join = "JOIN articles a ON a.pmid = articles_fts.rowid "
+        weights = ", ".join(map(str, _COLUMN_WEIGHTS))
+        sql = (
+            f"SELECT articles_fts.rowid FROM articles_fts {join}"
+            f"WHERE articles_fts MATCH ? "
+            + "".join(f"AND {condition} " for condition in conditions)
+            + f"ORDER BY bm25(articles_fts, {weights})"
+        )
+        params.insert(0, expression)
+        with self._lock:
+            rows = self._conn.execute(sql + " LIMIT ?", (*params, num_results))
+            return [str(pmid) for (pmid,) in rows.fetchall()]
+
+    def get_articles(self, article_ids: Iterable[str]) -> dict:
+        """Return ``{pmid: Article}`` for the PMIDs that are in the mirror."""
+        pmids = [
+            int(pmid) for pmid in dict.fromkeys(map(str, article_ids)) if pmid.isdigit()
+        ]
+        found = {}
+        with self._lock:
+            for start in range(0, len(pmids), _SQLITE_MAX_VARIABLES):
+                chunk = pmids[start : start + _SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    "SELECT pmid, article FROM articles "
+                    f"WHERE pmid IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for pmid, article in rows:
+                    found[str(pmid)] = pickle.loads(article)
+        return found
+
+    def iter_abstracts(self, page_size: int = 10_000):
+        """Yield ``(pmid, abstract)`` for every article with an abstract, by PMID.
+
+        Reads a page at a time, e.g. to build an
+        :class:`~damsan.abstract_store.AbstractStore` of the whole mirror.
+        """
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, abstract FROM articles_fts WHERE rowid > ? "
+                    "ORDER BY rowid LIMIT ?",
+                    (last, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            for pmid, abstract in rows:
+                if abstract:
+                    yield str(pmid), abstract
+            last = rows[-1][0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class LocalPubMedEngine(PubMedNeuralRetriever):
+    """A :class:`PubMedNeuralRetriever` that searches and fetches from a local mirror.
+
+    Only the two Entrez primitives are replaced: :meth:`run_esearch` searches
+    the mirror and :meth:`fetch_batch` reads articles from it. Query generation,
+    relevance, summaries and synthesis, and every sync, async and streaming
+    path built on those primitives, work unchanged.
+
+    Parameters
+    ----------
+    prompt_file_path : str
+        Prompt architecture file, as for :class:`PubMedNeuralRetriever`.
+    mirror : LocalPubMedMirror or str or Path
+        The mirror, or the path of its SQLite file.
+    **kwargs
+        Passed on to :class:`PubMedNeuralRetriever`. The esearch cache is not
+        used, since searching the mirror is about as fast as reading it.
+    """
+
+    def __init__(
+        self, prompt_file_path: str, mirror: LocalPubMedMirror | str | Path, **kwargs
+    ):
+        if isinstance(mirror, (str, Path)):
+            mirror = LocalPubMedMirror(mirror)
+        self.mirror = mirror
+        super().__init__(prompt_file_path, **kwargs)
+
+    def configure_entrez(self) -> None:
+        pass
+
+    def run_esearch(
+        self, pubmed_query: str, num_results: int = 10, verbose: bool = False
+    ) -> list[str]:
+        """Search the mirror for ``pubmed_query`` and return PMIDs in rank order."""
+        with metrics.span("mirror.search", retmax=num_results) as span:
+            retrieved_ids = self.mirror.search(pubmed_query, num_results)
+            span.set(ids=len(retrieved_ids))
+        if not retrieved_ids:
+            logger.warning(f"Failed to retrieve IDs for query: {pubmed_query}")
+        if verbose:
+            print(f"Retrieved {len(retrieved_ids)} IDs")
+            print(retrieved_ids)
+        return retrieved_ids
+
+    def fetch_batch(self, article_ids: List[str]):
+        """Yield the articles of ``article_ids`` that are in the mirror, in order."""
+        with metrics.span("mirror.fetch", ids=len(article_ids)) as span:
+            found = self.mirror.get_articles(article_ids)
+            span.set(articles=len(found))
+        for pmid in article_ids:
+            if str(pmid) in found:
+                yield found[str(pmid)]
+
+
+def main(argv: list | None = None):
+    import argparse
+
+    # Accepted after the command name as well as before it.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--db",
+        default=argparse.SUPPRESS,
+        help="mirror database (default: pubmed.sqlite)",
+    )
+    common.add_argument("--log-level", default=argparse.SUPPRESS)
+    parser = argparse.ArgumentParser(
+        prog="damsan-mirror",
+        description="Build and query a local PubMed mirror.",
+        parents=[common],
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser(
+        "ingest",
+        help="load baseline and update files into the mirror",
+        parents=[common],
+    )
+    ingest.add_argument(
+        "paths", nargs="+", help="pubmed*.xml(.gz) files or directories of them"
+    )
+    ingest.add_argument(
+        "--workers", type=int, help="parser processes (default: one per CPU)"
+    )
+    ingest.add_argument(
+        "--force", action="store_true", help="re-ingest files already loaded"
+    )
+    ingest.add_argument(
+        "--optimize",
+        action="store_true",
+        help="merge the full-text index afterwards (slow, speeds up searches)",
+    )
+
+    search = commands.add_parser("search", help="search the mirror", parents=[common])
+    search.add_argument("query", help="PubMed query")
+    search.add_argument("-n", "--num-results", type=int, default=10)
+
+    abstracts = commands.add_parser(
+        "abstracts",
+        help="export the abstracts to a memory-mapped store for BM25 ranking",
+        parents=[common],
+    )
+    abstracts.add_argument("out", help="directory of the abstract store")
+    args = parser.parse_args(argv)
+    args.db = getattr(args, "db", "pubmed.sqlite")
+
+    logging.basicConfig(
+        level=getattr(args, "log_level", "INFO").upper(),
+        format="%(asctime)s %(name)s %(message)s",
+    )
+    mirror = LocalPubMedMirror(args.db)
+    if args.command == "ingest":
+        totals = mirror.ingest(args.paths, workers=args.workers, force=args.force)
+        if args.optimize:
+            mirror.optimize()
+        print(
+            f"{totals['files']} files ingested ({totals['skipped']} already "
+            f"loaded): {totals['articles']} articles written, "
+            f"{totals['deleted']} deleted; {len(mirror)} articles in {args.db}"
+        )
+    elif args.command == "abstracts":
+        from .abstract_store import AbstractStore
+
+        store = AbstractStore.build(args.out, mirror.iter_abstracts())
+        print(
+            f"{len(store)} abstracts, {store.meta['terms']} terms, "
+            f"{store.meta['text_bytes'] / 2**20:.1f} MiB of text in {args.out}"
+        )
+        store.close()
+    else:
+        started = time.perf_counter()
+        pmids = mirror.search(args.query, args.num_results)
+        elapsed = time.perf_counter() - started
+        articles = mirror.get_articles(pmids)
+        for pmid in pmids:
+            article = articles[pmid]
+            print(f"{article.pmid}\t{article.year}\t{article.title}")
+        print(f"{len(pmids)} results in {elapsed * 1000:.1f} ms")
+    mirror.close()
+
+
+if __name__ == "__main__":
+    main()
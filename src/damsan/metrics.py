@@ -0,0 +1,533 @@
+"""Per-answer tracing: timed spans, counters and pluggable export sinks.
+
+Instrumented code calls :func:`span`, :func:`start_span` and :func:`count`, or
+is decorated with :func:`traced`. These record into the :class:`Trace` active
+in the current context, which :meth:`Metrics.trace` sets up around one answer,
+and cost one context-variable lookup when no trace is active. Work handed to a
+thread pool keeps its trace when submitted through :func:`bind`; ``asyncio``
+tasks and ``asyncio.to_thread`` keep it on their own.
+
+A finished trace is exported to every sink of its :class:`Metrics`:
+:class:`JSONLogSink` (one JSON line per answer), :class:`PrometheusSink`
+(aggregated histograms and counters in the Prometheus text format) or
+:class:`OpenTelemetrySink` (spans replayed into an OpenTelemetry tracer).
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar("damsan_trace", default=None)
+_current_span = contextvars.ContextVar("damsan_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """A timed operation within a :class:`Trace`.
+
+    Used as a context manager it becomes the parent of spans opened inside it;
+    :func:`start_span` spans are finished explicitly with :meth:`finish`
+    instead, which suits generators that cannot hold a context across yields.
+    """
+
+    __slots__ = (
+        "span_id",
+        "parent_id",
+        "name",
+        "attributes",
+        "start",
+        "end",
+        "error",
+        "_trace",
+        "_token",
+    )
+
+    def __init__(self, trace: "Trace", name: str, attributes: dict) -> None:
+        parent = _current_span.get()
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end = None
+        self.error = None
+        self._trace = trace
+        self._token = None
+
+    @property
+    def duration(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self, error: BaseException | None = None) -> None:
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        # A generator closed early has not failed.
+        if error is not None and not isinstance(error, GeneratorExit):
+            self.error = type(error).__name__
+        self._trace.add_span(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _current_span.reset(self._token)
+        self.finish(exc)
+        return False
+
+    def to_dict(self, origin: float) -> dict:
+        record = {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start": self.start - origin,
+            "duration": self.duration,
+        }
+        if self.attributes:
+            record["attributes"] = self.attributes
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+
+class _NoSpan:
+    """Stands in for :class:`Span` when no trace is active."""
+
+    __slots__ = ()
+
+    @property
+    def duration(self) -> float:
+        return 0.0
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def finish(self, error: BaseException | None = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """The spans and counters recorded while answering one question."""
+
+    def __init__(self, name: str, attributes: dict | None = None) -> None:
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.start_time_ns = time.time_ns()
+        self.end = None
+        self.error = None
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    def add_span(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.end = time.perf_counter()
+        if error is not None:
+            self.error = type(error).__name__
+
+    def wall_time_ns(self, perf_time: float) -> int:
+        """Convert a ``time.perf_counter()`` reading to epoch nanoseconds."""
+        return self.start_time_ns + int((perf_time - self.start) * 1e9)
+
+    def stages(self) -> dict:
+        """``{span name: {"count", "total", "max"}}`` over all finished spans."""
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            stage = stages.setdefault(span.name, {"count": 0, "total": 0.0, "max": 0.0})
+            stage["count"] += 1
+            stage["total"] += span.duration
+            stage["max"] = max(stage["max"], span.duration)
+        return stages
+
+    def caches(self) -> dict:
+        """Hit rates of the caches that reported ``<cache>.cache_hits``/``_misses``."""
+        with self._lock:
+            counters = dict(self.counters)
+        caches = {}
+        for name, value in counters.items():
+            cache, _, kind = name.rpartition(".")
+            if kind in ("cache_hits", "cache_misses"):
+                caches.setdefault(cache, {"hits": 0, "misses": 0})[kind[6:]] = value
+        for stats in caches.values():
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return caches
+
+    def summary(self, include_spans: bool = False) -> dict:
+        with self._lock:
+            counters = dict(sorted(self.counters.items()))
+        summary = {
+            "trace_id": self.trace_id,
+            "duration": self.duration,
+            "stages": self.stages(),
+            "counters": counters,
+            "caches": self.caches(),
+        }
+        if self.error is not None:
+            summary["error"] = self.error
+        if include_spans:
+            with self._lock:
+                spans = sorted(self.spans, key=lambda span: span.start)
+            summary["spans"] = [span.to_dict(self.start) for span in spans]
+        return summary
+
+
+def active() -> bool:
+    """Whether a trace is recording in the current context."""
+    return _current_trace.get() is not None
+
+
+def span(name: str, **attributes):
+    """Context manager timing ``name`` as a child of the current span."""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return Span(trace, name, attributes)
+
+
+def start_span(name: str, **attributes):
+    """Start timing ``name`` without making it current; call ``finish()`` on it."""
+    return span(name, **attributes)
+
+
+def traced(name: str):
+    """Decorator timing every call of a function or coroutine function as ``name``."""
+
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def traced_coroutine(*args, **kwargs):
+                trace = _current_trace.get()
+                if trace is None:
+                    return await func(*args, **kwargs)
+                with Span(trace, name, {}):
+                    return await func(*args, **kwargs)
+
+            return traced_coroutine
+
+        @functools.wraps(func)
+        def traced_function(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with Span(trace, name, {}):
+                return func(*args, **kwargs)
+
+        return traced_function
+
+    return decorate
+
+
+def count(name: str, value: float = 1) -> None:
+    """Add ``value`` to the counter ``name`` of the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def bind(func: Callable) -> Callable:
+    """``func`` bound to a copy of the current context, for ``executor.submit``.
+
+    Copy once per submitted call: a context cannot be entered by two threads
+    at once.
+    """
+    if _current_trace.get() is None:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+class MetricsSink:
+    """Receives every finished :class:`Trace`."""
+
+    def export(self, trace: Trace) -> None:
+        raise NotImplementedError
+
+
+class Metrics:
+    """Traces answers and exports each finished trace to ``sinks``.
+
+    Parameters
+    ----------
+    sinks : iterable of MetricsSink, optional
+        Where finished traces go; with none, traces are only attached to the
+        results.
+    include_spans : bool, optional
+        Also list every span in the summary attached to results, by default
+        False (the summary then has per-stage totals only).
+    """
+
+    def __init__(self, sinks=(), include_spans: bool = False) -> None:
+        self.sinks = list(sinks)
+        self.include_spans = include_spans
+
+    @contextlib.contextmanager
+    def trace(self, name: str = "answer", **attributes):
+        """Record spans and counters of the enclosed code into a new :class:`Trace`."""
+        trace = Trace(name, attributes)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        error = None
+        try:
+            yield trace
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            trace.finish(error)
+            try:
+                _current_span.reset(span_token)
+                _current_trace.reset(trace_token)
+            except ValueError:
+                # An async generator finalized from another task; its context
+                # is discarded anyway.
+                pass
+            self.export(trace)
+
+    def summary(self, trace: Trace) -> dict:
+        return trace.summary(self.include_spans)
+
+    def export(self, trace: Trace) -> None:
+        for sink in self.sinks:
+            try:
+                sink.export(trace)
+            except Exception as error:
+                logger.warning(f"Metrics sink {type(sink).__name__} failed: {error}")
+
+    def sink(self, kind: type):
+        """The first sink of type ``kind``, or ``None``."""
+        return next((sink for sink in self.sinks if isinstance(sink, kind)), None)
+
+
+class JSONLogSink(MetricsSink):
+    """Writes one JSON summary line per trace to a stream or a logger.
+
+    Parameters
+    ----------
+    stream : file-like, optional
+        Text stream to write to; by default lines go to ``logger``.
+    logger : logging.Logger, optional
+        Logger used when no stream is given, by default this module's.
+    include_spans : bool, optional
+        Include every span in the line, by default True.
+    """
+
+    def __init__(self, stream=None, logger=None, include_spans: bool = True) -> None:
+        self.stream = stream
+        self.logger = logger or logging.getLogger(__name__)
+        self.include_spans = include_spans
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(
+            {
+                "trace": trace.name,
+                "start_time": trace.start_time_ns / 1e9,
+                **trace.attributes,
+                **trace.summary(self.include_spans),
+            },
+            default=str,
+        )
+        if self.stream is None:
+            self.logger.info(line)
+            return
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def _metric_name(text: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", text)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class PrometheusSink(MetricsSink):
+    """Aggregates traces into Prometheus metrics.
+
+    Span and answer durations go to the histogram
+    ``<namespace>_span_duration_seconds`` labelled by span name; trace counters
+    become ``<namespace>_<counter>_total`` counters. :meth:`render` returns
+    the text exposition format, which ``damsan-server`` serves at
+    ``GET /metrics``.
+
+    Parameters
+    ----------
+    namespace : str, optional
+        Prefix of every metric name, by default ``"damsan"``.
+    buckets : tuple of float, optional
+        Histogram bucket upper bounds in seconds.
+    """
+
+    BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+    def __init__(self, namespace: str = "damsan", buckets: tuple = BUCKETS) -> None:
+        self.namespace = _metric_name(namespace)
+        self.buckets = tuple(sorted(buckets))
+        self.histograms = {}
+        self.counters = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float) -> None:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = {
+                "buckets": [0] * len(self.buckets),
+                "sum": 0.0,
+                "count": 0,
+            }
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+    def export(self, trace: Trace) -> None:
+        with self._lock:
+            self.observe(trace.name, trace.duration)
+            for span in list(trace.spans):
+                self.observe(span.name, span.duration)
+                if span.error is not None:
+                    self.errors[span.name] = self.errors.get(span.name, 0) + 1
+            if trace.error is not None:
+                self.errors[trace.name] = self.errors.get(trace.name, 0) + 1
+            for name, value in trace.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def render(self) -> str:
+        prefix = self.namespace
+        lines = [
+            f"# HELP {prefix}_span_duration_seconds Duration of pipeline spans.",
+            f"# TYPE {prefix}_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                label = f'span="{_label(name)}"'
+                for bound, value in zip(self.buckets, histogram["buckets"]):
+                    lines.append(
+                        f"{prefix}_span_duration_seconds_bucket"
+                        f'{{{label},le="{bound}"}} {value}'
+                    )
+                lines.append(
+                    f'{prefix}_span_duration_seconds_bucket{{{label},le="+Inf"}} '
+                    f"{histogram['count']}"
+                )
+                lines.append(
+                    f"{prefix}_span_duration_seconds_sum{{{label}}} {histogram['sum']}"
+                )
+                lines.append(
+                    f"{prefix}_span_duration_seconds_count{{{label}}} "
+                    f"{histogram['count']}"
+                )
+            lines.append(f"# HELP {prefix}_span_errors_total Spans that raised.")
+            lines.append(f"# TYPE {prefix}_span_errors_total counter")
+            for name, value in sorted(self.errors.items()):
+                lines.append(
+                    f'{prefix}_span_errors_total{{span="{_label(name)}"}} {value}'
+                )
+            for name, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{_metric_name(name)}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetrySink(MetricsSink):
+    """Replays each trace as OpenTelemetry spans.
+
+    The trace becomes a root span carrying its attributes and counters (as
+    ``damsan.<counter>`` attributes), with every recorded span below it under
+    its original parent and with its original start and end times.
+
+    Parameters
+    ----------
+    tracer : opentelemetry.trace.Tracer, optional
+        Tracer to create spans with; by default
+        ``opentelemetry.trace.get_tracer("damsan")``. Requires the
+        ``opentelemetry-api`` package.
+    """
+
+    def __init__(self, tracer=None) -> None:
+        from opentelemetry import trace as otel_trace
+
+        self._otel_trace = otel_trace
+        self.tracer = tracer or otel_trace.get_tracer("damsan")
+
+    @staticmethod
+    def _attributes(attributes: dict) -> dict:
+        return {
+            key: value if isinstance(value, (str, bool, int, float)) else str(value)
+            for key, value in attributes.items()
+        }
+
+    def export(self, trace: Trace) -> None:
+        end = trace.end if trace.end is not None else time.perf_counter()
+        attributes = self._attributes(trace.attributes)
+        attributes.update(
+            {f"damsan.{name}": value for name, value in trace.counters.items()}
+        )
+        root = self.tracer.start_span(
+            trace.name, start_time=trace.start_time_ns, attributes=attributes
+        )
+        opened = {}
+        # Parents start before their children, so they are opened first.
+        for span in sorted(trace.spans, key=lambda span: span.start):
+            parent = opened.get(span.parent_id, (root, None))[0]
+            otel_span = self.tracer.start_span(
+                span.name,
+                context=self._otel_trace.set_span_in_context(parent),
+                start_time=trace.wall_time_ns(span.start),
+                attributes=self._attributes(span.attributes),
+            )
+            if span.error is not None:
+                otel_span.set_attribute("error.type", span.error)
+            opened[span.span_id] = (otel_span, span)
+        for otel_span, span in opened.values():
+            otel_span.end(end_time=trace.wall_time_ns(span.end))
+        if trace.error is not None:
+            root.set_attribute("error.type", trace.error)
+        root.end(end_time=trace.wall_time_ns(end))
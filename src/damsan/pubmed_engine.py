@@ -1,23 +1,33 @@
 import re
 import sys
+import json
+import asyncio
+import contextlib
+import queue
 import string
+import threading
 import time
-import openai
 from pathlib import Path
 from typing import List, Tuple
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-from Bio import Entrez
-from Bio.Entrez import efetch, esearch
-from langchain.prompts.chat import SystemMessagePromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain.prompts import (
-    PromptTemplate,
-    ChatPromptTemplate,
-    HumanMessagePromptTemplate,
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
 )
+
+from . import metrics
 from .utils.prompt_compiler import PromptArchitecture
+from .article import Article, reconstruct_abstract
+from .cache import ArticleStore, ESearchCache, LLMResponseCache
+from .events import ArticleProcessed, ArticlesFound, QueryGenerated
+from .llm import LLMBackend, OpenAIChatBackend
+from .ratelimit import NCBIRateLimiter, shared_rate_limiter
+from .scheduler import LLMScheduler, shared_llm_scheduler
+from .tokens import tokenizer_for
 import logging
 
 logger = logging.getLogger(__name__)
@@ -44,6 +54,171 @@ def subtract_n_years(date_str: str, n: int = 20) -> str:
     return formatted_date
 
 
+def iter_pubmed_articles(handle, block_size: int = 64 * 1024):
+    """Yield the ``PubmedArticle`` records of an efetch XML stream one at a time.
+
+    ``Entrez.read`` only returns once the whole document is parsed, and
+    ``Entrez.parse`` rejects PubMed article sets, so the stream is fed to the
+    Bio.Entrez parser block by block and each article is handed out (and
+    dropped from the parser's tree) as soon as the next one starts.
+    """
+    from Bio.Entrez.Parser import DataHandler
+
+    handler = DataHandler(validate=True, escape=False, ignore_errors=False)
+    articles = None
+    while True:
+        data = handle.read(block_size)
+        handler.parser.Parse(data, not data)
+        if articles is None:
+            record = getattr(handler, "record", None)
+            if isinstance(record, dict):
+                articles = record.get("PubmedArticle")
+        if articles is not None:
+            while len(articles) >= 2:
+                yield articles.pop(0)
+        if not data:
+            break
+    if articles:
+        yield from list(articles)
+
+
+def llm_span_name(task: str) -> str:
+    """Trace span name for an LLM call made for the prompt-architecture ``task``."""
+    return "llm." + (task.removesuffix("_prompt") or "call")
+
+
+def merge_ranked(ranked_lists) -> list[str]:
+    """Merge per-query PMID lists into one list ordered by esearch rank.
+
+    Lists are interleaved rank by rank (every query's first hit, then every
+    query's second hit, ...); a PMID keeps the best rank it has in any list.
+    """
+    merged = {}
+    for position in range(max((len(ids) for ids in ranked_lists), default=0)):
+        for ids in ranked_lists:
+            if position < len(ids):
+                merged.setdefault(str(ids[position]), None)
+    return list(merged)
+
+
+class _FetchError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_BATCH_DONE = object()
+
+_SUMMARY_SEPARATOR = (
+    "\n\n--------------------------------------------------------------\n\n"
+)
+
+
+class SharedArticleFetches:
+    """Fetches each PMID at most once for any number of concurrent callers.
+
+    :meth:`request` hands out one future per PMID. The first request for a
+    PMID schedules it (article store first, then ``efetch`` in batches of
+    ``batch_size``) on the instance's own threads; later requests get the same
+    future, whether the article is still downloading or already parsed. The
+    fetches do not belong to any caller, so a caller that stops listening
+    never leaves the others waiting.
+
+    A future resolves to the :class:`Article`, to ``None`` if PubMed did not
+    return the PMID, or to the error that failed its batch. Failed PMIDs are
+    forgotten, so a later request tries them again.
+
+    Parameters
+    ----------
+    retriever : PubMedNeuralRetriever
+        Retriever whose article store and ``efetch`` are used.
+    batch_size : int, optional
+        PMIDs per ``efetch`` call, by default 200.
+    max_concurrency : int, optional
+        ``efetch`` calls in flight at once, by default 3.
+    """
+
+    def __init__(
+        self,
+        retriever: "PubMedNeuralRetriever",
+        batch_size: int = 200,
+        max_concurrency: int = 3,
+    ) -> None:
+        self.retriever = retriever
+        self.batch_size = batch_size
+        self.requested = 0
+        self.scheduled = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_concurrency), thread_name_prefix="efetch"
+        )
+
+    def request(self, article_ids: List[str]) -> dict:
+        """Return ``{pmid: Future}`` for ``article_ids``, scheduling new PMIDs."""
+        article_ids = list(dict.fromkeys(str(pmid) for pmid in article_ids))
+        new_ids = []
+        with self._lock:
+            for pmid in article_ids:
+                if pmid not in self._futures:
+                    future = Future()
+                    # A running future cannot be cancelled, so one caller giving
+                    # up on it (e.g. through asyncio.wrap_future) cannot take it
+                    # away from the others.
+                    future.set_running_or_notify_cancel()
+                    self._futures[pmid] = future
+                    new_ids.append(pmid)
+            futures = {pmid: self._futures[pmid] for pmid in article_ids}
+            self.requested += len(article_ids)
+            self.scheduled += len(new_ids)
+        for i in range(0, len(new_ids), self.batch_size):
+            # Traced as part of the answer whose request started the fetch.
+            self._executor.submit(
+                metrics.bind(self._fetch), new_ids[i : i + self.batch_size]
+            )
+        return futures
+
+    def _resolve(self, pmid: str, article) -> None:
+        future = self._futures.get(pmid)
+        if future is not None and not future.done():
+            future.set_result(article)
+
+    def _fetch(self, batch: List[str]) -> None:
+        try:
+            missing = batch
+            store = self.retriever.article_store
+            if store is not None:
+                stored = store.get_articles(batch)
+                for pmid, article in stored.items():
+                    self._resolve(pmid, article)
+                missing = [pmid for pmid in batch if pmid not in stored]
+                metrics.count("article_store.cache_hits", len(stored))
+                metrics.count("article_store.cache_misses", len(missing))
+            if missing:
+                for article in self.retriever.fetch_batch(missing):
+                    self._resolve(article.pmid, article)
+        except BaseException as error:
+            with self._lock:
+                for pmid in batch:
+                    future = self._futures[pmid]
+                    if not future.done():
+                        del self._futures[pmid]
+                        future.set_exception(error)
+            return
+        for pmid in batch:
+            self._resolve(pmid, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requested": self.requested,
+                "fetched": self.scheduled,
+                "deduplicated": self.requested - self.scheduled,
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
 class PubMedNeuralRetriever:
     def __init__(
         self,
@@ -54,6 +229,18 @@ class PubMedNeuralRetriever:
         openai_api_key: str = "",
         email: str = "",
         wait: int = 3,
+        article_store: ArticleStore | str | None = None,
+        esearch_cache: ESearchCache | str | None = None,
+        llm_cache: LLMResponseCache | None = None,
+        llm_backend: LLMBackend | None = None,
+        max_connections: int = 64,
+        prescreen_min_score: float | None = None,
+        prescreen_top_n: int | None = None,
+        ncbi_api_key: str = "",
+        ncbi_rate_limiter: NCBIRateLimiter | None = None,
+        llm_scheduler: LLMScheduler | None = None,
+        synthesis_token_budget: int | None = None,
+        reranker=None,
     ):
 
         self.model = model
@@ -67,11 +254,90 @@ class PubMedNeuralRetriever:
         self.time_out = 61
         self.delay = 2
         self.wait = wait
+        if isinstance(article_store, (str, Path)):
+            article_store = ArticleStore(article_store)
+        self.article_store = article_store
+        if isinstance(esearch_cache, (str, Path)):
+            esearch_cache = ESearchCache(esearch_cache)
+        self.esearch_cache = esearch_cache
+        self.llm_cache = llm_cache
+        if llm_backend is None:
+            llm_backend = OpenAIChatBackend(
+                model=self.model,
+                api_key=self.openai_api_key or None,
+                max_connections=max_connections,
+            )
+        self.llm_backend = llm_backend
+        self.prescreen_min_score = prescreen_min_score
+        self.prescreen_top_n = prescreen_top_n
+        self.ncbi_api_key = ncbi_api_key
+        if ncbi_rate_limiter is None:
+            ncbi_rate_limiter = shared_rate_limiter(ncbi_api_key or None)
+        self.ncbi_rate_limiter = ncbi_rate_limiter
+        if llm_scheduler is None:
+            llm_scheduler = shared_llm_scheduler()
+        self.llm_scheduler = llm_scheduler
+        self.synthesis_token_budget = synthesis_token_budget
+        self.reranker = reranker
 
         if self.verbose:
             self.architecture.print_architecture()
 
-        openai.api_key = self.openai_api_key
+    def response_cache_key(
+        self, task: str, prompt: list, temperature: float, max_tokens: int, n: int
+    ):
+        """Cache key for an LLM call, or ``None`` when ``task`` is not cached."""
+        if (
+            self.llm_cache is None
+            or not task
+            or not self.architecture.get_option(task, "cache", False)
+        ):
+            return None
+        return LLMResponseCache.key(
+            prompt,
+            model=self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            n=n,
+        )
+
+    def cached_response(self, cache_key, task: str):
+        """The cached completions under ``cache_key``, or ``None`` on a miss."""
+        if cache_key is None:
+            return None
+        cached = self.llm_cache.get(cache_key, task)
+        metrics.count("llm.cache_hits" if cached is not None else "llm.cache_misses")
+        return cached
+
+    def store_response(self, cache_key, prompt: list, choices: list) -> None:
+        """Cache the completions of an LLM call and count it in the current trace."""
+        if cache_key is not None:
+            self.llm_cache.set(cache_key, choices)
+        if metrics.active():
+            self.count_tokens(prompt, choices)
+
+    async def store_response_async(
+        self, cache_key, prompt: list, choices: list
+    ) -> None:
+        """Like :meth:`store_response`, counting tokens in a worker thread.
+
+        Tokenizing whole prompts (and, on first use, loading the tokenizer)
+        would otherwise block the event loop on every traced call.
+        """
+        if cache_key is not None:
+            self.llm_cache.set(cache_key, choices)
+        if metrics.active():
+            await asyncio.to_thread(self.count_tokens, prompt, choices)
+
+    def count_tokens(self, prompt: list, choices: list) -> None:
+        """Count one LLM call and its tokens in the current trace."""
+        tokenizer = tokenizer_for(self.model)
+        metrics.count("llm.calls")
+        metrics.count("llm.prompt_tokens", tokenizer.count_messages(prompt))
+        metrics.count(
+            "llm.completion_tokens",
+            sum(tokenizer.count(choice) for choice in choices),
+        )
 
     def query_api(
         self,
@@ -79,77 +345,243 @@ class PubMedNeuralRetriever:
         temperature: float,
         max_tokens: int = 1024,
         n: int = 1,
+        task: str = "",
     ) -> str:
+        return self.query_api_choices(
+            prompt, temperature, max_tokens=max_tokens, n=n, task=task
+        )[0]
 
-        chat = ChatOpenAI(
-            temperature=temperature,
-            model=self.model,
-            n=n,
+    async def query_api_async(
+        self,
+        prompt: list,
+        temperature: float,
+        max_tokens: int = 1024,
+        n: int = 1,
+        task: str = "",
+    ) -> str:
+        choices = await self.query_api_choices_async(
+            prompt, temperature, max_tokens=max_tokens, n=n, task=task
         )
+        return choices[0]
 
-        return chat(prompt).text()
+    def query_api_choices(
+        self,
+        prompt: list,
+        temperature: float,
+        max_tokens: int = 1024,
+        n: int = 1,
+        task: str = "",
+    ) -> list[str]:
+        """Like :meth:`query_api` but returns all ``n`` completions of one call.
+
+        ``task`` names the prompt-architecture task making the call; responses
+        are cached when the task's ``cache`` option is on and a response cache
+        is configured. The call itself goes through :attr:`llm_scheduler`, which
+        bounds process-wide concurrency and retries transient failures.
+        """
+        with metrics.span(llm_span_name(task), n=n) as span:
+            cache_key = self.response_cache_key(
+                task, prompt, temperature, max_tokens, n
+            )
+            cached = self.cached_response(cache_key, task)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
+
+            choices = self.llm_scheduler.run(
+                self.llm_backend.complete,
+                prompt,
+                temperature,
+                max_tokens=max_tokens,
+                n=n,
+            )
+            self.store_response(cache_key, prompt, choices)
+        return choices
+
+    async def query_api_choices_async(
+        self,
+        prompt: list,
+        temperature: float,
+        max_tokens: int = 1024,
+        n: int = 1,
+        task: str = "",
+    ) -> list[str]:
+        with metrics.span(llm_span_name(task), n=n) as span:
+            cache_key = self.response_cache_key(
+                task, prompt, temperature, max_tokens, n
+            )
+            cached = self.cached_response(cache_key, task)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
+
+            choices = await self.llm_scheduler.arun(
+                self.llm_backend.acomplete,
+                prompt,
+                temperature,
+                max_tokens=max_tokens,
+                n=n,
+            )
+            await self.store_response_async(cache_key, prompt, choices)
+        return choices
+
+    async def query_api_stream(
+        self,
+        prompt: list,
+        temperature: float,
+        max_tokens: int = 1024,
+        task: str = "",
+    ):
+        """Like :meth:`query_api_async` but yields the completion in chunks."""
+        # Not a context-manager span: a generator cannot hold the current span
+        # across its yields.
+        span = metrics.start_span(llm_span_name(task), n=1, stream=True)
+        cache_key = self.response_cache_key(task, prompt, temperature, max_tokens, 1)
+        cached = self.cached_response(cache_key, task)
+        if cached is not None:
+            span.set(cached=True)
+            span.finish()
+            yield cached[0]
+            return
+
+        chunks = []
+        error = None
+        try:
+            async for chunk in self.llm_scheduler.astream(
+                self.llm_backend.astream, prompt, temperature, max_tokens=max_tokens
+            ):
+                if not chunks:
+                    span.set(time_to_first_chunk=span.duration)
+                chunks.append(chunk)
+                yield chunk
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            span.finish(error)
+        await self.store_response_async(cache_key, prompt, ["".join(chunks)])
+
+    def pubmed_query_messages(self, question: str) -> list:
+        return self.architecture.render("pubmed_query_prompt", question=question)
 
     def generate_pubmed_query(
         self,
         question: str,
         max_tokens: int = 1024,
     ) -> str:
-        user_prompt = self.architecture.get_prompt("pubmed_query_prompt", "template")
-        system_prompt = self.architecture.get_prompt(
-            "pubmed_query_prompt", "system"
-        ).format()
-        system_message_prompt = SystemMessagePromptTemplate.from_template(system_prompt)
-        human_message_prompt = HumanMessagePromptTemplate(
-            prompt=PromptTemplate(
-                template=user_prompt.format(question="{question}"),
-                input_variables=["question"],
-            )
-        )
-        chat_prompt = ChatPromptTemplate.from_messages(
-            [system_message_prompt, human_message_prompt]
+        result = self.query_api(
+            prompt=self.pubmed_query_messages(question),
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            n=1,
+            task="pubmed_query_prompt",
         )
-        chat_prompt = chat_prompt.format_prompt(question=question).to_messages()
 
-        result = self.query_api(
-            prompt=chat_prompt,
+        return result
+
+    async def generate_pubmed_query_async(
+        self,
+        question: str,
+        max_tokens: int = 1024,
+    ) -> str:
+        result = await self.query_api_async(
+            prompt=self.pubmed_query_messages(question),
             temperature=self.temperature,
             max_tokens=max_tokens,
             n=1,
+            task="pubmed_query_prompt",
         )
 
         return result
 
-    def search_pubmed(
+    def generate_pubmed_queries(
         self,
         question: str,
-        num_results: int = 10,
-        num_query_attempts: int = 1,
-        verbose: bool = False,
-        restriction_date=None,
-    ) -> Tuple[list[str], list[str]]:
+        n: int = 3,
+        max_tokens: int = 1024,
+    ) -> list[str]:
+        """Generate up to ``n`` distinct PubMed queries with a single LLM call.
 
-        Entrez.email = self.email
-        search_ids = set()
-        search_queries = set()
-
-        for _ in range(num_query_attempts):
-            pubmed_query = self.generate_pubmed_query(question)
-
-            if restriction_date:
-                if self.verbose:
-                    print(f"Date Restricted to : {restriction_date}")
-                lower_limit = subtract_n_years(restriction_date)
-                pubmed_query = (
-                    pubmed_query + f" AND {lower_limit}:{restriction_date}[dp]"
-                )
+        Duplicate completions are dropped, so fewer than ``n`` queries may be
+        returned.
+        """
+        choices = self.query_api_choices(
+            prompt=self.pubmed_query_messages(question),
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            n=n,
+            task="pubmed_query_prompt",
+        )
+        return list(dict.fromkeys(query.strip() for query in choices if query.strip()))
 
-            if verbose:
-                print("*" * 10)
-                print(f"Generated pubmed query: {pubmed_query}\n")
+    async def generate_pubmed_queries_async(
+        self,
+        question: str,
+        n: int = 3,
+        max_tokens: int = 1024,
+    ) -> list[str]:
+        choices = await self.query_api_choices_async(
+            prompt=self.pubmed_query_messages(question),
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            n=n,
+            task="pubmed_query_prompt",
+        )
+        return list(dict.fromkeys(query.strip() for query in choices if query.strip()))
+
+    def restrict_query(self, pubmed_query: str, restriction_date=None) -> str:
+        if restriction_date:
+            if self.verbose:
+                print(f"Date Restricted to : {restriction_date}")
+            lower_limit = subtract_n_years(restriction_date)
+            pubmed_query = pubmed_query + f" AND {lower_limit}:{restriction_date}[dp]"
+        return pubmed_query
 
-            search_queries.add(pubmed_query)
-            search_results = esearch(
-                db="pubmed", term=pubmed_query, retmax=num_results, sort="relevance"
+    def configure_entrez(self) -> None:
+        """Set the process-global Bio.Entrez email, API key and retry count.
+
+        ``Entrez.max_tries`` is set to 1 and is not restored, so other
+        Bio.Entrez users in the process lose Biopython's retries as well.
+        """
+        from Bio import Entrez
+
+        Entrez.email = self.email
+        # Retries are left to the rate limiter; Bio.Entrez would otherwise sleep
+        # 15 seconds between its own attempts on every 5xx.
+        Entrez.max_tries = 1
+        if self.ncbi_api_key:
+            Entrez.api_key = self.ncbi_api_key
+
+    def entrez(self, func, **params):
+        """Call an Entrez utility through the shared NCBI rate limiter."""
+        return self.ncbi_rate_limiter.call(func, **params)
+
+    def run_esearch(
+        self, pubmed_query: str, num_results: int = 10, verbose: bool = False
+    ) -> list[str]:
+        """Run a single esearch for ``pubmed_query`` and return its PMIDs in rank order.
+
+        Results are served from and stored in the esearch cache when one is
+        configured.
+        """
+        if self.esearch_cache is not None:
+            cached_ids = self.esearch_cache.get_ids(pubmed_query, num_results)
+            hit = cached_ids is not None
+            metrics.count("esearch.cache_hits" if hit else "esearch.cache_misses")
+            if cached_ids is not None:
+                if verbose:
+                    print(f"Retrieved {len(cached_ids)} IDs from cache")
+                return list(cached_ids)
+
+        from Bio import Entrez
+
+        with metrics.span("ncbi.esearch", retmax=num_results) as span:
+            search_results = self.entrez(
+                Entrez.esearch,
+                db="pubmed",
+                term=pubmed_query,
+                retmax=num_results,
+                sort="relevance",
             )
             try:
                 search_response = Entrez.read(search_results)
@@ -158,8 +590,11 @@ class PubMedNeuralRetriever:
                     and isinstance(search_response, dict)
                     and "IdList" in search_response
                 ):
-                    retrieved_ids = search_response["IdList"]
-                    search_ids = search_ids.union(retrieved_ids)
+                    retrieved_ids = list(search_response["IdList"])
+                    if self.esearch_cache is not None:
+                        self.esearch_cache.put_ids(
+                            pubmed_query, num_results, retrieved_ids
+                        )
 
                     if len(retrieved_ids) == 0:
                         logger.warning(
@@ -169,6 +604,8 @@ class PubMedNeuralRetriever:
                     if verbose:
                         print(f"Retrieved {len(retrieved_ids)} IDs")
                         print(retrieved_ids)
+                    span.set(ids=len(retrieved_ids))
+                    return retrieved_ids
                 else:
                     logger.warning(
                         f"No IdList found in response for query: {pubmed_query}"
@@ -176,22 +613,356 @@ class PubMedNeuralRetriever:
 
             except Exception as e:
                 logger.error(f"Error retrieving IDs: {str(e)}")
+            return []
 
-        return list(search_queries), list(search_ids)
+    @metrics.traced("search")
+    def search_pubmed(
+        self,
+        question: str,
+        num_results: int = 10,
+        num_query_attempts: int = 1,
+        verbose: bool = False,
+        restriction_date=None,
+        max_concurrency: int = 4,
+        single_query_call: bool = False,
+    ) -> Tuple[list[str], list[str]]:
+        """Generate PubMed queries for ``question`` and collect the PMIDs they find.
 
-    def fetch_article_data(self, article_ids: List[str]):
-        articles = efetch(db="pubmed", id=article_ids, rettype="xml")
-        # article_data = Entrez.read(articles)["PubmedArticle"]
-        article_data = []
-        search_response = Entrez.read(articles)
-        if (
-            search_response
-            and isinstance(search_response, dict)
-            and "PubmedArticle" in search_response
+        Query attempts run concurrently on at most ``max_concurrency`` threads.
+        The PMIDs are returned in esearch rank order, merged across queries with
+        :func:`merge_ranked`. With ``single_query_call`` all
+        ``num_query_attempts`` queries come from one LLM call (see
+        :meth:`generate_pubmed_queries`) instead of one call each.
+        """
+        self.configure_entrez()
+
+        def attempt(pubmed_query=None):
+            if pubmed_query is None:
+                pubmed_query = self.generate_pubmed_query(question)
+            pubmed_query = self.restrict_query(pubmed_query, restriction_date)
+
+            if verbose:
+                print("*" * 10)
+                print(f"Generated pubmed query: {pubmed_query}\n")
+
+            return pubmed_query, self.run_esearch(
+                pubmed_query, num_results=num_results, verbose=verbose
+            )
+
+        if single_query_call:
+            generated = self.generate_pubmed_queries(question, n=num_query_attempts)
+        else:
+            generated = [None] * num_query_attempts
+
+        if not generated:
+            return [], []
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_concurrency, len(generated)))
+        ) as executor:
+            futures = [
+                executor.submit(metrics.bind(attempt), query) for query in generated
+            ]
+            searches = [future.result() for future in futures]
+
+        search_queries = list(dict.fromkeys(query for query, _ in searches))
+        return search_queries, merge_ranked([ids for _, ids in searches])
+
+    @metrics.traced("search")
+    async def search_pubmed_async(
+        self,
+        question: str,
+        num_results: int = 10,
+        num_query_attempts: int = 1,
+        verbose: bool = False,
+        restriction_date=None,
+        max_concurrency: int = 4,
+        single_query_call: bool = False,
+    ) -> Tuple[list[str], list[str]]:
+        """Async counterpart of :meth:`search_pubmed`.
+
+        Query attempts run concurrently, at most ``max_concurrency`` at a time;
+        esearch calls are pushed to worker threads so the event loop stays free
+        for other questions.
+        """
+        self.configure_entrez()
+        searches = []
+        async for pubmed_query, retrieved_ids in self.iter_searches_async(
+            question,
+            num_results=num_results,
+            num_query_attempts=num_query_attempts,
+            verbose=verbose,
+            restriction_date=restriction_date,
+            max_concurrency=max_concurrency,
+            single_query_call=single_query_call,
         ):
-            article_data = search_response["PubmedArticle"]
+            searches.append((pubmed_query, retrieved_ids))
+
+        search_queries = list(dict.fromkeys(query for query, _ in searches))
+        return search_queries, merge_ranked([ids for _, ids in searches])
+
+    async def iter_searches_async(
+        self,
+        question: str,
+        num_results: int = 10,
+        num_query_attempts: int = 1,
+        verbose: bool = False,
+        restriction_date=None,
+        max_concurrency: int = 4,
+        single_query_call: bool = False,
+        on_event=None,
+    ):
+        """Yield ``(pubmed_query, pmids)`` pairs in the order the searches finish.
+
+        ``on_event``, if given, is called with a :class:`QueryGenerated` event
+        for every query before it is searched.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def attempt(pubmed_query=None):
+            async with semaphore:
+                if pubmed_query is None:
+                    pubmed_query = await self.generate_pubmed_query_async(question)
+                pubmed_query = self.restrict_query(pubmed_query, restriction_date)
+                if on_event is not None:
+                    on_event(QueryGenerated(pubmed_query))
+                if verbose:
+                    print("*" * 10)
+                    print(f"Generated pubmed query: {pubmed_query}\n")
+                retrieved_ids = await asyncio.to_thread(
+                    self.run_esearch, pubmed_query, num_results, verbose
+                )
+                return pubmed_query, retrieved_ids
+
+        if single_query_call:
+            generated = await self.generate_pubmed_queries_async(
+                question, n=num_query_attempts
+            )
+        else:
+            generated = [None] * num_query_attempts
 
-        return article_data
+        tasks = [asyncio.ensure_future(attempt(query)) for query in generated]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @metrics.traced("fetch")
+    def fetch_article_data(
+        self, article_ids: List[str], batch_size: int = 200, max_concurrency: int = 3
+    ):
+        """Return the :class:`Article` records for ``article_ids``, in that order.
+
+        See :meth:`iter_article_data` for how articles are fetched.
+        """
+        by_pmid = {
+            article.pmid: article
+            for article in self.iter_article_data(
+                article_ids, batch_size=batch_size, max_concurrency=max_concurrency
+            )
+        }
+        return [
+            by_pmid[pmid]
+            for pmid in dict.fromkeys(str(pmid) for pmid in article_ids)
+            if pmid in by_pmid
+        ]
+
+    def iter_article_data(
+        self,
+        article_ids: List[str],
+        batch_size: int = 200,
+        max_concurrency: int = 3,
+        ordered: bool = False,
+        fetches: SharedArticleFetches | None = None,
+    ):
+        """Yield :class:`Article` records as soon as each one is available.
+
+        Articles in the article store (if any) come first. The remaining PMIDs
+        are fetched in ``efetch`` batches of ``batch_size`` IDs, at most
+        ``max_concurrency`` batches at a time, and every article is yielded
+        while the rest of its batch is still downloading. The order of
+        ``article_ids`` is only kept with ``ordered``, in which case an article
+        is held back until every article before it has been yielded.
+
+        With ``fetches``, articles are requested from that
+        :class:`SharedArticleFetches` instead, so PMIDs that other callers of
+        it already asked for are not fetched again; ``batch_size`` and
+        ``max_concurrency`` are then the ones it was created with.
+        """
+        article_ids = list(dict.fromkeys(str(pmid) for pmid in article_ids))
+        if fetches is not None:
+            futures = fetches.request(article_ids).values()
+            for future in futures if ordered else as_completed(futures):
+                article = future.result()
+                if article is not None:
+                    yield article
+            return
+        if ordered:
+            yield from self.in_request_order(
+                article_ids,
+                self.iter_article_data(
+                    article_ids, batch_size=batch_size, max_concurrency=max_concurrency
+                ),
+            )
+            return
+        missing = article_ids
+        if self.article_store is not None:
+            stored = self.article_store.get_articles(article_ids)
+            yield from stored.values()
+            missing = [pmid for pmid in article_ids if pmid not in stored]
+            metrics.count("article_store.cache_hits", len(stored))
+            metrics.count("article_store.cache_misses", len(missing))
+
+        batches = [
+            missing[i : i + batch_size] for i in range(0, len(missing), batch_size)
+        ]
+        if len(batches) <= 1 or max_concurrency <= 1:
+            for batch in batches:
+                yield from self.fetch_batch(batch)
+            return
+
+        results = queue.Queue()
+
+        def worker(batch):
+            try:
+                for article in self.fetch_batch(batch):
+                    results.put(article)
+            except BaseException as error:
+                results.put(_FetchError(error))
+            finally:
+                results.put(_BATCH_DONE)
+
+        with ThreadPoolExecutor(
+            max_workers=min(max_concurrency, len(batches))
+        ) as executor:
+            for batch in batches:
+                executor.submit(metrics.bind(worker), batch)
+            remaining = len(batches)
+            while remaining:
+                item = results.get()
+                if item is _BATCH_DONE:
+                    remaining -= 1
+                elif isinstance(item, _FetchError):
+                    raise item.error
+                else:
+                    yield item
+
+    @staticmethod
+    def in_request_order(article_ids: List[str], articles):
+        """Re-emit ``articles`` in the order of ``article_ids`` as soon as possible."""
+        arrived = {}
+        position = 0
+        for article in articles:
+            arrived[article.pmid] = article
+            while position < len(article_ids) and article_ids[position] in arrived:
+                yield arrived.pop(article_ids[position])
+                position += 1
+        for pmid in article_ids[position:]:
+            if pmid in arrived:
+                yield arrived.pop(pmid)
+
+    def fetch_batch(self, article_ids: List[str]):
+        """Stream one ``efetch`` call, storing its articles once it completes."""
+        from Bio import Entrez
+
+        # Covers the download and the parse, which are interleaved.
+        span = metrics.start_span("ncbi.efetch", ids=len(article_ids))
+        error = None
+        handle = None
+        fetched = []
+        try:
+            handle = self.entrez(
+                Entrez.efetch, db="pubmed", id=article_ids, rettype="xml"
+            )
+            for record in iter_pubmed_articles(handle):
+                article = Article.from_pubmed(record)
+                fetched.append(article)
+                yield article
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            if handle is not None:
+                handle.close()
+            span.set(articles=len(fetched))
+            span.finish(error)
+        if self.article_store is not None and fetched:
+            self.article_store.put_articles(fetched)
+
+    async def fetch_article_data_async(
+        self, article_ids: List[str], batch_size: int = 200, max_concurrency: int = 3
+    ):
+        return await asyncio.to_thread(
+            self.fetch_article_data, article_ids, batch_size, max_concurrency
+        )
+
+    async def iter_article_data_async(
+        self,
+        article_ids: List[str],
+        batch_size: int = 200,
+        max_concurrency: int = 3,
+        ordered: bool = False,
+        fetches: SharedArticleFetches | None = None,
+    ):
+        """Async counterpart of :meth:`iter_article_data`."""
+        if fetches is not None:
+            # Awaited directly rather than from a worker thread, so that many
+            # questions waiting on the same fetches do not tie up the loop's
+            # default executor.
+            futures = [
+                asyncio.wrap_future(future)
+                for future in fetches.request(article_ids).values()
+            ]
+            try:
+                for future in futures if ordered else asyncio.as_completed(futures):
+                    article = await future
+                    if article is not None:
+                        yield article
+            finally:
+                # Detach from the fetches this caller no longer waits for, so
+                # their results or errors are not reported as never retrieved.
+                for future in futures:
+                    if not future.cancel() and not future.cancelled():
+                        future.exception()
+            return
+        loop = asyncio.get_running_loop()
+        articles = asyncio.Queue()
+
+        def produce():
+            try:
+                for article in self.iter_article_data(
+                    article_ids,
+                    batch_size=batch_size,
+                    max_concurrency=max_concurrency,
+                    ordered=ordered,
+                ):
+                    loop.call_soon_threadsafe(articles.put_nowait, article)
+            except BaseException as error:
+                loop.call_soon_threadsafe(articles.put_nowait, _FetchError(error))
+            finally:
+                loop.call_soon_threadsafe(articles.put_nowait, _BATCH_DONE)
+
+        producer = asyncio.ensure_future(asyncio.to_thread(produce))
+        while True:
+            item = await articles.get()
+            if item is _BATCH_DONE:
+                break
+            if isinstance(item, _FetchError):
+                raise item.error
+            yield item
+        await producer
+
+    def relevance_messages(self, article_text: str, question: str) -> list:
+        return self.architecture.render(
+            "relevance_prompt", question=question, article_text=article_text
+        )
+
+    @staticmethod
+    def parse_relevance(result: str) -> bool:
+        first_word = result.split()[0].strip(string.punctuation).lower()
+        return first_word not in {"no", "n"}
 
     def is_article_relevant(
         self,
@@ -220,96 +991,146 @@ class PubMedNeuralRetriever:
             ]
             return message_
         else:
-            system_message_prompt = SystemMessagePromptTemplate.from_template(
-                system_prompt
-            )
-            human_message_prompt = HumanMessagePromptTemplate(
-                prompt=PromptTemplate(
-                    template=user_prompt.format(
-                        question="{question}", article_text="{article_text}"
-                    ),
-                    input_variables=["question", "article_text"],
-                )
-            )
-
-            chat_prompt = ChatPromptTemplate.from_messages(
-                [system_message_prompt, human_message_prompt]
-            )
-            chat_prompt = chat_prompt.format_prompt(
-                question=question, article_text=article_text
-            ).to_messages()
-
             result = self.query_api(
-                prompt=chat_prompt,
+                prompt=self.relevance_messages(article_text, question),
                 temperature=self.temperature,
                 max_tokens=max_tokens,
                 n=1,
+                task="relevance_prompt",
             )
 
-            first_word = result.split()[0].strip(string.punctuation).lower()
-            return first_word not in {"no", "n"}
+            return self.parse_relevance(result)
 
-    def construct_citation(self, article):
-        if (
-            len(article["PubmedData"]["ReferenceList"]) == 0
-            or len(article["PubmedData"]["ReferenceList"][0]["Reference"]) == 0
-        ):
-            return self.generate_ama_citation(article)
-        else:
-            try:
-                citation = article["PubmedData"]["ReferenceList"][0]["Reference"][0][
-                    "Citation"
-                ]
-                return citation
-            except IndexError as err:
-                print(f"IndexError: {err}")
-
-    def generate_ama_citation(self, article):
-        try:
-            authors = article["MedlineCitation"]["Article"]["AuthorList"]
-            author_names = ", ".join(
-                [f"{author['LastName']} {author['Initials']}" for author in authors]
-            )
-        except KeyError:
-            author_names = ""
+    async def is_article_relevant_async(
+        self,
+        article_text: str,
+        question: str,
+        max_tokens: int = 512,
+    ) -> bool:
+        result = await self.query_api_async(
+            prompt=self.relevance_messages(article_text, question),
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            n=1,
+            task="relevance_prompt",
+        )
 
-        try:
-            title = article["MedlineCitation"]["Article"]["ArticleTitle"]
-        except KeyError:
-            title = ""
+        return self.parse_relevance(result)
 
-        try:
-            journal = article["MedlineCitation"]["Article"]["Journal"]["Title"]
-        except KeyError:
-            journal = ""
+    def relevance_batch_size(self) -> int:
+        """Number of abstracts judged per relevance call, set by the architecture."""
+        batch_size = self.architecture.get_option("relevance_prompt", "batch_size", 1)
+        return max(1, int(batch_size))
 
-        try:
-            pub_date = article["PubmedData"]["History"][0]["Year"]
-        except KeyError:
-            pub_date = ""
+    def relevance_batch_messages(self, article_texts: list, question: str) -> list:
+        numbered = "\n\n".join(
+            f'Abstract {i + 1}: """{article_text}"""'
+            for i, article_text in enumerate(article_texts)
+        )
+        return self.architecture.render(
+            "relevance_prompt",
+            template="batch_template",
+            question=question,
+            article_texts=numbered,
+        )
 
-        try:
-            volume = article["MedlineCitation"]["Article"]["Journal"]["JournalIssue"][
-                "Volume"
-            ]
-        except KeyError:
-            volume = ""
+    @staticmethod
+    def parse_batch_relevance(result: str, num_articles: int):
+        """Parse a yes/no list for ``num_articles`` abstracts, or return ``None``.
 
-        try:
-            issue = article["MedlineCitation"]["Article"]["Journal"]["JournalIssue"][
-                "Issue"
-            ]
-        except KeyError:
-            issue = ""
+        Accepts a JSON list (``["yes", "no"]``) or numbered lines (``1: yes``).
+        """
 
-        try:
-            pages = article["MedlineCitation"]["Article"]["Pagination"]["MedlinePgn"]
-        except KeyError:
-            pages = ""
+        def as_bool(answer):
+            if isinstance(answer, bool):
+                return answer
+            word = str(answer).strip().strip(string.punctuation).lower()
+            if word in {"yes", "y"}:
+                return True
+            if word in {"no", "n"}:
+                return False
+            return None
 
-        return (
-            f"{author_names}. {title}. {journal}. {pub_date};{volume}({issue}):{pages}."
+        match = re.search(r"\[.*\]", result, flags=re.DOTALL)
+        if match:
+            try:
+                answers = json.loads(match.group(0))
+            except ValueError:
+                answers = None
+            if isinstance(answers, list) and len(answers) == num_articles:
+                decisions = [as_bool(answer) for answer in answers]
+                if None not in decisions:
+                    return decisions
+
+        numbered = {}
+        for index, answer in re.findall(
+            r"^\W*(\d+)\W+(yes|no)\b", result, flags=re.IGNORECASE | re.MULTILINE
+        ):
+            numbered[int(index)] = as_bool(answer)
+        if sorted(numbered) == list(range(1, num_articles + 1)):
+            return [numbered[i] for i in range(1, num_articles + 1)]
+        return None
+
+    def are_articles_relevant(
+        self, article_texts: list, question: str, max_tokens: int = 512
+    ) -> list[bool]:
+        """Judge several abstracts with one LLM call.
+
+        Falls back to one :meth:`is_article_relevant` call per abstract when the
+        answer cannot be parsed.
+        """
+        if len(article_texts) == 1:
+            return [self.is_article_relevant(article_texts[0], question)]
+        result = self.query_api(
+            prompt=self.relevance_batch_messages(article_texts, question),
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            n=1,
+            task="relevance_prompt",
+        )
+        decisions = self.parse_batch_relevance(result, len(article_texts))
+        if decisions is None:
+            logger.warning(
+                "Could not parse batched relevance answer; judging articles one by one"
+            )
+            decisions = [
+                self.is_article_relevant(article_text, question)
+                for article_text in article_texts
+            ]
+        return decisions
+
+    async def are_articles_relevant_async(
+        self, article_texts: list, question: str, max_tokens: int = 512
+    ) -> list[bool]:
+        if len(article_texts) == 1:
+            return [await self.is_article_relevant_async(article_texts[0], question)]
+        result = await self.query_api_async(
+            prompt=self.relevance_batch_messages(article_texts, question),
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            n=1,
+            task="relevance_prompt",
         )
+        decisions = self.parse_batch_relevance(result, len(article_texts))
+        if decisions is None:
+            logger.warning(
+                "Could not parse batched relevance answer; judging articles one by one"
+            )
+            decisions = list(
+                await asyncio.gather(
+                    *(
+                        self.is_article_relevant_async(article_text, question)
+                        for article_text in article_texts
+                    )
+                )
+            )
+        return decisions
+
+    def construct_citation(self, article: Article) -> str:
+        return article.citation
+
+    def generate_ama_citation(self, article: Article) -> str:
+        return article.ama_citation
 
     def write_results_to_file(self, filename, ama_citation, summary, append=True):
         mode = "a" if append else "w"
@@ -319,124 +1140,637 @@ class PubMedNeuralRetriever:
             f.write("\n###\n\n")
 
     def reconstruct_abstract(self, abstract_elements):
-        reconstructed_abstract = ""
-        for element in abstract_elements:
-            label = element.attributes.get("Label", "")
-            if reconstructed_abstract:
-                reconstructed_abstract += "\n\n"
+        return reconstruct_abstract(abstract_elements)
 
-            if label:
-                reconstructed_abstract += f"{label}:\n"
-            reconstructed_abstract += str(element)
-        return reconstructed_abstract
+    def summarization_messages(self, article_text: str, question: str) -> list:
+        return self.architecture.render(
+            "summarization_prompt", question=question, article_text=article_text
+        )
 
     def summarize_study(
         self,
         article_text,
         question,
     ) -> str:
-        system_prompt = self.architecture.get_prompt(
-            "summarization_prompt", "system"
-        ).format()
-
-        user_prompt = self.architecture.get_prompt("summarization_prompt", "template")
-        system_message_prompt = SystemMessagePromptTemplate.from_template(system_prompt)
-        human_message_prompt = HumanMessagePromptTemplate(
-            prompt=PromptTemplate(
-                template=user_prompt.format(
-                    question="{question}", article_text="{article_text}"
-                ),
-                input_variables=["question", "article_text"],
-            )
+        result = self.query_api(
+            prompt=self.summarization_messages(article_text, question),
+            temperature=self.temperature,
+            max_tokens=1024,
+            n=1,
+            task="summarization_prompt",
         )
 
-        chat_prompt = ChatPromptTemplate.from_messages(
-            [system_message_prompt, human_message_prompt]
-        )
-        chat_prompt = chat_prompt.format_prompt(
-            question=question, article_text=article_text
-        ).to_messages()
-        result = self.query_api(
-            prompt=chat_prompt,
+        return result
+
+    async def summarize_study_async(
+        self,
+        article_text,
+        question,
+    ) -> str:
+        result = await self.query_api_async(
+            prompt=self.summarization_messages(article_text, question),
             temperature=self.temperature,
             max_tokens=1024,
             n=1,
+            task="summarization_prompt",
         )
 
         return result
 
-    def process_article(self, article, question):
-        try:
-            abstract = article["MedlineCitation"]["Article"]["Abstract"]["AbstractText"]
-            abstract = self.reconstruct_abstract(abstract)
-            article_is_relevant = self.is_article_relevant(abstract, question)
-            citation = self.construct_citation(article)
-            if self.verbose:
-                print(citation)
-                print("~" * 10 + f"\n{abstract}")
-                print("~" * 10 + f"\nArticle is relevant? = {article_is_relevant}")
-
-            title = article["MedlineCitation"]["Article"]["ArticleTitle"]
-            url = (
-                f"https://pubmed.ncbi.nlm.nih.gov/"
-                f"{article['MedlineCitation']['PMID']}/"
-            )
-            article_json = {
-                "title": title,
-                "url": url,
-                "abstract": abstract,
-                "citation": citation,
-                "is_relevant": article_is_relevant,
-                "PMID": article["MedlineCitation"]["PMID"],
-            }
+    def article_record(
+        self, article: Article, article_is_relevant: bool, decided_by: str = "llm"
+    ) -> dict:
+        citation = article.citation
+        if self.verbose:
+            print(citation)
+            print("~" * 10 + f"\n{article.abstract}")
+            print("~" * 10 + f"\nArticle is relevant? = {article_is_relevant}")
+
+        return {
+            "title": article.title,
+            "url": article.url,
+            "abstract": article.abstract,
+            "citation": citation,
+            "is_relevant": article_is_relevant,
+            "decided_by": decided_by,
+            "PMID": article.pmid,
+        }
+
+    def report_article_error(self, article: Article, err: Exception) -> None:
+        if isinstance(err, KeyError):
+            print(f"Could not find {err} for article with PMID = {article.pmid}")
+        else:
+            print("Error: ", err)
+
+    def extract_abstracts(self, articles) -> list:
+        """Return ``(article, abstract)`` pairs, reporting articles without one."""
+        extracted = []
+        for article in articles:
+            if article.abstract is None:
+                self.report_article_error(article, KeyError("Abstract"))
+                continue
+            extracted.append((article, article.abstract))
+        return extracted
+
+    def prescreen_enabled(self) -> bool:
+        return self.prescreen_min_score is not None or self.prescreen_top_n is not None
 
-            if article_is_relevant:
-                summary = self.summarize_study(article_text=abstract, question=question)
-                article_json["summary"] = summary
+    def prescreen_scores(self, extracted, question):
+        """Score ``(article, abstract)`` pairs against ``question`` for the prescreen.
 
-            return article_json
-        except KeyError as err:
-            if "PMID" in article["MedlineCitation"].keys():
-                print(
-                    f"Could not find {err} for article with PMID = "
-                    f"{article['MedlineCitation']['PMID']}"
+        Uses :attr:`reranker` (cosine similarity, in [-1, 1]) when one is set and
+        BM25 within ``extracted`` otherwise.
+        """
+        abstracts = [abstract for _, abstract in extracted]
+        if self.reranker is not None:
+            pmids = [article.pmid for article, _ in extracted]
+            return self.reranker.scores(question, pmids, abstracts)
+        from .bm25 import bm25_return_n_articles
+
+        return bm25_return_n_articles(abstracts, question, return_scores=True)
+
+    def prescreen_articles(self, articles, question) -> tuple:
+        """Reject articles whose abstracts score poorly against ``question``.
+
+        Articles scoring (see :meth:`prescreen_scores`) below
+        ``prescreen_min_score``, or ranked below ``prescreen_top_n`` within
+        ``articles``, go straight to the irrelevant list without an LLM call.
+        Does nothing when neither cutoff is set.
+
+        Returns
+        -------
+        tuple
+            ``(articles_for_llm, rejected_records, scores)`` where ``scores``
+            maps every scored PMID to its score.
+        """
+        if not self.prescreen_enabled():
+            return articles, [], {}
+
+        extracted = self.extract_abstracts(articles)
+        if not extracted:
+            return [], [], {}
+        import numpy as np
+
+        scores = self.prescreen_scores(extracted, question)
+        ranks = np.empty(len(scores), dtype=int)
+        ranks[np.argsort(-scores, kind="stable")] = np.arange(len(scores))
+
+        kept = []
+        rejected = []
+        pmid_scores = {}
+        for (article, _), score, rank in zip(extracted, scores, ranks):
+            pmid_scores[article.pmid] = float(score)
+            if (
+                self.prescreen_min_score is not None
+                and score < self.prescreen_min_score
+            ) or (self.prescreen_top_n is not None and rank >= self.prescreen_top_n):
+                rejected.append(
+                    self.article_record(article, False, decided_by="prescreen")
                 )
             else:
-                print("Error retrieving article data:", err)
+                kept.append(article)
+        return kept, rejected, pmid_scores
+
+    @staticmethod
+    def attach_prescreen_scores(records, scores: dict) -> None:
+        if scores:
+            for record in records:
+                record["prescreen_score"] = scores.get(str(record["PMID"]))
+
+    def process_article(self, article: Article, question):
+        abstract = article.abstract
+        if abstract is None:
+            self.report_article_error(article, KeyError("Abstract"))
             return None
-        except ValueError as err:
-            print("Error: ", err)
+        article_is_relevant = self.is_article_relevant(abstract, question)
+        article_json = self.article_record(article, article_is_relevant)
+
+        if article_is_relevant:
+            summary = self.summarize_study(article_text=abstract, question=question)
+            article_json["summary"] = summary
+
+        return article_json
+
+    async def process_article_async(self, article: Article, question):
+        abstract = article.abstract
+        if abstract is None:
+            self.report_article_error(article, KeyError("Abstract"))
             return None
+        article_is_relevant = await self.is_article_relevant_async(abstract, question)
+        article_json = self.article_record(article, article_is_relevant)
 
-    def summarize_each_article(self, articles, question, num_workers=8):
+        if article_is_relevant:
+            article_json["summary"] = await self.summarize_study_async(
+                article_text=abstract, question=question
+            )
+
+        return article_json
+
+    @metrics.traced("summarize")
+    def summarize_each_article(
+        self, articles, question, num_workers=None, max_relevant=None, deadline=None
+    ):
+        """Judge every article's relevance and summarize the relevant ones.
+
+        Articles rejected by :meth:`prescreen_articles` skip the LLM; each
+        record's ``decided_by`` says whether the prescreen or the LLM judged it.
+        How many LLM calls run at once is up to :attr:`llm_scheduler`;
+        ``num_workers`` only caps it further for this call.
+
+        Work is submitted in the order of ``articles`` (esearch rank order when
+        they come from :meth:`fetch_article_data`), at most ``num_workers`` calls
+        ahead. Once ``max_relevant`` summaries are collected or the
+        ``time.monotonic()`` ``deadline`` passes, no new work is submitted,
+        queued work is cancelled and whatever has completed is returned.
+        """
+        num_workers = num_workers or self.llm_scheduler.max_concurrency
+        articles, prescreened, scores = self.prescreen_articles(articles, question)
+        batch_size = self.relevance_batch_size()
+        if batch_size > 1:
+            relevant, irrelevant = self.summarize_each_article_batched(
+                articles,
+                question,
+                batch_size,
+                num_workers=num_workers,
+                max_relevant=max_relevant,
+                deadline=deadline,
+            )
+        else:
+            relevant, irrelevant = self.summarize_articles_individually(
+                articles,
+                question,
+                num_workers=num_workers,
+                max_relevant=max_relevant,
+                deadline=deadline,
+            )
+        irrelevant = irrelevant + prescreened
+        self.attach_prescreen_scores(relevant + irrelevant, scores)
+        return relevant, irrelevant
+
+    @staticmethod
+    def time_left(deadline: float | None) -> float | None:
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    def should_stop(self, relevant: list, max_relevant=None, deadline=None) -> bool:
+        if max_relevant is not None and len(relevant) >= max_relevant:
+            logger.info(f"Collected {len(relevant)} relevant summaries; stopping early")
+            return True
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.info("Summarization deadline reached; stopping early")
+            return True
+        return False
+
+    def summarize_articles_individually(
+        self, articles, question, num_workers=None, max_relevant=None, deadline=None
+    ):
         relevant_article_summaries = []
         irrelevant_article_summaries = []
 
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            futures = [
-                executor.submit(self.process_article, article, question)
-                for article in articles
-            ]
-            for future in as_completed(futures):
+        num_workers = num_workers or self.llm_scheduler.max_concurrency
+        articles = iter(articles)
+        pending = set()
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+        try:
+            while True:
+                while len(pending) < num_workers:
+                    article = next(articles, None)
+                    if article is None:
+                        break
+                    pending.add(
+                        executor.submit(
+                            metrics.bind(self.process_article), article, question
+                        )
+                    )
+                if not pending:
+                    break
+                done, pending = wait(
+                    pending,
+                    timeout=self.time_left(deadline),
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Error processing article: {str(e)}")
+                        continue
+                    if result is not None:
+                        if result["is_relevant"]:
+                            relevant_article_summaries.append(result)
+                        else:
+                            irrelevant_article_summaries.append(result)
+                if self.should_stop(relevant_article_summaries, max_relevant, deadline):
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return relevant_article_summaries, irrelevant_article_summaries
+
+    def summarize_each_article_batched(
+        self,
+        articles,
+        question,
+        batch_size,
+        num_workers=None,
+        max_relevant=None,
+        deadline=None,
+    ):
+        """Like :meth:`summarize_each_article`, judging abstracts in batches.
+
+        Summaries of articles already judged relevant are submitted ahead of
+        judging further batches.
+        """
+        num_workers = num_workers or self.llm_scheduler.max_concurrency
+        relevant_article_summaries = []
+        irrelevant_article_summaries = []
+        abstracts = self.extract_abstracts(articles)
+        batches = (
+            abstracts[i : i + batch_size] for i in range(0, len(abstracts), batch_size)
+        )
+        to_summarize = deque()
+        pending = {}
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+        try:
+            while True:
+                while len(pending) < num_workers:
+                    if to_summarize:
+                        article_json, abstract = to_summarize.popleft()
+                        future = executor.submit(
+                            metrics.bind(self.summarize_study),
+                            article_text=abstract,
+                            question=question,
+                        )
+                        pending[future] = article_json
+                        continue
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    future = executor.submit(
+                        metrics.bind(self.are_articles_relevant),
+                        [abstract for _, abstract in batch],
+                        question,
+                    )
+                    pending[future] = batch
+                if not pending:
+                    break
+                done, _ = wait(
+                    pending,
+                    timeout=self.time_left(deadline),
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    work = pending.pop(future)
+                    if isinstance(work, dict):
+                        try:
+                            work["summary"] = future.result()
+                        except Exception as e:
+                            logger.error(f"Error summarizing article: {str(e)}")
+                            continue
+                        relevant_article_summaries.append(work)
+                        continue
+                    try:
+                        decisions = future.result()
+                    except Exception as e:
+                        logger.error(f"Error judging article relevance: {str(e)}")
+                        continue
+                    for (article, abstract), is_relevant in zip(work, decisions):
+                        article_json = self.article_record(article, is_relevant)
+                        if is_relevant:
+                            to_summarize.append((article_json, abstract))
+                        else:
+                            irrelevant_article_summaries.append(article_json)
+                if self.should_stop(relevant_article_summaries, max_relevant, deadline):
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return relevant_article_summaries, irrelevant_article_summaries
+
+    @staticmethod
+    def request_slots(num_workers: int | None = None):
+        """Per-request cap on concurrent LLM work, on top of the shared scheduler."""
+        if num_workers:
+            return asyncio.Semaphore(num_workers)
+        return contextlib.nullcontext()
+
+    @metrics.traced("summarize")
+    async def summarize_each_article_async(
+        self, articles, question, num_workers=None, semaphore=None, on_record=None
+    ):
+        """Async counterpart of :meth:`summarize_each_article`.
+
+        ``on_record``, if given, is called with each article's record as soon as
+        that article has been judged (and summarized, if relevant).
+        """
+        if semaphore is None:
+            semaphore = self.request_slots(num_workers)
+        if self.reranker is not None:
+            # Embedding calls block; keep them off the event loop.
+            articles, prescreened, scores = await asyncio.to_thread(
+                self.prescreen_articles, articles, question
+            )
+        else:
+            articles, prescreened, scores = self.prescreen_articles(articles, question)
+
+        def notify_scored(record):
+            self.attach_prescreen_scores([record], scores)
+            on_record(record)
+
+        notify = notify_scored if on_record is not None else None
+        if notify is not None:
+            for record in prescreened:
+                notify(record)
+        batch_size = self.relevance_batch_size()
+        if batch_size > 1:
+            relevant, irrelevant = await self.summarize_each_article_batched_async(
+                articles, question, batch_size, semaphore, on_record=notify
+            )
+        else:
+            relevant, irrelevant = await self.summarize_articles_individually_async(
+                articles, question, semaphore, on_record=notify
+            )
+        irrelevant = irrelevant + prescreened
+        self.attach_prescreen_scores(relevant + irrelevant, scores)
+        return relevant, irrelevant
+
+    async def summarize_articles_individually_async(
+        self, articles, question, semaphore, on_record=None
+    ):
+        relevant_article_summaries = []
+        irrelevant_article_summaries = []
+
+        async def process(article):
+            async with semaphore:
                 try:
-                    result = future.result()
+                    result = await self.process_article_async(article, question)
                 except Exception as e:
-                    print(
-                        "Error processing article. Server is probably overloaded. "
-                        "waiting 10 seconds",
-                        e,
-                    )
-                    time.sleep(20)
-                    print("Lets try again")
-                    result = future.result()
-                if result is not None:
-                    if result["is_relevant"]:
-                        relevant_article_summaries.append(result)
-                    else:
-                        irrelevant_article_summaries.append(result)
+                    logger.error(f"Error processing article: {str(e)}")
+                    return
+            if result is not None:
+                if result["is_relevant"]:
+                    relevant_article_summaries.append(result)
+                else:
+                    irrelevant_article_summaries.append(result)
+                if on_record is not None:
+                    on_record(result)
 
+        await asyncio.gather(*(process(article) for article in articles))
         return relevant_article_summaries, irrelevant_article_summaries
 
+    async def summarize_each_article_batched_async(
+        self, articles, question, batch_size, semaphore, on_record=None
+    ):
+        relevant_article_summaries = []
+        irrelevant_article_summaries = []
+        abstracts = self.extract_abstracts(articles)
+
+        async def summarize(article_json, abstract):
+            async with semaphore:
+                try:
+                    article_json["summary"] = await self.summarize_study_async(
+                        article_text=abstract, question=question
+                    )
+                except Exception as e:
+                    logger.error(f"Error summarizing article: {str(e)}")
+                    return
+            relevant_article_summaries.append(article_json)
+            if on_record is not None:
+                on_record(article_json)
+
+        async def judge(batch):
+            async with semaphore:
+                try:
+                    decisions = await self.are_articles_relevant_async(
+                        [abstract for _, abstract in batch], question
+                    )
+                except Exception as e:
+                    logger.error(f"Error judging article relevance: {str(e)}")
+                    return
+            pending = []
+            for (article, abstract), article_is_relevant in zip(batch, decisions):
+                article_json = self.article_record(article, article_is_relevant)
+                if article_is_relevant:
+                    pending.append(summarize(article_json, abstract))
+                else:
+                    irrelevant_article_summaries.append(article_json)
+                    if on_record is not None:
+                        on_record(article_json)
+            await asyncio.gather(*pending)
+
+        await asyncio.gather(
+            *(
+                judge(abstracts[i : i + batch_size])
+                for i in range(0, len(abstracts), batch_size)
+            )
+        )
+        return relevant_article_summaries, irrelevant_article_summaries
+
+    @metrics.traced("search_and_summarize")
+    async def search_and_summarize_async(
+        self,
+        question: str,
+        num_results: int = 10,
+        num_query_attempts: int = 1,
+        restriction_date=None,
+        num_workers: int | None = None,
+        verbose: bool = False,
+        max_concurrency: int = 4,
+        single_query_call: bool = False,
+        on_event=None,
+        max_relevant: int | None = None,
+        deadline: float | None = None,
+        fetches: SharedArticleFetches | None = None,
+    ) -> tuple:
+        """Search, fetch and summarize as one overlapping async pipeline.
+
+        Each query attempt fetches and judges the PMIDs it found as soon as its
+        esearch returns (see :meth:`iter_searches_async`), so the first articles
+        are being summarized while the remaining queries are still being
+        generated. PMIDs already claimed by an earlier attempt are not fetched
+        twice.
+
+        Articles of each query are judged in esearch rank order. With a
+        prescreen (``prescreen_min_score`` or ``prescreen_top_n``), articles are
+        still fetched as each query returns, but the prescreen ranks the
+        candidates of all queries together once the searches finish, so its
+        cutoffs apply per question as in :meth:`summarize_each_article`. Once
+        ``max_relevant`` relevant summaries are collected, or the
+        ``time.monotonic()`` ``deadline`` passes, all outstanding searches,
+        fetches and LLM calls are cancelled and what has completed is returned.
+
+        ``on_event``, if given, is called with a :class:`QueryGenerated`,
+        :class:`ArticlesFound` or :class:`ArticleProcessed` event as each of
+        those steps completes. ``fetches`` shares article fetches with other
+        pipelines (see :meth:`iter_article_data`).
+
+        Returns
+        -------
+        tuple
+            ``(queries, article_ids, articles, relevant, irrelevant)``
+        """
+        self.configure_entrez()
+        semaphore = self.request_slots(num_workers)
+        search_queries = {}
+        search_ids = {}
+        articles = []
+        relevant_article_summaries = []
+        irrelevant_article_summaries = []
+
+        enough = asyncio.Event()
+
+        # Records are collected as they complete rather than from the return
+        # values, so that nothing finished is lost when the pipeline is stopped.
+        def on_record(record):
+            if record["is_relevant"]:
+                relevant_article_summaries.append(record)
+                if max_relevant is not None and (
+                    len(relevant_article_summaries) >= max_relevant
+                ):
+                    enough.set()
+            else:
+                irrelevant_article_summaries.append(record)
+            if on_event is not None:
+                on_event(ArticleProcessed(record))
+
+        async def summarize(group):
+            await self.summarize_each_article_async(
+                group, question, semaphore=semaphore, on_record=on_record
+            )
+
+        async def process(retrieved_ids):
+            new_ids = [pmid for pmid in retrieved_ids if pmid not in search_ids]
+            search_ids.update(dict.fromkeys(new_ids))
+            if not new_ids:
+                return
+            # The prescreen ranks the whole candidate set, so with one the
+            # articles are judged in pipeline() after every search is done.
+            prescreen = self.prescreen_enabled()
+            group_size = self.relevance_batch_size()
+            group = []
+            summarizing = []
+            async for article in self.iter_article_data_async(
+                new_ids, ordered=True, fetches=fetches
+            ):
+                articles.append(article)
+                if prescreen:
+                    continue
+                group.append(article)
+                if len(group) >= group_size:
+                    summarizing.append(asyncio.ensure_future(summarize(group)))
+                    group = []
+            if group:
+                summarizing.append(asyncio.ensure_future(summarize(group)))
+            await asyncio.gather(*summarizing)
+
+        async def pipeline():
+            processing = []
+            searches = self.iter_searches_async(
+                question,
+                num_results=num_results,
+                num_query_attempts=num_query_attempts,
+                verbose=verbose,
+                restriction_date=restriction_date,
+                max_concurrency=max_concurrency,
+                single_query_call=single_query_call,
+                on_event=on_event,
+            )
+            try:
+                async with contextlib.aclosing(searches):
+                    async for pubmed_query, retrieved_ids in searches:
+                        search_queries[pubmed_query] = None
+                        if on_event is not None:
+                            on_event(ArticlesFound(pubmed_query, list(retrieved_ids)))
+                        processing.append(asyncio.ensure_future(process(retrieved_ids)))
+                await asyncio.gather(*processing)
+                if self.prescreen_enabled() and articles:
+                    rank = {pmid: i for i, pmid in enumerate(search_ids)}
+                    await summarize(
+                        sorted(articles, key=lambda a: rank.get(a.pmid, len(rank)))
+                    )
+            finally:
+                for task in processing:
+                    task.cancel()
+
+        running = asyncio.ensure_future(pipeline())
+        stopping = asyncio.ensure_future(enough.wait())
+        try:
+            await asyncio.wait(
+                {running, stopping},
+                timeout=self.time_left(deadline),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        except asyncio.CancelledError:
+            running.cancel()
+            raise
+        finally:
+            stopping.cancel()
+        if running.done():
+            running.result()
+        else:
+            if enough.is_set():
+                logger.info(
+                    f"Collected {len(relevant_article_summaries)} relevant "
+                    "summaries; stopping early"
+                )
+            else:
+                logger.info("Summarization deadline reached; stopping early")
+            running.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+        return (
+            list(search_queries),
+            list(search_ids),
+            articles,
+            relevant_article_summaries,
+            irrelevant_article_summaries,
+        )
+
+    @staticmethod
+    def format_summary(index: int, summary: dict) -> str:
+        citation = re.sub(r"\n", "", summary["citation"])
+        return f"[{index}] Source: {citation}\n\n\n {summary['summary']}"
+
     def build_citations_and_summaries(
         self, article_summaries: dict, with_url: bool = False
     ) -> tuple:
@@ -444,9 +1778,7 @@ class PubMedNeuralRetriever:
         citations = []
         for i, summary in enumerate(article_summaries):
             citation = re.sub(r"\n", "", summary["citation"])
-            article_summaries_with_citations.append(
-                f"[{i+1}] Source: {citation}\n\n\n {summary['summary']}"
-            )
+            article_summaries_with_citations.append(self.format_summary(i + 1, summary))
             citation_with_index = f"[{i+1}] {citation}"
             if with_url:
                 citation_with_index = (
@@ -455,9 +1787,9 @@ class PubMedNeuralRetriever:
                 )
 
             citations.append(citation_with_index)
-        article_summaries_with_citations = (
-            "\n\n--------------------------------------------------------------\n\n"
-        ).join(article_summaries_with_citations)
+        article_summaries_with_citations = _SUMMARY_SEPARATOR.join(
+            article_summaries_with_citations
+        )
 
         citations = "\n".join(citations)
 
@@ -466,47 +1798,162 @@ class PubMedNeuralRetriever:
 
         return article_summaries_with_citations, citations
 
+    def synthesis_messages(self, article_summaries_str: str, question: str) -> list:
+        return self.architecture.render(
+            "synthesize_prompt",
+            question=question,
+            article_summaries_str=article_summaries_str,
+        )
+
+    def synthesis_budget(self) -> int | None:
+        """Synthesis prompt budget in tokens; ``None`` means unlimited."""
+        if self.synthesis_token_budget is not None:
+            return self.synthesis_token_budget
+        return self.architecture.get_option("synthesize_prompt", "token_budget")
+
+    def pack_summaries(self, summaries, question, min_summary_tokens: int = 64) -> list:
+        """Keep the highest-ranked summaries that fit the synthesis token budget.
+
+        Summaries are taken in order while they fit whole. The first one that
+        does not fit is truncated to the remaining budget (marked
+        ``"truncated": True``) if at least ``min_summary_tokens`` are left, and
+        the rest are dropped.
+        """
+        budget = self.synthesis_budget()
+        if budget is None or not summaries:
+            return list(summaries)
+        tokenizer = tokenizer_for(self.model)
+        remaining = budget - tokenizer.count_messages(
+            self.synthesis_messages("", question)
+        )
+        separator = tokenizer.count(_SUMMARY_SEPARATOR)
+
+        packed = []
+        for summary in summaries:
+            entry_tokens = separator + tokenizer.count(
+                self.format_summary(len(packed) + 1, summary)
+            )
+            if entry_tokens <= remaining:
+                packed.append(summary)
+                remaining -= entry_tokens
+                continue
+            summary_tokens = tokenizer.count(summary["summary"])
+            room = remaining - (entry_tokens - summary_tokens)
+            if room >= min_summary_tokens:
+                packed.append(
+                    dict(
+                        summary,
+                        summary=tokenizer.truncate(summary["summary"], room),
+                        truncated=True,
+                    )
+                )
+            break
+        if len(packed) < len(summaries):
+            logger.info(
+                f"Packed {len(packed)} of {len(summaries)} summaries into a "
+                f"{budget} token synthesis budget"
+            )
+        return packed
+
+    def synthesis_prompt(self, summaries, question, with_url=False) -> tuple:
+        """Pack ``summaries`` and build the synthesis messages.
+
+        Returns
+        -------
+        tuple
+            ``(messages, citations, prompt_tokens)``
+        """
+        summaries = self.pack_summaries(summaries, question)
+        article_summaries_str, citations = self.build_citations_and_summaries(
+            article_summaries=summaries, with_url=with_url
+        )
+        messages = self.synthesis_messages(article_summaries_str, question)
+        prompt_tokens = tokenizer_for(self.model).count_messages(messages)
+        logger.info(
+            f"Synthesis prompt: {prompt_tokens} tokens, {len(summaries)} summaries"
+        )
+        return messages, citations, prompt_tokens
+
+    @metrics.traced("synthesize")
     def synthesize_all_articles(
         self,
         summaries,
         question,
         with_url=False,
     ):
-        article_summaries_str, citations = self.build_citations_and_summaries(
-            article_summaries=summaries, with_url=with_url
-        )
-
-        system_prompt = self.architecture.get_prompt(
-            "synthesize_prompt", "system"
-        ).format()
-        system_message_prompt = SystemMessagePromptTemplate.from_template(system_prompt)
-        user_prompt = self.architecture.get_prompt("synthesize_prompt", "template")
-        human_message_prompt = HumanMessagePromptTemplate(
-            prompt=PromptTemplate(
-                template=user_prompt.format(
-                    question="{question}",
-                    article_summaries_str="{article_summaries_str}",
-                ),
-                input_variables=["question", "article_summaries_str"],
-            )
+        messages, citations, _ = self.synthesis_prompt(summaries, question, with_url)
+        result = self.query_api(
+            prompt=messages,
+            temperature=self.temperature,
+            max_tokens=1024,
+            n=1,
+            task="synthesize_prompt",
         )
+        if with_url:
+            result = result + "\n\n" + "References:\n" + citations
+        return result
 
-        chat_prompt = ChatPromptTemplate.from_messages(
-            [system_message_prompt, human_message_prompt]
+    @metrics.traced("synthesize")
+    async def synthesize_all_articles_async(
+        self,
+        summaries,
+        question,
+        with_url=False,
+    ):
+        # Token counting may load (and on first use download) the tokenizer.
+        messages, citations, _ = await asyncio.to_thread(
+            self.synthesis_prompt, summaries, question, with_url
         )
-        chat_prompt = chat_prompt.format_prompt(
-            question=question, article_summaries_str=article_summaries_str
-        ).to_messages()
-        result = self.query_api(
-            prompt=chat_prompt,
+        result = await self.query_api_async(
+            prompt=messages,
             temperature=self.temperature,
             max_tokens=1024,
             n=1,
+            task="synthesize_prompt",
         )
         if with_url:
             result = result + "\n\n" + "References:\n" + citations
         return result
 
+    async def synthesize_all_articles_stream(
+        self,
+        summaries,
+        question,
+        with_url=False,
+    ):
+        """Like :meth:`synthesize_all_articles_async`, yielding the text in chunks."""
+        span = metrics.start_span("synthesize", stream=True)
+        error = None
+        try:
+            messages, citations, _ = await asyncio.to_thread(
+                self.synthesis_prompt, summaries, question, with_url
+            )
+            async for chunk in self.query_api_stream(
+                prompt=messages,
+                temperature=self.temperature,
+                max_tokens=1024,
+                task="synthesize_prompt",
+            ):
+                yield chunk
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            span.finish(error)
+        if with_url:
+            yield "\n\n" + "References:\n" + citations
+
+    @staticmethod
+    def in_rank_order(records: list, article_ids: list) -> list:
+        """``records`` sorted by the search rank of their PMIDs.
+
+        Summaries complete in whatever order the LLM answers; putting them back
+        in rank order means the synthesis token budget, when it cuts, drops the
+        lowest-ranked ones.
+        """
+        rank = {str(pmid): i for i, pmid in enumerate(article_ids)}
+        return sorted(records, key=lambda record: rank.get(record["PMID"], len(rank)))
+
     def answer(self, question: str, num_results: int = 2, num_query_attempts: int = 1):
         """A complete pipeline to answer a question using PubMed articles.
 
@@ -529,10 +1976,17 @@ class PubMedNeuralRetriever:
         pubmed_queries, article_ids = self.search_pubmed(
             question, num_results=num_results, num_query_attempts=num_query_attempts
         )
-        articles = self.fetch_article_data(article_ids)
+        articles = []
+
+        def stream_articles():
+            for article in self.iter_article_data(article_ids, ordered=True):
+                articles.append(article)
+                yield article
+
         article_summaries, irrelevant_articles = self.summarize_each_article(
-            articles, question
+            stream_articles(), question
         )
+        article_summaries = self.in_rank_order(article_summaries, article_ids)
         synthesis = self.synthesize_all_articles(article_summaries, question)
 
         return (
@@ -543,3 +1997,42 @@ class PubMedNeuralRetriever:
             article_ids,
             pubmed_queries,
         )
+
+    async def answer_async(
+        self,
+        question: str,
+        num_results: int = 2,
+        num_query_attempts: int = 1,
+        restriction_date=None,
+    ):
+        """Async counterpart of :meth:`answer`.
+
+        Searching, fetching and summarizing overlap (see
+        :meth:`search_and_summarize_async`), and nothing blocks the event loop,
+        so many questions can be answered concurrently from a single loop.
+        """
+        (
+            pubmed_queries,
+            article_ids,
+            articles,
+            article_summaries,
+            irrelevant_articles,
+        ) = await self.search_and_summarize_async(
+            question,
+            num_results=num_results,
+            num_query_attempts=num_query_attempts,
+            restriction_date=restriction_date,
+        )
+        article_summaries = self.in_rank_order(article_summaries, article_ids)
+        synthesis = await self.synthesize_all_articles_async(
+            article_summaries, question
+        )
+
+        return (
+            synthesis,
+            article_summaries,
+            irrelevant_articles,
+            articles,
+            article_ids,
+            pubmed_queries,
+        )
@@ -0,0 +1,240 @@
+"""Rate limiting for NCBI E-utilities requests."""
+
+import logging
+import os
+import random
+import struct
+import threading
+import time
+from functools import lru_cache
+from http.client import HTTPException
+from pathlib import Path
+from typing import Callable
+from urllib.error import HTTPError, URLError
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# NCBI E-utilities request ceilings, per second.
+NCBI_RATE = 3.0
+NCBI_RATE_WITH_API_KEY = 10.0
+
+_STATE = struct.Struct("d")
+
+
+class TokenBucket:
+    """A thread-safe token bucket, optionally shared between processes.
+
+    Tokens are handed out by reservation: :meth:`acquire` books the next free
+    slot under a short lock and then sleeps outside it, so waiting callers are
+    served in arrival order without polling. The bucket state is a single
+    timestamp (the time at which the bucket will be full again, as in GCRA),
+    which is what makes it cheap to keep in a file for cross-process use.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second.
+    capacity : int, optional
+        Burst size, by default 1 (strictly spaced requests).
+    lock_path : str or Path, optional
+        File holding the shared bucket state. Every process that opens a bucket
+        on the same file shares its rate. By default the bucket is per process.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int = 1,
+        lock_path: str | Path | None = None,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.interval = 1.0 / rate
+        self.lock_path = None if lock_path is None else Path(lock_path)
+        self._tat = 0.0
+        self._lock = threading.Lock()
+        if self.lock_path is not None:
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            self.lock_path.touch(exist_ok=True)
+
+    def _reserve(self, tat: float, now: float) -> tuple[float, float]:
+        # ``tat`` is when the bucket would next be empty of debt; a request may go
+        # as soon as it is at most ``capacity - 1`` intervals in the future.
+        start = max(tat, now)
+        wait = max(0.0, start - (self.capacity - 1) * self.interval - now)
+        return start + self.interval, wait
+
+    def _reserve_shared(self, now: float) -> float:
+        import fcntl
+
+        fd = os.open(self.lock_path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            data = os.pread(fd, _STATE.size, 0)
+            tat = _STATE.unpack(data)[0] if len(data) == _STATE.size else 0.0
+            tat, wait = self._reserve(tat, now)
+            os.pwrite(fd, _STATE.pack(tat), 0)
+            return wait
+        finally:
+            os.close(fd)
+
+    def reserve(self) -> float:
+        """Book one token and return how long the caller must wait before using it."""
+        with self._lock:
+            if self.lock_path is not None:
+                return self._reserve_shared(time.time())
+            self._tat, wait = self._reserve(self._tat, time.monotonic())
+            return wait
+
+    def acquire(self) -> float:
+        """Block until a token is available and return the seconds spent waiting."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an E-utilities error is worth retrying (throttling, 5xx, network)."""
+    if isinstance(error, HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (URLError, HTTPException, ConnectionError, TimeoutError))
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Seconds requested by a ``Retry-After`` header, if the error carries one."""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        return None
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class NCBIRateLimiter:
+    """Keeps Entrez requests under the NCBI ceiling and retries transient failures.
+
+    Every call first takes a token from a :class:`TokenBucket` running at 3
+    requests per second, or 10 with an API key. HTTP 429 and 5xx responses and
+    network errors are retried with full-jitter exponential backoff, honouring
+    ``Retry-After`` when NCBI sends one.
+
+    :class:`~damsan.pubmed_engine.PubMedNeuralRetriever` sets the
+    process-global ``Bio.Entrez.max_tries`` to 1 so that only this class
+    retries. That also turns off Biopython's own retries for any other code in
+    the process that uses ``Bio.Entrez``; route such calls through
+    :meth:`call` to keep them retried.
+
+    Parameters
+    ----------
+    api_key : str, optional
+        NCBI API key; raises the default rate to 10 requests per second.
+    rate : float, optional
+        Requests per second, overriding the API key based default.
+    lock_path : str or Path, optional
+        Share the rate with other processes through this file.
+    max_retries : int, optional
+        Retries per call after the first attempt, by default 4.
+    backoff : float, optional
+        Base backoff in seconds, by default 0.5.
+    max_backoff : float, optional
+        Upper bound on a single backoff in seconds, by default 30.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        rate: float | None = None,
+        lock_path: str | Path | None = None,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        if rate is None:
+            rate = NCBI_RATE_WITH_API_KEY if api_key else NCBI_RATE
+        self.api_key = api_key
+        self.bucket = TokenBucket(rate, lock_path=lock_path)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def _record_wait(self, wait: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.queue_wait += wait
+            self.max_queue_wait = max(self.max_queue_wait, wait)
+
+    def backoff_delay(self, attempt: int, error: BaseException) -> float:
+        requested = retry_after(error)
+        if requested is not None:
+            return min(requested, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Call ``func(*args, **kwargs)`` within the rate limit, with retries."""
+        attempt = 0
+        while True:
+            wait = self.bucket.acquire()
+            self._record_wait(wait)
+            metrics.count("ncbi.calls")
+            metrics.count("ncbi.queue_wait_seconds", wait)
+            if wait > 0:
+                logger.debug(f"Waited {wait:.3f}s for an NCBI request slot")
+            try:
+                return func(*args, **kwargs)
+            except Exception as err:
+                if isinstance(err, HTTPError) and err.code == 429:
+                    metrics.count("ncbi.throttled")
+                    with self._lock:
+                        self.throttled += 1
+                if not is_retryable(err) or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                delay = self.backoff_delay(attempt, err)
+                logger.warning(
+                    f"NCBI request failed ({err}); retrying in {delay:.2f}s "
+                    f"(attempt {attempt + 1} of {self.max_retries})"
+                )
+                metrics.count("ncbi.retries")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                attempt += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "failures": self.failures,
+                "queue_wait": self.queue_wait,
+                "mean_queue_wait": self.queue_wait / self.calls if self.calls else 0.0,
+                "max_queue_wait": self.max_queue_wait,
+            }
+
+
+@lru_cache(maxsize=None)
+def shared_rate_limiter(
+    api_key: str | None = None, lock_path: str | None = None
+) -> NCBIRateLimiter:
+    """The process-wide limiter for ``api_key``, shared by every retriever using it."""
+    return NCBIRateLimiter(api_key=api_key or None, lock_path=lock_path)
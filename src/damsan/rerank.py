@@ -0,0 +1,422 @@
+"""Dense reranking of articles by embedding similarity to the question.
+
+A :class:`DenseReranker` embeds the question and each article's abstract with
+an :class:`Embedder` and scores articles by cosine similarity, as one NumPy
+matrix-vector product. Abstract embeddings are kept in a :class:`VectorCache`,
+a memory-mapped float16 matrix with a PMID index, so each abstract is embedded
+once no matter how many questions, runs or processes see it.
+
+Two embedders ship: :class:`OpenAIEmbedder` (an embeddings API) and
+:class:`HashingEmbedder`, which needs no model or network.
+
+The reranker plugs into the pipeline twice: as the scorer of the relevance
+prescreen (``PubMedNeuralRetriever(reranker=..., prescreen_top_n=...)``) and to
+order summaries before synthesis (``Damsan(reranker=...)``), so the closest
+summaries are the ones that fit the synthesis budget.
+"""
+
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from . import metrics
+from .bm25 import tokenize
+from .cache import MemoryCache
+
+# Output sizes of the OpenAI embedding models, for caches opened before the
+# first call.
+_OPENAI_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# Function words that would otherwise dominate a bag-of-words embedding.
+_STOPWORDS = frozenset(
+    "a about above after again against all also am an and any are as at be "
+    "because been before being below between both but by can could did do does "
+    "doing down during each few for from further had has have having he her "
+    "here hers him his how i if in into is it its itself just may me might more "
+    "most must my no nor not now of off on once only or other our out over own "
+    "same she should so some such than that the their theirs them then there "
+    "these they this those through to too under until up upon very was we were "
+    "what when where which while who whom why will with within without would "
+    "you your".split()
+)
+
+
+def normalize(vectors) -> np.ndarray:
+    """Scale the rows of ``vectors`` to unit length (all-zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class Embedder:
+    """Turns texts into fixed-size vectors for :class:`DenseReranker`.
+
+    ``name`` identifies the embedding space: vectors cached under one name are
+    never compared with vectors of another.
+    """
+
+    name = "embedder"
+    dimension = None
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Return a ``(len(texts), dimension)`` float32 array of unit vectors."""
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """Offline embedder: a signed, hashed bag of words and word pairs.
+
+    Each word (minus stopwords) and each pair of adjacent words is hashed into
+    one of ``dimension`` buckets with a random sign, and counts are damped with
+    ``log1p``. Similarity is therefore lexical, like BM25, but cheap enough to
+    embed every abstract and still deterministic across processes and runs.
+
+    Parameters
+    ----------
+    dimension : int, optional
+        Vector size, by default 1024.
+    pairs : bool, optional
+        Also hash adjacent word pairs, by default True.
+    """
+
+    def __init__(self, dimension: int = 1024, pairs: bool = True) -> None:
+        self.dimension = dimension
+        self.pairs = pairs
+        self.name = f"hashing-{dimension}" + ("-pairs" if pairs else "")
+
+    def features(self, text: str) -> list:
+        words = [word for word in tokenize(text) if word not in _STOPWORDS]
+        if self.pairs:
+            words += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return words
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self.features(text or "")
+            hashes = np.fromiter(
+                (zlib.crc32(feature.encode("utf-8")) for feature in features),
+                dtype=np.int64,
+                count=len(features),
+            )
+            signs = np.where(hashes & (1 << 31), -1.0, 1.0)
+            np.add.at(vectors[row], hashes % self.dimension, signs)
+        return normalize(np.sign(vectors) * np.log1p(np.abs(vectors)))
+
+
+class OpenAIEmbedder(Embedder):
+    """Embeddings from the OpenAI (or a compatible) embeddings endpoint.
+
+    Calls go through an :class:`~damsan.scheduler.LLMScheduler`, which retries
+    and backs off on throttling like it does for chat calls.
+
+    Parameters
+    ----------
+    model : str, optional
+        Embedding model, by default "text-embedding-3-small".
+    api_key : str, optional
+        OpenAI API key, by default read from the environment.
+    base_url : str, optional
+        Alternative OpenAI-compatible endpoint.
+    dimensions : int, optional
+        Ask the model for shorter vectors (text-embedding-3 models only).
+    batch_size : int, optional
+        Texts per request, by default 256.
+    scheduler : LLMScheduler, optional
+        By default the process-wide scheduler.
+    timeout : float, optional
+        Request timeout in seconds, by default 60.
+    """
+
+    def __init__(
+        self,
+        model: str = "text-embedding-3-small",
+        api_key: str | None = None,
+        base_url: str | None = None,
+        dimensions: int | None = None,
+        batch_size: int = 256,
+        scheduler=None,
+        timeout: float = 60.0,
+    ) -> None:
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url
+        self.dimensions = dimensions
+        self.dimension = dimensions or _OPENAI_DIMENSIONS.get(model)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.name = f"openai-{model}" + (f"-{dimensions}" if dimensions else "")
+        if scheduler is None:
+            from .scheduler import shared_llm_scheduler
+
+            scheduler = shared_llm_scheduler()
+        self.scheduler = scheduler
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import openai
+
+                options = {}
+                if self.api_key:
+                    options["api_key"] = self.api_key
+                if self.base_url:
+                    options["base_url"] = self.base_url
+                # Retries are left to the scheduler.
+                self._client = openai.OpenAI(
+                    timeout=self.timeout, max_retries=0, **options
+                )
+            return self._client
+
+    def embed(self, texts: list) -> np.ndarray:
+        options = {"dimensions": self.dimensions} if self.dimensions else {}
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            # The endpoint rejects empty strings.
+            batch = [text or " " for text in texts[start : start + self.batch_size]]
+            response = self.scheduler.run(
+                self.client().embeddings.create,
+                model=self.model,
+                input=batch,
+                **options,
+            )
+            data = sorted(response.data, key=lambda item: item.index)
+            vectors.extend(item.embedding for item in data)
+        if not vectors:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        vectors = normalize(vectors)
+        self.dimension = vectors.shape[1]
+        return vectors
+
+
+class VectorCache:
+    """PMID embeddings in a memory-mapped float16 matrix, kept across runs.
+
+    The directory holds ``vectors.f16`` (one row per article), ``pmids.i64``
+    (the PMID of each row, in order) and ``meta.json`` (embedder name and
+    dimension). Rows are only ever appended, under an exclusive file lock, so
+    several processes can share one cache; each picks up rows the others added
+    on its next lookup.
+
+    Parameters
+    ----------
+    path : str or Path
+        Cache directory. Created if needed.
+    embedder : str
+        Name of the embedder whose vectors are cached. Opening a cache built by
+        another embedder raises ``ValueError``.
+    dimension : int, optional
+        Vector size; when unknown, it is taken from the first vectors stored.
+    """
+
+    def __init__(
+        self, path: str | Path, embedder: str, dimension: int | None = None
+    ) -> None:
+        self.path = Path(path)
+        self.embedder = embedder
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.path / "meta.json"
+        self.pmids_path = self.path / "pmids.i64"
+        self.vectors_path = self.path / "vectors.f16"
+        self.pmids_path.touch(exist_ok=True)
+        self.vectors_path.touch(exist_ok=True)
+        self.dimension = None
+        self._rows = {}
+        self._num_rows = 0
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._load_meta()
+        if self.dimension is None and dimension is not None:
+            self._write_meta(dimension)
+
+    def _load_meta(self) -> None:
+        if not self.meta_path.exists():
+            return
+        with open(self.meta_path, encoding="utf-8") as handle:
+            meta = json.load(handle)
+        if meta["embedder"] != self.embedder:
+            raise ValueError(
+                f"{self.path} holds vectors from {meta['embedder']!r}, "
+                f"not {self.embedder!r}"
+            )
+        self.dimension = meta["dimension"]
+
+    def _write_meta(self, dimension: int) -> None:
+        temporary = self.meta_path.with_suffix(".tmp")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump({"embedder": self.embedder, "dimension": dimension}, handle)
+        os.replace(temporary, self.meta_path)
+        self.dimension = dimension
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._num_rows
+
+    def _refresh(self) -> None:
+        """Index the rows other processes appended since the last call."""
+        num_rows = os.path.getsize(self.pmids_path) // 8
+        if num_rows == self._num_rows:
+            return
+        if self.dimension is None:
+            self._load_meta()
+        new = np.fromfile(
+            self.pmids_path,
+            dtype=np.int64,
+            count=num_rows - self._num_rows,
+            offset=self._num_rows * 8,
+        )
+        for row, pmid in enumerate(new.tolist(), start=self._num_rows):
+            self._rows[str(pmid)] = row
+        self._num_rows = num_rows
+        self._matrix = None
+
+    def _vectors(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.memmap(
+                self.vectors_path,
+                dtype=np.float16,
+                mode="r",
+                shape=(self._num_rows, self.dimension),
+            )
+        return self._matrix
+
+    def get(self, pmids: Iterable) -> tuple:
+        """Return ``(vectors, found)`` for ``pmids``.
+
+        ``vectors`` is a float32 ``(len(pmids), dimension)`` array with zeros
+        for the PMIDs that are not cached; ``found`` is the boolean mask of the
+        ones that are.
+        """
+        pmids = [str(pmid) for pmid in pmids]
+        with self._lock:
+            self._refresh()
+            rows = np.fromiter(
+                (self._rows.get(pmid, -1) for pmid in pmids),
+                dtype=np.int64,
+                count=len(pmids),
+            )
+            found = rows >= 0
+            vectors = np.zeros((len(pmids), self.dimension or 0), dtype=np.float32)
+            if found.any():
+                vectors[found] = self._vectors()[rows[found]]
+        return vectors, found
+
+    def put(self, pmids: Iterable, vectors: np.ndarray) -> None:
+        """Append the vectors of the ``pmids`` that are not cached yet."""
+        import fcntl
+
+        pmids = [str(pmid) for pmid in pmids]
+        if not pmids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float16)
+        with self._lock:
+            fd = os.open(self.pmids_path, os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self._refresh()
+                if self.dimension is None:
+                    self._write_meta(vectors.shape[1])
+                if vectors.shape[1] != self.dimension:
+                    raise ValueError(
+                        f"{self.path} holds {self.dimension}-d vectors, "
+                        f"got {vectors.shape[1]}-d"
+                    )
+                new = {}
+                for pmid, vector in zip(pmids, vectors):
+                    if pmid not in self._rows and pmid.isdigit():
+                        new[pmid] = vector
+                if not new:
+                    return
+                # Vectors first: a row only exists once its PMID is written, and
+                # bytes left by an interrupted append are simply overwritten.
+                with open(self.vectors_path, "r+b") as handle:
+                    handle.seek(self._num_rows * self.dimension * 2)
+                    handle.write(np.stack(list(new.values())).tobytes())
+                    handle.truncate()
+                os.pwrite(
+                    fd,
+                    np.asarray([int(pmid) for pmid in new], dtype=np.int64).tobytes(),
+                    self._num_rows * 8,
+                )
+                self._refresh()
+            finally:
+                os.close(fd)
+
+
+class DenseReranker:
+    """Scores articles by cosine similarity of question and abstract embeddings.
+
+    Parameters
+    ----------
+    embedder : Embedder
+        Embeds questions and abstracts.
+    cache : VectorCache or str or Path, optional
+        Where abstract embeddings are kept, or the directory of a
+        :class:`VectorCache` for ``embedder``. Without one, abstracts are
+        embedded again every time they are scored.
+    """
+
+    def __init__(
+        self, embedder: Embedder, cache: VectorCache | str | Path | None = None
+    ) -> None:
+        if isinstance(cache, (str, Path)):
+            cache = VectorCache(cache, embedder.name, embedder.dimension)
+        self.embedder = embedder
+        self.cache = cache
+        self._questions = MemoryCache(max_entries=256)
+
+    def embed_question(self, question: str) -> np.ndarray:
+        vector = self._questions.get(question)
+        if vector is None:
+            vector = self.embedder.embed([question])[0]
+            self._questions.set(question, vector)
+        return vector
+
+    def article_vectors(self, pmids: list, texts: list) -> np.ndarray:
+        """Unit embeddings of ``texts`` (the abstracts of ``pmids``), one per row."""
+        if self.cache is None:
+            with metrics.span("rerank.embed", texts=len(texts)):
+                return self.embedder.embed(list(texts))
+        vectors, found = self.cache.get(pmids)
+        metrics.count("vectors.cache_hits", int(found.sum()))
+        metrics.count("vectors.cache_misses", int((~found).sum()))
+        if found.all():
+            return vectors
+        missing = np.flatnonzero(~found)
+        with metrics.span("rerank.embed", texts=len(missing)):
+            embedded = self.embedder.embed([texts[i] for i in missing])
+        if vectors.shape[1] != embedded.shape[1]:
+            vectors = np.zeros((len(pmids), embedded.shape[1]), dtype=np.float32)
+        vectors[missing] = embedded
+        self.cache.put([pmids[i] for i in missing], embedded)
+        return vectors
+
+    def scores(self, question: str, pmids: list, texts: list) -> np.ndarray:
+        """Cosine similarity of ``question`` with each of ``texts``."""
+        if not len(pmids):
+            return np.zeros(0, dtype=np.float32)
+        with metrics.span("rerank", articles=len(pmids)):
+            question_vector = self.embed_question(question)
+            return self.article_vectors(list(pmids), list(texts)) @ question_vector
+
+    def rank(self, question: str, records: list) -> list:
+        """Article records (with ``"PMID"`` and ``"abstract"``), closest first."""
+        scores = self.scores(
+            question,
+            [record["PMID"] for record in records],
+            [record.get("abstract") or record.get("title", "") for record in records],
+        )
+        order = np.argsort(-scores, kind="stable")
+        return [records[i] for i in order]
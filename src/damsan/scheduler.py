@@ -0,0 +1,357 @@
+"""Adaptive concurrency control and retries for LLM calls."""
+
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Callable
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _errors(module: str, *names: str) -> tuple:
+    """Exception classes ``names`` of ``module``, if it has been imported.
+
+    A module that was never imported cannot have raised its exceptions, so the
+    checks below do not need to import ``openai`` or ``httpx`` themselves.
+    """
+    loaded = sys.modules.get(module)
+    if loaded is None:
+        return ()
+    return tuple(getattr(loaded, name) for name in names)
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Whether ``error`` means the provider is rate limiting us."""
+    return (
+        isinstance(error, _errors("openai", "RateLimitError"))
+        or getattr(error, "status_code", None) == 429
+    )
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an LLM call that failed with ``error`` is worth trying again."""
+    if is_throttled(error):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code >= 500 or status_code in (408, 409)
+    return isinstance(
+        error,
+        (
+            *_errors("openai", "APIConnectionError"),
+            *_errors("httpx", "TransportError"),
+            ConnectionError,
+            TimeoutError,
+        ),
+    )
+
+
+def is_congestion(error: BaseException) -> bool:
+    return is_throttled(error) or isinstance(
+        error,
+        (
+            *_errors("openai", "APITimeoutError"),
+            *_errors("httpx", "TimeoutException"),
+            TimeoutError,
+        ),
+    )
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Seconds requested by the provider's ``Retry-After`` header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    """Shares an adaptive concurrency limit between every LLM call in a process.
+
+    The limit follows AIMD. Until the first sign of congestion every success
+    adds a slot (doubling the limit per window of calls, like TCP slow start);
+    afterwards it grows by roughly one slot per window. It is cut by
+    ``decrease_factor`` when the provider throttles us (HTTP 429), a call times
+    out, or a call takes longer than ``latency_target``. Decreases are spaced by
+    ``cooldown`` so that a burst of 429s from calls that were already in flight
+    only counts once.
+
+    Failed calls are retried with full-jitter exponential backoff (or the
+    provider's ``Retry-After``), taking a new slot for every attempt.
+    Both threads (:meth:`run`) and coroutines on any event loop (:meth:`arun`)
+    draw from the same slots.
+
+    Parameters
+    ----------
+    max_concurrency : int, optional
+        Hard cap on concurrent calls, by default 64.
+    initial_concurrency : int, optional
+        Starting limit, by default 8.
+    min_concurrency : int, optional
+        Floor of the limit, by default 1.
+    latency_target : float, optional
+        Calls slower than this many seconds count as congestion. By default
+        only throttling and timeouts do.
+    max_retries : int, optional
+        Retries per call after the first attempt, by default 5.
+    backoff : float, optional
+        Base backoff in seconds, by default 1.
+    max_backoff : float, optional
+        Upper bound on a single backoff in seconds, by default 60.
+    decrease_factor : float, optional
+        Multiplier applied to the limit on congestion, by default 0.5.
+    cooldown : float, optional
+        Minimum seconds between two decreases, by default 2.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 64,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        latency_target: float | None = None,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        decrease_factor: float = 0.5,
+        cooldown: float = 2.0,
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(
+            min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        )
+        self.latency_target = latency_target
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.decreases = 0
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._async_waiters = []
+
+    def _try_acquire(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+        return False
+
+    def _wake(self) -> None:
+        self._slot_freed.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            # The scheduler outlives event loops (each asyncio.run has its
+            # own), so a waiter's loop may be gone by the time a slot frees.
+            if waiter.done() or loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                pass
+
+    def acquire(self) -> None:
+        with self._lock:
+            while not self._try_acquire():
+                self._slot_freed.wait()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+                waiter = loop.create_future()
+                entry = (loop, waiter)
+                self._async_waiters.append(entry)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    if entry in self._async_waiters:
+                        self._async_waiters.remove(entry)
+                raise
+
+    def release(
+        self, latency: float | None = None, error: BaseException | None = None
+    ) -> None:
+        """Free a slot and adapt the limit to how the call went."""
+        with self._lock:
+            self.in_flight -= 1
+            self.calls += 1
+            slow = (
+                self.latency_target is not None
+                and latency is not None
+                and latency > self.latency_target
+            )
+            if (error is not None and is_congestion(error)) or slow:
+                self._decrease()
+            elif error is None:
+                step = 1.0 if self.decreases == 0 else 1 / self.limit
+                self.limit = min(self.max_concurrency, self.limit + step)
+            self._wake()
+
+    def _free(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+        self.decreases += 1
+        logger.info(f"LLM concurrency limit lowered to {int(self.limit)}")
+
+    def _retry_delay(self, attempt: int, error: BaseException) -> float | None:
+        """Backoff before the next attempt, or ``None`` if the error is final."""
+        throttled = is_throttled(error)
+        if throttled:
+            metrics.count("llm.throttled")
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+            if not is_retryable(error) or attempt >= self.max_retries:
+                self.failures += 1
+                return None
+            self.retries += 1
+        metrics.count("llm.retries")
+        requested = retry_after(error)
+        if requested is not None:
+            return min(requested, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def run(self, func: Callable, *args, **kwargs):
+        """Call ``func(*args, **kwargs)`` in a slot, retrying transient failures."""
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            self.acquire()
+            start = time.monotonic()
+            metrics.count("llm.queue_wait_seconds", start - queued)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as err:
+                self.release(error=err)
+                delay = self._retry_delay(attempt, err)
+                if delay is None:
+                    raise
+                logger.warning(
+                    f"LLM call failed ({err}); retrying in {delay:.2f}s "
+                    f"(attempt {attempt + 1} of {self.max_retries})"
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.release(latency=time.monotonic() - start)
+            return result
+
+    async def arun(self, func: Callable, *args, **kwargs):
+        """Async counterpart of :meth:`run` for coroutine functions."""
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            await self.acquire_async()
+            start = time.monotonic()
+            metrics.count("llm.queue_wait_seconds", start - queued)
+            try:
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                self._free()
+                raise
+            except Exception as err:
+                self.release(error=err)
+                delay = self._retry_delay(attempt, err)
+                if delay is None:
+                    raise
+                logger.warning(
+                    f"LLM call failed ({err}); retrying in {delay:.2f}s "
+                    f"(attempt {attempt + 1} of {self.max_retries})"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.release(latency=time.monotonic() - start)
+            return result
+
+    async def astream(self, func: Callable, *args, **kwargs):
+        """Like :meth:`arun` for async generator functions, yielding their items.
+
+        The slot is held until the stream ends. A failed attempt is only retried
+        if it had not yielded anything yet; the limit adapts to the time to the
+        first item rather than to the length of the whole stream.
+        """
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            await self.acquire_async()
+            start = time.monotonic()
+            metrics.count("llm.queue_wait_seconds", start - queued)
+            latency = None
+            try:
+                async for item in func(*args, **kwargs):
+                    if latency is None:
+                        latency = time.monotonic() - start
+                    yield item
+            except Exception as err:
+                self.release(error=err)
+                delay = None if latency is not None else self._retry_delay(attempt, err)
+                if delay is None:
+                    raise
+                logger.warning(
+                    f"LLM call failed ({err}); retrying in {delay:.2f}s "
+                    f"(attempt {attempt + 1} of {self.max_retries})"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._free()
+                raise
+            self.release(latency=latency)
+            return
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "failures": self.failures,
+                "decreases": self.decreases,
+            }
+
+
+def _resolve(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+@lru_cache(maxsize=None)
+def shared_llm_scheduler() -> LLMScheduler:
+    """The process-wide scheduler used by retrievers that are not given one."""
+    return LLMScheduler()
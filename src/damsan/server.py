@@ -0,0 +1,460 @@
+"""HTTP service mode: answer questions from one long-lived, warm :class:`Damsan`.
+
+A stdlib-only asyncio HTTP/1.1 server. Every request is served by the same
+:class:`Damsan`, so its retriever, pooled model clients, rate limiter and
+caches stay warm between requests. Endpoints:
+
+``POST /answer``
+    JSON body ``{"question": ..., "restriction_date": "YYYY/MM/DD",
+    "bm25": false, "return_articles": true}``; only ``question`` is
+    required. Responds with the dict :meth:`Damsan.answer` returns.
+``GET /healthz``
+    Liveness check with queue, scheduler and rate limiter statistics.
+``GET /metrics``
+    Pipeline metrics in the Prometheus text format, when started with
+    ``--metrics prometheus``.
+
+Run it with the ``damsan-server`` console script.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from http import HTTPStatus
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_MAX_BODY_BYTES = 1 << 20
+_MAX_HEADERS = 100
+# Seconds a client has to send the headers and body once the request line has
+# arrived; a slow client would otherwise hold its connection open forever.
+_REQUEST_TIMEOUT = 30.0
+
+
+class ServiceBusy(Exception):
+    """Raised when the request queue is full."""
+
+
+class AnswerService:
+    """Runs questions through a :class:`Damsan` with coalescing and a bounded queue.
+
+    At most ``max_concurrency`` pipelines run at once and at most ``max_queue``
+    more wait for a slot; a new question beyond that raises
+    :class:`ServiceBusy`. A question that is identical (same question,
+    restriction date and ranking) to one already queued or running does not
+    start a pipeline of its own: it waits for the running one and gets the
+    same result, without taking a queue slot.
+
+    Parameters
+    ----------
+    damsan : Damsan
+        The instance answering every request.
+    max_concurrency : int, optional
+        Pipelines running at once, by default 8.
+    max_queue : int, optional
+        Pipelines allowed to wait for a slot, by default 64.
+    """
+
+    def __init__(self, damsan, max_concurrency: int = 8, max_queue: int = 64):
+        self.damsan = damsan
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.pipelines = {}
+        self.running = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @staticmethod
+    def key(question: str, restriction_date=None, bm25: bool = False) -> tuple:
+        return " ".join(question.split()), restriction_date, bool(bm25)
+
+    async def run(self, question: str, restriction_date, bm25: bool) -> dict:
+        async with self.slots:
+            self.running += 1
+            try:
+                return await self.damsan.answer_async(
+                    question, bm25=bm25, restriction_date=restriction_date
+                )
+            finally:
+                self.running -= 1
+
+    async def answer(
+        self, question: str, restriction_date=None, bm25: bool = False
+    ) -> dict:
+        """Answer ``question``, sharing the pipeline of an identical request."""
+        self.requests += 1
+        key = self.key(question, restriction_date, bm25)
+        pipeline = self.pipelines.get(key)
+        if pipeline is not None:
+            self.coalesced += 1
+        else:
+            if len(self.pipelines) >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                raise ServiceBusy(
+                    f"{len(self.pipelines)} questions are already queued or running"
+                )
+            pipeline = asyncio.ensure_future(self.run(question, restriction_date, bm25))
+            self.pipelines[key] = pipeline
+            pipeline.add_done_callback(lambda task: self.finished(key, task))
+        # Shielded so that one client going away does not cancel the pipeline
+        # for the others waiting on it.
+        return await asyncio.shield(pipeline)
+
+    def finished(self, key: tuple, pipeline: asyncio.Future) -> None:
+        self.pipelines.pop(key, None)
+        # Retrieving the exception here counts a failure once per pipeline,
+        # however many requests shared it, and keeps asyncio from reporting it
+        # as never retrieved when every one of them has gone away.
+        if not pipeline.cancelled() and pipeline.exception() is not None:
+            self.failed += 1
+
+    def stats(self) -> dict:
+        retriever = self.damsan.retriever
+        return {
+            "running": self.running,
+            "queued": len(self.pipelines) - self.running,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "llm_scheduler": retriever.llm_scheduler.stats(),
+            "ncbi_rate_limiter": retriever.ncbi_rate_limiter.stats(),
+        }
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str = "", headers=()):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.headers = list(headers)
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """Read one request as ``(method, path, version, headers, body)``.
+
+    Returns ``None`` when the client closed the connection between requests.
+    Waiting for the next request is not limited, but once its request line has
+    arrived the rest must follow within ``_REQUEST_TIMEOUT`` seconds.
+    """
+    try:
+        request_line = await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+    if not request_line:
+        return None
+    try:
+        method, path, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+    try:
+        async with asyncio.timeout(_REQUEST_TIMEOUT):
+            headers = await read_headers(reader)
+            try:
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+            if length > _MAX_BODY_BYTES:
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            body = await reader.readexactly(length) if length > 0 else b""
+    except TimeoutError:
+        raise HTTPError(HTTPStatus.REQUEST_TIMEOUT)
+    return method.upper(), path.split("?", 1)[0], version, headers, body
+
+
+async def read_headers(reader: asyncio.StreamReader) -> dict:
+    headers = {}
+    try:
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            if len(headers) >= _MAX_HEADERS:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+    except (asyncio.LimitOverrunError, ValueError):
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+
+async def write_response(
+    writer: asyncio.StreamWriter,
+    status: HTTPStatus,
+    payload,
+    keep_alive: bool,
+    headers=(),
+) -> None:
+    if isinstance(payload, str):
+        body = payload.encode("utf-8")
+        content_type = "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        content_type = "application/json; charset=utf-8"
+    head = [
+        f"HTTP/1.1 {status.value} {status.phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        *headers,
+    ]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+def parse_answer_request(body: bytes) -> dict:
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+    if not isinstance(request, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+    question = request.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, '"question" must be a non-empty string')
+    return {
+        "question": question,
+        "restriction_date": request.get("restriction_date") or None,
+        "bm25": bool(request.get("bm25", False)),
+        "return_articles": bool(request.get("return_articles", True)),
+    }
+
+
+class AnswerServer:
+    """Serves an :class:`AnswerService` over HTTP/1.1 with keep-alive.
+
+    Parameters
+    ----------
+    service : AnswerService
+        The service answering ``POST /answer``.
+    retry_after : int, optional
+        Seconds sent in ``Retry-After`` when the queue is full, by default 5.
+    prometheus : PrometheusSink, optional
+        Served at ``GET /metrics``; without it that path is not found.
+    """
+
+    def __init__(self, service: AnswerService, retry_after: int = 5, prometheus=None):
+        self.service = service
+        self.retry_after = retry_after
+        self.prometheus = prometheus
+
+    async def dispatch(self, method: str, path: str, body: bytes):
+        if path == "/healthz":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, headers=["Allow: GET"])
+            return HTTPStatus.OK, {"status": "ok", **self.service.stats()}
+        if path == "/metrics" and self.prometheus is not None:
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, headers=["Allow: GET"])
+            return HTTPStatus.OK, self.prometheus.render()
+        if path == "/answer":
+            if method != "POST":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, headers=["Allow: POST"])
+            request = parse_answer_request(body)
+            start = time.monotonic()
+            try:
+                result = await self.service.answer(
+                    request["question"],
+                    restriction_date=request["restriction_date"],
+                    bm25=request["bm25"],
+                )
+            except ServiceBusy as error:
+                raise HTTPError(
+                    HTTPStatus.SERVICE_UNAVAILABLE,
+                    str(error),
+                    headers=[f"Retry-After: {self.retry_after}"],
+                )
+            if not request["return_articles"]:
+                result = {"synthesis": result["synthesis"]}
+            logger.info(f"Answered in {time.monotonic() - start:.2f}s")
+            return HTTPStatus.OK, result
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as error:
+                    # The rest of the stream cannot be trusted after a malformed
+                    # request, so the connection is closed.
+                    await write_response(
+                        writer, error.status, {"error": str(error)}, False
+                    )
+                    break
+                if request is None:
+                    break
+                method, path, version, request_headers, body = request
+                connection = request_headers.get("connection", "").lower()
+                if version == "HTTP/1.1":
+                    keep_alive = connection != "close"
+                else:
+                    keep_alive = connection == "keep-alive"
+
+                headers = []
+                try:
+                    status, payload = await self.dispatch(method, path, body)
+                except HTTPError as error:
+                    status, payload = error.status, {"error": str(error)}
+                    headers = error.headers
+                except Exception as error:
+                    logger.exception(f"Failed to answer request: {error}")
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {"error": str(error)}
+                await write_response(writer, status, payload, keep_alive, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000) -> None:
+        """Serve until SIGINT or SIGTERM."""
+        server = await asyncio.start_server(self.handle, host, port)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # not on the main thread, or not supported on this platform
+        addresses = ", ".join(
+            str(sock.getsockname()[:2]) for sock in server.sockets or []
+        )
+        logger.info(f"Serving on {addresses}")
+        async with server:
+            await stop.wait()
+        logger.info("Shutting down")
+
+
+def main(argv: list | None = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="damsan-server",
+        description="Answer clinical questions over HTTP from a long-lived process.",
+        epilog=(
+            "Model and PubMed settings are read from the environment (or a .env "
+            "file): PROMPT_PATH, MODEL, OPENAI_API_KEY, EMAIL and NCBI_API_KEY."
+        ),
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=8,
+        help="questions answered at once (default: 8)",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=64,
+        help="questions waiting for a slot before answering 503 (default: 64)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="keep the article store and the esearch and LLM caches in this "
+        "directory instead of in memory",
+    )
+    parser.add_argument(
+        "--mirror",
+        help="search and fetch articles from this local PubMed mirror (built "
+        "with damsan-mirror) instead of Entrez",
+    )
+    parser.add_argument(
+        "--rerank",
+        choices=("hashing", "openai"),
+        help="order summaries for synthesis by embedding similarity, with a "
+        "local hashing embedder or the OpenAI embeddings API; embeddings are "
+        "kept in --cache-dir",
+    )
+    parser.add_argument(
+        "--rerank-model",
+        default="text-embedding-3-small",
+        help="embedding model for --rerank openai (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="append",
+        choices=("json", "prometheus", "otel"),
+        default=[],
+        help="trace every answer and export it as JSON log lines, at GET "
+        "/metrics, or to OpenTelemetry (needs opentelemetry-api); repeatable",
+    )
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    from .cache import ESearchCache, LLMResponseCache
+    from .damsan import Damsan
+    from .metrics import JSONLogSink, Metrics, OpenTelemetrySink, PrometheusSink
+
+    load_dotenv()
+    logging.basicConfig(
+        level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s"
+    )
+    if args.cache_dir:
+        cache_dir = Path(args.cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        article_store = None if args.mirror else cache_dir / "articles.sqlite"
+        esearch_cache = ESearchCache(cache_dir / "esearch.sqlite")
+        llm_cache = LLMResponseCache.on_disk(cache_dir / "llm.sqlite")
+    else:
+        article_store = None
+        esearch_cache = ESearchCache()
+        llm_cache = LLMResponseCache.in_memory()
+
+    sinks = {
+        "json": JSONLogSink,
+        "prometheus": PrometheusSink,
+        "otel": OpenTelemetrySink,
+    }
+    reranker = None
+    if args.rerank:
+        from .rerank import DenseReranker, HashingEmbedder, OpenAIEmbedder
+
+        if args.rerank == "openai":
+            embedder = OpenAIEmbedder(
+                args.rerank_model, api_key=os.getenv("OPENAI_API_KEY") or None
+            )
+        else:
+            embedder = HashingEmbedder()
+        vectors = None
+        if args.cache_dir:
+            vectors = Path(args.cache_dir) / f"vectors-{embedder.name}"
+        reranker = DenseReranker(embedder, cache=vectors)
+
+    metrics = None
+    if args.metrics:
+        metrics = Metrics([sinks[kind]() for kind in dict.fromkeys(args.metrics)])
+
+    damsan = Damsan(
+        prompt_file_path=os.getenv("PROMPT_PATH", ""),
+        model=os.getenv("MODEL", ""),
+        openai_api_key=os.getenv("OPENAI_API_KEY", ""),
+        email=os.getenv("EMAIL", ""),
+        ncbi_api_key=os.getenv("NCBI_API_KEY", ""),
+        article_store=article_store,
+        esearch_cache=esearch_cache,
+        llm_cache=llm_cache,
+        metrics=metrics,
+        local_mirror=args.mirror,
+        reranker=reranker,
+    )
+    service = AnswerService(
+        damsan, max_concurrency=args.max_concurrency, max_queue=args.max_queue
+    )
+    prometheus = metrics.sink(PrometheusSink) if metrics is not None else None
+    server = AnswerServer(service, prometheus=prometheus)
+    asyncio.run(server.serve(args.host, args.port))
@@ -0,0 +1,95 @@
+"""Token counting for LLM prompts."""
+
+import logging
+import math
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token for English prose, used when no tiktoken encoding
+# can be loaded (tiktoken downloads its BPE files on first use).
+_CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"[.!?](?:\s|$)")
+
+
+class Tokenizer:
+    """Counts and truncates text in the tokens of a chat model.
+
+    Parameters
+    ----------
+    model : str
+        Chat model name; unknown models use the ``o200k_base`` encoding. If the
+        encoding cannot be loaded, counts fall back to characters / 4.
+    """
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        try:
+            import tiktoken
+
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as error:
+            logger.warning(
+                f"Could not load a tokenizer for {model} ({error}); "
+                "estimating token counts from text length"
+            )
+            self.encoding = None
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return math.ceil(len(text) / _CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, messages: list) -> int:
+        """Tokens in the contents of ``messages``, plus a few per message for roles."""
+        total = 0
+        for message in messages:
+            if isinstance(message, dict):
+                content = message.get("content", "")
+            else:
+                content = getattr(message, "content", str(message))
+            total += self.count(content) + 4
+        return total
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut ``text`` to ``max_tokens`` tokens, at a sentence end if possible."""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is None:
+            limit = max_tokens * _CHARS_PER_TOKEN
+            if len(text) <= limit:
+                return text
+            truncated = text[:limit]
+        else:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            truncated = self.encoding.decode(tokens[:max_tokens])
+        ends = [match.end() for match in _SENTENCE_END.finditer(truncated)]
+        if ends and ends[-1] >= len(truncated) // 2:
+            return truncated[: ends[-1]].rstrip()
+        return truncated.rstrip() + "..."
+
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+
+def tokenizer_for(model: str) -> Tokenizer:
+    """The shared :class:`Tokenizer` for ``model``.
+
+    The first call builds it under a lock, so concurrent first calls load the
+    encoding (and warn about a missing one) only once.
+    """
+    tokenizer = _tokenizers.get(model)
+    if tokenizer is None:
+        with _tokenizers_lock:
+            tokenizer = _tokenizers.get(model)
+            if tokenizer is None:
+                tokenizer = _tokenizers[model] = Tokenizer(model)
+    return tokenizer
@@ -1,7 +1,9 @@
-from langchain.prompts import load_prompt
 from pathlib import Path
 import os
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def save_json(dict_: dict, file_name: str) -> None:
@@ -15,6 +17,37 @@ def read_json(file_name: str | Path) -> dict:
     return data
 
 
+def load_prompt(file_name: str | Path) -> str:
+    """Read the template string of a serialized prompt file.
+
+    The files use langchain's prompt JSON format; only f-string templates are
+    supported, which is all the shipped architectures use.
+    """
+    config = read_json(file_name)
+    template_format = config.get("template_format", "f-string")
+    if template_format != "f-string":
+        raise ValueError(
+            f"{file_name}: unsupported template format {template_format!r}"
+        )
+    return config["template"]
+
+
+class ChatTemplate:
+    """A task's system message and user template, ready to render."""
+
+    __slots__ = ("system", "template")
+
+    def __init__(self, system: str | None, template: str):
+        self.system = system
+        self.template = template
+
+    def render(self, **variables) -> list:
+        messages = [{"role": "user", "content": self.template.format(**variables)}]
+        if self.system is not None:
+            messages.insert(0, {"role": "system", "content": self.system})
+        return messages
+
+
 class PromptArchitecture:
     def __init__(self, architecture_path: str, verbose: bool = True):
         self.verbose = verbose
@@ -30,16 +63,54 @@ class PromptArchitecture:
 
     def compile_prompts(self) -> None:
         for key, sub_task in self.architecture["$schema"].items():
-            print(f"\nTask Name: {key}")
-            print(
-                "----------------------------------------------------------------------"
-            )
+            logger.debug(f"Task Name: {key}")
             for key_, sub_task_ in sub_task.items():
-                if self.verbose:
-                    print(f"Loading prompt: {key_}  from file {sub_task_}")
+                logger.debug(f"Loading prompt: {key_}  from file {sub_task_}")
                 self.architecture["$schema"][key][key_] = load_prompt(
                     os.path.join(self.path, self.architecture["$schema"][key][key_])
                 )
+        self.compile_chat_templates()
+
+    def compile_chat_templates(self) -> None:
+        """Build a chat template for every user template of every task.
+
+        Each template other than ``system`` becomes a :class:`ChatTemplate` made
+        of the task's (already formatted) system message followed by that
+        template as the user message, so rendering a prompt is a single
+        ``str.format``.
+        """
+        self.chat_templates = {}
+        for task, sub_tasks in self.architecture["$schema"].items():
+            system = sub_tasks.get("system")
+            if system is not None:
+                system = system.format()
+            for name, template in sub_tasks.items():
+                if name == "system":
+                    continue
+                self.chat_templates[(task, name)] = ChatTemplate(system, template)
+
+    def get_chat_template(self, task: str, template: str = "template") -> ChatTemplate:
+        return self.chat_templates[(task, template)]
+
+    def render(self, task: str, template: str = "template", **variables) -> list:
+        """Format the precompiled chat template of ``task`` into messages.
+
+        Parameters
+        ----------
+        task : str
+            Task name in the architecture, e.g. ``"relevance_prompt"``.
+        template : str, optional
+            Which of the task's user templates to use, by default ``"template"``.
+        **variables
+            Values for the template's input variables.
+
+        Returns
+        -------
+        list
+            The system and user messages as ``{"role", "content"}`` dicts, ready
+            to send to the model.
+        """
+        return self.chat_templates[(task, template)].render(**variables)
 
     def get_prompt(self, task: str, sub_task: str = "") -> str:
         if sub_task == "":
@@ -47,6 +118,10 @@ class PromptArchitecture:
         else:
             return self.architecture["$schema"][task][sub_task]
 
+    def get_option(self, task: str, option: str, default=None):
+        """Return a per-task setting from the architecture's ``$options`` block."""
+        return self.architecture.get("$options", {}).get(task, {}).get(option, default)
+
     def get_task_names(self):
         return list(self.architecture["$schema"].keys())
 
@@ -0,0 +1,50 @@
+import time
+
+from damsan.cache import ESearchCache
+
+OPEN_QUERY = "aspirin AND myocardial infarction"
+CLOSED_QUERY = "aspirin AND 2001/01/01:2005/12/31[dp]"
+
+
+def memory_expiry(cache: ESearchCache, query: str, retmax: int = 10):
+    return cache.front._entries[cache.key(query, retmax)][1]
+
+
+def reopen(path) -> ESearchCache:
+    """A fresh cache on ``path``, so reads come from the disk tier."""
+    return ESearchCache(path, ttl=3600, empty_ttl=60)
+
+
+def test_promoted_empty_result_keeps_empty_ttl(tmp_path):
+    path = tmp_path / "esearch.sqlite"
+    reopen(path).put_ids(OPEN_QUERY, 10, [])
+
+    cache = reopen(path)
+    assert cache.get_ids(OPEN_QUERY, 10) == []
+    assert memory_expiry(cache, OPEN_QUERY) <= time.time() + 60
+
+
+def test_promoted_closed_window_never_expires(tmp_path):
+    path = tmp_path / "esearch.sqlite"
+    reopen(path).put_ids(CLOSED_QUERY, 10, ["1", "2"])
+
+    cache = reopen(path)
+    assert cache.get_ids(CLOSED_QUERY, 10) == ["1", "2"]
+    assert memory_expiry(cache, CLOSED_QUERY) is None
+
+
+def test_promoted_result_keeps_remaining_lifetime(tmp_path):
+    path = tmp_path / "esearch.sqlite"
+    writer = reopen(path)
+    writer.put_ids(OPEN_QUERY, 10, ["1"])
+    written = memory_expiry(writer, OPEN_QUERY)
+
+    cache = reopen(path)
+    assert cache.get_ids(OPEN_QUERY, 10) == ["1"]
+    assert abs(memory_expiry(cache, OPEN_QUERY) - written) < 1
+
+
+def test_empty_results_can_be_left_uncached(tmp_path):
+    cache = ESearchCache(tmp_path / "esearch.sqlite", empty_ttl=0)
+    cache.put_ids(OPEN_QUERY, 10, [])
+    assert cache.get_ids(OPEN_QUERY, 10) is None
@@ -0,0 +1,18 @@
+import asyncio
+
+from damsan.llm import OpenAIChatBackend
+
+
+def test_aclose_closes_the_running_loops_client():
+    backend = OpenAIChatBackend("gpt-4o-mini", api_key="sk-test")
+
+    async def use_and_close():
+        backend.async_client(0.0)
+        http = backend._async_clients[asyncio.get_running_loop()]["http"]
+        await backend.aclose()
+        return http
+
+    http = asyncio.run(use_and_close())
+    assert http.is_closed
+    assert len(backend._async_clients) == 0
+    backend.close()
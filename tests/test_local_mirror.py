@@ -0,0 +1,41 @@
+from damsan.local_mirror import LocalPubMedMirror
+
+ARTICLE = (
+    "<PubmedArticle><MedlineCitation>"
+    '<PMID Version="1">{pmid}</PMID><Article><Journal><JournalIssue>'
+    "<PubDate><Year>{year}</Year></PubDate></JournalIssue>"
+    "<Title>Journal of Tests</Title></Journal>"
+    "<ArticleTitle>{title}</ArticleTitle>"
+    "<Abstract><AbstractText>{title} in adults.</AbstractText></Abstract>"
+    "</Article></MedlineCitation></PubmedArticle>"
+)
+
+
+def mirror_of(tmp_path, articles) -> LocalPubMedMirror:
+    path = tmp_path / "pubmed25n0001.xml"
+    path.write_text(
+        "<PubmedArticleSet>"
+        + "".join(ARTICLE.format(pmid=p, year=y, title=t) for p, y, t in articles)
+        + "</PubmedArticleSet>",
+        encoding="utf-8",
+    )
+    mirror = LocalPubMedMirror(tmp_path / "pubmed.sqlite")
+    mirror.ingest([path], workers=1)
+    return mirror
+
+
+def test_untranslatable_query_searches_its_words(tmp_path):
+    mirror = mirror_of(
+        tmp_path,
+        [(1, 2001, "Aspirin and stroke"), (2, 2020, "Statins and dementia")],
+    )
+    # [pt] is not indexed, so nothing in the query translates.
+    assert mirror.search("aspirin[pt]") == ["1"]
+
+
+def test_query_without_words_finds_nothing(tmp_path):
+    mirror = mirror_of(
+        tmp_path,
+        [(1, 2001, "Aspirin and stroke"), (2, 2020, "Statins and dementia")],
+    )
+    assert mirror.search("2000/01/01:2030/12/31[dp]") == []
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+from damsan.article import Article
+from damsan.llm import LLMBackend
+from damsan.metrics import Metrics
+from damsan.pubmed_engine import PubMedNeuralRetriever
+from damsan.scheduler import LLMScheduler
+
+PROMPTS = Path(__file__).resolve().parents[1] / "prompts/PubMed/Architecture_3"
+
+
+def test_openai_api_key_reaches_the_default_backend():
+    retriever = PubMedNeuralRetriever(
+        str(PROMPTS / "master.json"), openai_api_key="sk-test"
+    )
+    client = retriever.llm_backend.client(0.0)
+    assert client.openai_api_key.get_secret_value() == "sk-test"
+
+
+def test_default_backend_without_a_key_reads_the_environment():
+    retriever = PubMedNeuralRetriever(str(PROMPTS / "master.json"))
+    assert retriever.llm_backend.api_key is None
+
+
+class YesBackend(LLMBackend):
+    """Answers "yes" to every prompt, so every abstract is judged relevant."""
+
+    def complete(self, messages, temperature, max_tokens=1024, n=1):
+        return ["yes"] * n
+
+
+class CannedRetriever(PubMedNeuralRetriever):
+    """Serves fixed search results and articles instead of calling NCBI."""
+
+    searches = {
+        "aspirin": ["1", "2", "3"],
+        "aspirin AND heart": ["4", "5", "6"],
+    }
+
+    async def iter_searches_async(self, question, **kwargs):
+        for query, pmids in self.searches.items():
+            yield query, pmids
+
+    def search_pubmed(self, question, **kwargs):
+        article_ids = [pmid for pmids in self.searches.values() for pmid in pmids]
+        return list(self.searches), article_ids
+
+    def iter_article_data(self, article_ids, **kwargs):
+        for pmid in article_ids:
+            yield Article(
+                pmid, title=f"Article {pmid}", abstract=f"aspirin trial {pmid}"
+            )
+
+    async def iter_article_data_async(self, article_ids, **kwargs):
+        for article in self.iter_article_data(article_ids):
+            yield article
+
+
+def test_async_prescreen_top_n_applies_per_question():
+    retriever = CannedRetriever(
+        str(PROMPTS / "master.json"),
+        llm_backend=YesBackend(),
+        llm_scheduler=LLMScheduler(),
+        prescreen_top_n=2,
+    )
+    _, article_ids, articles, relevant, irrelevant = asyncio.run(
+        retriever.search_and_summarize_async("Does aspirin help?")
+    )
+    assert article_ids == ["1", "2", "3", "4", "5", "6"]
+    assert len(articles) == 6
+    assert len(relevant) == 2
+    assert sum(record["decided_by"] == "prescreen" for record in irrelevant) == 4
+
+
+def test_async_token_counting_runs_off_the_event_loop():
+    retriever = CannedRetriever(
+        str(PROMPTS / "master.json"),
+        llm_backend=YesBackend(),
+        llm_scheduler=LLMScheduler(),
+    )
+    counting_threads = set()
+    count_tokens = retriever.count_tokens
+
+    def recording_count_tokens(prompt, choices):
+        counting_threads.add(threading.get_ident())
+        count_tokens(prompt, choices)
+
+    retriever.count_tokens = recording_count_tokens
+
+    async def answer():
+        with Metrics().trace() as trace:
+            await retriever.search_and_summarize_async("Does aspirin help?")
+        return trace
+
+    trace = asyncio.run(answer())
+    assert trace.counters["llm.calls"] > 0
+    assert trace.counters["llm.prompt_tokens"] > 0
+    assert threading.get_ident() not in counting_threads
+
+
+class SlowFirstBackend(YesBackend):
+    """Answers prompts about the top-ranked article last."""
+
+    def complete(self, messages, temperature, max_tokens=1024, n=1):
+        if "aspirin trial 1" in messages[-1]["content"]:
+            time.sleep(0.2)
+        return super().complete(messages, temperature, max_tokens, n)
+
+
+def test_answer_keeps_summaries_in_search_rank_order():
+    retriever = CannedRetriever(
+        str(PROMPTS / "master.json"),
+        llm_backend=SlowFirstBackend(),
+        llm_scheduler=LLMScheduler(),
+    )
+    _, article_summaries, *_ = retriever.answer("Does aspirin help?")
+    pmids = [record["PMID"] for record in article_summaries]
+    assert pmids == ["1", "2", "3", "4", "5", "6"]
@@ -0,0 +1,67 @@
+import asyncio
+import gc
+
+from damsan import server
+from damsan.server import AnswerServer, AnswerService
+
+
+class FailingDamsan:
+    """Fails every answer after a short delay."""
+
+    async def answer_async(self, question, bm25=False, restriction_date=None):
+        await asyncio.sleep(0.05)
+        raise RuntimeError("pipeline failed")
+
+
+def test_coalesced_failure_counts_once():
+    service = AnswerService(FailingDamsan())
+
+    async def ask_twice():
+        return await asyncio.gather(
+            service.answer("Does aspirin help?"),
+            service.answer("Does aspirin  help?"),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(ask_twice())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert service.coalesced == 1
+    assert service.failed == 1
+
+
+def test_failure_after_every_client_left_is_retrieved():
+    service = AnswerService(FailingDamsan())
+    unhandled = []
+
+    async def ask_and_leave():
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: unhandled.append(context))
+        request = asyncio.ensure_future(service.answer("Does aspirin help?"))
+        await asyncio.sleep(0.01)
+        request.cancel()
+        await asyncio.sleep(0.1)
+        gc.collect()
+
+    asyncio.run(ask_and_leave())
+    assert service.failed == 1
+    assert unhandled == []
+
+
+def test_slow_request_body_times_out(monkeypatch):
+    monkeypatch.setattr(server, "_REQUEST_TIMEOUT", 0.1)
+    app = AnswerServer(AnswerService(FailingDamsan()))
+
+    async def send_partial_body():
+        listener = await asyncio.start_server(app.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(
+                b'POST /answer HTTP/1.1\r\nContent-Length: 100\r\n\r\n{"question"'
+            )
+            await writer.drain()
+            status = await asyncio.wait_for(reader.readline(), timeout=5)
+            writer.close()
+            return status
+
+    assert b"408" in asyncio.run(send_partial_body())